@@ -0,0 +1,63 @@
+import zlib
+from typing import Any, AsyncIterable, AsyncIterator
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi.responses import JSONResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value: Any) -> Any:
+    """Encode the BSON types Mongo documents carry that orjson does not know."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class MongoJSONResponse(JSONResponse):
+    """JSON response rendered by orjson straight from Mongo documents.
+
+    Datetimes are encoded natively and ObjectIds as strings. Endpoints
+    return an instance of it directly, which skips FastAPI's
+    ``jsonable_encoder`` walk over the content.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=_OPTIONS
+        )
+
+
+async def ndjson_chunks(
+    documents: AsyncIterable[Any],
+    compress: bool = False,
+    chunk_bytes: int = 65536
+) -> AsyncIterator[bytes]:
+    """Encode ``documents`` one per line, yielding about ``chunk_bytes`` at a time.
+
+    Nothing more is read from ``documents`` while a chunk waits to be sent,
+    so a slow client slows the cursor down rather than growing a buffer.
+    With ``compress`` the chunks form one gzip stream, flushed at every
+    chunk so the client can decode what it has received so far.
+    """
+    # wbits=31 writes the gzip header and trailer around the deflate data
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer = bytearray()
+    async for document in documents:
+        buffer += orjson.dumps(document, default=_default, option=_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+        if len(buffer) >= chunk_bytes:
+            if compressor is None:
+                yield bytes(buffer)
+            else:
+                yield compressor.compress(buffer) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            buffer.clear()
+    if compressor is None:
+        if buffer:
+            yield bytes(buffer)
+    else:
+        yield compressor.compress(buffer) + compressor.flush()
@@ -0,0 +1,30 @@
+from typing import Any, Callable
+from fastapi import Request
+from fastapi.routing import APIRoute
+
+# Key under scope["state"] where ValidationMiddleware leaves the decoded body.
+JSON_BODY_STATE_KEY = "json_body"
+
+
+class ParsedBodyRequest(Request):
+    """Request that reuses the JSON body already decoded by ValidationMiddleware."""
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            state = self.scope.get("state") or {}
+            if JSON_BODY_STATE_KEY not in state:
+                return await super().json()
+            self._json = state[JSON_BODY_STATE_KEY]
+        return self._json
+
+
+class ParsedBodyRoute(APIRoute):
+    """Route class that hands endpoints a ``ParsedBodyRequest``."""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def parsed_body_handler(request: Request):
+            return await handler(ParsedBodyRequest(request.scope, request.receive))
+
+        return parsed_body_handler
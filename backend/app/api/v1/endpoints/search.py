@@ -1,61 +1,196 @@
 from fastapi import APIRouter, Query, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import Optional
+from app.api.routing import ParsedBodyRoute
+from app.api.responses import NDJSON_MEDIA_TYPE, MongoJSONResponse, ndjson_chunks
+from app.core.config.settings import settings
+from app.core.config.universities import MAX_CAMPUS_DISTANCE_KM, UNIVERSITIES
+from app.models.entities.searcher import Requirements
+from app.services.projections import resolve_projection
 from app.services.search import SearchService
-from app.services.auth.telegram import TelegramAuth
+from app.services.searcher import SearcherService
+from app.api.v1.endpoints.searchers import verify_telegram_user
 
-router = APIRouter()
+router = APIRouter(route_class=ParsedBodyRoute)
 
-@router.get("/properties")
+# Named projection (card, detail or full) or an explicit field list
+VIEW_QUERY = Query("full", pattern="^(card|detail|full)$")
+FIELDS_QUERY = Query(None, max_length=1000, description="Comma-separated fields; overrides view")
+
+@router.get("/properties", response_class=MongoJSONResponse)
 async def search_properties(
-    telegram_id: str = Depends(TelegramAuth.verify_telegram_user),
+    telegram_id: str = Depends(verify_telegram_user),
     page: int = Query(1, ge=1),
-    limit: int = Query(10, ge=1, le=100)
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None, max_length=512),
+    approximate_total: bool = Query(False),
+    view: str = VIEW_QUERY,
+    fields: Optional[str] = FIELDS_QUERY
 ):
-    """Search properties based on searcher preferences."""
+    """Search properties based on searcher preferences.
+
+    Pass the ``next_cursor`` of a previous response as ``cursor`` to page
+    without skipping; ``page`` is ignored when a cursor is given. With
+    ``approximate_total`` the total may be a few seconds old.
+    """
+    searcher = await SearcherService.get_searcher(telegram_id)
+    if not searcher or not searcher.search_preferences:
+        raise HTTPException(
+            status_code=404,
+            detail="Search preferences not found"
+        )
     try:
+        projection = resolve_projection(view, fields)
         results = await SearchService.search_properties(
-            telegram_id=telegram_id,
+            preferences=searcher.search_preferences,
             page=page,
-            limit=limit
+            limit=limit,
+            cursor=cursor,
+            approximate_total=approximate_total,
+            projection=projection
         )
-        return results
+        return MongoJSONResponse(results)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/text")
+@router.get("/text", response_class=MongoJSONResponse)
 async def search_by_text(
     query: str = Query(..., min_length=1, max_length=100),
     city: Optional[str] = None,
     min_price: Optional[float] = Query(None, ge=0),
     max_price: Optional[float] = Query(None, ge=0),
     page: int = Query(1, ge=1),
-    limit: int = Query(10, ge=1, le=100)
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None, max_length=512),
+    approximate_total: bool = Query(False),
+    view: str = VIEW_QUERY,
+    fields: Optional[str] = FIELDS_QUERY
 ):
     """Search properties by text query with optional filters."""
     try:
+        projection = resolve_projection(view, fields)
         results = await SearchService.search_by_text(
             query=query,
             city=city,
             min_price=min_price,
             max_price=max_price,
             page=page,
-            limit=limit
+            limit=limit,
+            cursor=cursor,
+            approximate_total=approximate_total,
+            projection=projection
         )
-        return results
+        return MongoJSONResponse(results)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/recommendations")
+@router.get("/near", response_class=MongoJSONResponse)
+async def search_near(
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    university: Optional[str] = Query(None, max_length=50),
+    radius_km: float = Query(2.0, gt=0, le=MAX_CAMPUS_DISTANCE_KM),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    furnished: bool = Query(False),
+    internet: bool = Query(False),
+    utilities_included: bool = Query(False),
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    approximate_total: bool = Query(False),
+    view: str = VIEW_QUERY,
+    fields: Optional[str] = FIELDS_QUERY
+):
+    """Search properties near a point or a university, nearest first.
+
+    Give ``latitude`` and ``longitude``, or the ``university`` id of one of
+    ``/universities``. Each result carries its ``distance`` in metres.
+    """
+    try:
+        projection = resolve_projection(view, fields)
+        results = await SearchService.search_near(
+            radius_km=radius_km,
+            latitude=latitude,
+            longitude=longitude,
+            university=university,
+            min_price=min_price,
+            max_price=max_price,
+            requirements=Requirements(
+                furnished=furnished,
+                internet=internet,
+                utilities_included=utilities_included
+            ),
+            page=page,
+            limit=limit,
+            approximate_total=approximate_total,
+            projection=projection
+        )
+        return MongoJSONResponse(results)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/export")
+async def export_properties(
+    telegram_id: str = Depends(verify_telegram_user),
+    city: str = Query(..., min_length=1, max_length=100),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    view: str = VIEW_QUERY,
+    fields: Optional[str] = FIELDS_QUERY,
+    limit: int = Query(settings.EXPORT_MAX_ROWS, ge=1, le=settings.EXPORT_MAX_ROWS),
+    gzip: bool = Query(False)
+):
+    """Stream up to ``limit`` active properties in ``city`` as NDJSON, newest first.
+
+    One document per line, written as the cursor is read, so memory stays
+    flat however many listings match. With ``gzip`` the body is
+    gzip-encoded (``Content-Encoding: gzip``).
+    """
+    try:
+        projection = resolve_projection(view, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    documents = SearchService.export_properties(
+        city=city,
+        min_price=min_price,
+        max_price=max_price,
+        projection=projection,
+        limit=limit
+    )
+    return StreamingResponse(
+        ndjson_chunks(documents, compress=gzip, chunk_bytes=settings.EXPORT_CHUNK_BYTES),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Encoding": "gzip"} if gzip else None
+    )
+
+@router.get("/universities")
+async def list_universities():
+    """Universities a near search can be centred on."""
+    return {"universities": list(UNIVERSITIES.values())}
+
+@router.get("/recommendations", response_class=MongoJSONResponse)
 async def get_recommendations(
-    telegram_id: str = Depends(TelegramAuth.verify_telegram_user),
-    limit: int = Query(5, ge=1, le=20)
+    telegram_id: str = Depends(verify_telegram_user),
+    limit: int = Query(5, ge=1, le=20),
+    view: str = VIEW_QUERY,
+    fields: Optional[str] = FIELDS_QUERY
 ):
     """Get property recommendations based on searcher preferences."""
     try:
+        projection = resolve_projection(view, fields)
         recommendations = await SearchService.get_property_recommendations(
             searcher_id=telegram_id,
-            limit=limit
+            limit=limit,
+            projection=projection
         )
-        return {"recommendations": recommendations}
+        return MongoJSONResponse({"recommendations": recommendations})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,5 +1,6 @@
 from typing import List, Optional
 from fastapi import APIRouter, HTTPException, Query, Depends
+from app.api.routing import ParsedBodyRoute
 from app.models.entities.searcher import (
     Searcher,
     SearcherType,
@@ -9,7 +10,7 @@ from app.models.entities.searcher import (
 from app.services.searcher import SearcherService
 from app.services.auth.telegram import TelegramAuth
 
-router = APIRouter()
+router = APIRouter(route_class=ParsedBodyRoute)
 
 
 async def verify_telegram_user(telegram_id: str):
@@ -0,0 +1,40 @@
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from app.api.routing import ParsedBodyRoute
+from app.core.config.settings import settings
+from app.telegram.webhook import SECRET_TOKEN_HEADER, telegram_webhook, valid_secret_token
+
+router = APIRouter(route_class=ParsedBodyRoute)
+
+
+@router.post("/webhook", include_in_schema=False)
+async def telegram_webhook_update(
+    request: Request,
+    secret_token: Optional[str] = Header(None, alias=SECRET_TOKEN_HEADER)
+):
+    """Receive an update from Telegram and queue it for the bot.
+
+    A process that does not run the bot relays the update to the one that
+    does. Answers 503 while the update cannot be queued, so Telegram
+    retries later.
+    """
+    if not (telegram_webhook.running or settings.TELEGRAM_WEBHOOK_ENABLED):
+        raise HTTPException(status_code=404, detail="Webhook mode is not enabled")
+    if not valid_secret_token(secret_token):
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+    try:
+        data = await request.json()
+        if telegram_webhook.running:
+            accepted = telegram_webhook.submit(data)
+        else:
+            accepted = await telegram_webhook.relay(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not accepted:
+        raise HTTPException(
+            status_code=503,
+            detail="Update could not be queued",
+            headers={"Retry-After": "1"}
+        )
+    return Response(status_code=200)
+
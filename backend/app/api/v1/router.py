@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import searchers, search
+from app.api.v1.endpoints import searchers, search, telegram
 
 api_router = APIRouter()
 
@@ -16,3 +16,10 @@ api_router.include_router(
     prefix="/search",
     tags=["search"]
 )
+
+# Telegram webhook
+api_router.include_router(
+    telegram.router,
+    prefix="/telegram",
+    tags=["telegram"]
+)
@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Mapping, Optional
+from bson import json_util
+from pymongo.errors import PyMongoError
+from app.core.metrics import RESULT_CACHE_LOOKUPS, RESULT_CACHE_WATCHING
+from app.core.redis import RedisError, get_redis
+
+logger = logging.getLogger(__name__)
+
+# Seconds between warnings about a failing shared cache.
+ERROR_LOG_INTERVAL = 60.0
+
+
+class TTLCache:
+    """Bounded in-process cache with per-entry expiry and LRU eviction."""
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class MemoryCacheBackend:
+    """Result cache storage local to this process."""
+
+    def __init__(self, max_entries: int):
+        self._entries = TTLCache(ttl=0, max_entries=max_entries)
+        self._version = 0
+
+    async def get(self, key: str) -> Any:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries.set(key, value, ttl=ttl)
+
+    async def get_version(self) -> int:
+        return self._version
+
+    async def bump_version(self) -> int:
+        self._version += 1
+        # Entries under older versions can never be read again.
+        self._entries.clear()
+        return self._version
+
+    async def size(self) -> int:
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """Result cache storage shared through a Redis-protocol server."""
+
+    def __init__(self, client: Any, prefix: str):
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Any:
+        raw = await self.client.get(f"{self.prefix}:{key}")
+        return json_util.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self.client.set(
+            f"{self.prefix}:{key}",
+            json_util.dumps(value),
+            px=max(1, int(ttl * 1000))
+        )
+
+    async def get_version(self) -> int:
+        return int(await self.client.get(f"{self.prefix}:version") or 0)
+
+    async def bump_version(self) -> int:
+        return int(await self.client.incr(f"{self.prefix}:version"))
+
+    async def size(self) -> Optional[int]:
+        return None
+
+
+class ResultCache:
+    """Versioned query-result cache in front of an expensive coroutine.
+
+    Keys embed the current version, so ``invalidate`` retires every cached
+    result at once without scanning the store. When a shared store fails,
+    results are computed as if the cache were disabled.
+    """
+
+    def __init__(self, backend: Any, ttl: float, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        # True while a change stream retires entries as the data changes
+        self.watching = False
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._error_logged_at: Optional[float] = None
+
+    def _failed(self, action: str, error: Exception) -> None:
+        self.errors += 1
+        RESULT_CACHE_LOOKUPS.labels(result="error").inc()
+        now = time.monotonic()
+        if self._error_logged_at is None or now - self._error_logged_at >= ERROR_LOG_INTERVAL:
+            self._error_logged_at = now
+            logger.warning("%s the result cache failed, computing uncached: %s", action, error)
+
+    @staticmethod
+    def make_key(parts: Mapping[str, Any]) -> str:
+        encoded = json_util.dumps(parts, sort_keys=True).encode()
+        return hashlib.sha1(encoded).hexdigest()
+
+    async def get_or_compute(
+        self,
+        parts: Mapping[str, Any],
+        compute: Callable[[], Awaitable[Any]],
+        on_unwatched_hit: Optional[Callable[[Any], Any]] = None
+    ) -> Any:
+        """Cached value for ``parts``, computed and stored on a miss.
+
+        ``on_unwatched_hit`` adjusts values served from the store while no
+        change stream is watching, which may be up to ``ttl`` seconds old.
+        """
+        if not self.enabled:
+            return await compute()
+
+        try:
+            version = await self.backend.get_version()
+            key = f"{version}:{self.make_key(parts)}"
+            value = await self.backend.get(key)
+        except RedisError as e:
+            self._failed("Reading", e)
+            return await compute()
+        if value is not None:
+            self.hits += 1
+            RESULT_CACHE_LOOKUPS.labels(result="hit").inc()
+            if on_unwatched_hit is not None and not self.watching:
+                return on_unwatched_hit(value)
+            return value
+
+        self.misses += 1
+        RESULT_CACHE_LOOKUPS.labels(result="miss").inc()
+        value = await compute()
+        try:
+            # Skip the store if a write bumped the version while we were computing.
+            if await self.backend.get_version() == version:
+                await self.backend.set(key, value, self.ttl)
+        except RedisError as e:
+            self._failed("Writing", e)
+        return value
+
+    async def invalidate(self) -> int:
+        return await self.backend.bump_version()
+
+    async def watch(
+        self,
+        collection: Any,
+        debounce: float = 1.0,
+        retry_seconds: float = 1.0,
+        max_retry_seconds: float = 300.0
+    ) -> None:
+        """Invalidate on writes to ``collection`` via a change stream.
+
+        A burst of writes, such as a scraper flush, retires the cache at
+        most once every ``debounce`` seconds. Change streams need a replica
+        set; while the stream cannot be opened, or after it fails, it is
+        reopened with exponential backoff and cached values are only bounded
+        by the TTL.
+        """
+        changed = asyncio.Event()
+
+        async def invalidate_changes() -> None:
+            while True:
+                await changed.wait()
+                changed.clear()
+                try:
+                    await self.invalidate()
+                except Exception as e:
+                    logger.warning("Invalidating the %s cache failed: %s", collection.name, e)
+                    changed.set()
+                await asyncio.sleep(debounce)
+
+        invalidator = asyncio.create_task(invalidate_changes())
+        backoff = retry_seconds
+        try:
+            while True:
+                try:
+                    async with collection.watch([{"$project": {"_id": 1}}]) as stream:
+                        self.watching = True
+                        RESULT_CACHE_WATCHING.set(1)
+                        backoff = retry_seconds
+                        # Writes made while not watching went unseen
+                        changed.set()
+                        async for _ in stream:
+                            changed.set()
+                except PyMongoError as e:
+                    logger.warning(
+                        "Not watching %s for cache invalidation, retrying in %.0fs: %s",
+                        collection.name, backoff, e
+                    )
+                finally:
+                    self.watching = False
+                    RESULT_CACHE_WATCHING.set(0)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, max_retry_seconds)
+        finally:
+            invalidator.cancel()
+
+    async def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        try:
+            version = await self.backend.get_version()
+        except RedisError as e:
+            self._failed("Reading", e)
+            version = None
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": await self.backend.size(),
+            "watching": self.watching,
+            "version": version
+        }
+
+
+def create_result_cache(
+    url: Optional[str],
+    prefix: str,
+    ttl: float,
+    max_entries: int,
+    enabled: bool = True
+) -> ResultCache:
+    """Build a result cache, shared through ``url`` when one is configured."""
+    if url:
+        backend = RedisCacheBackend(get_redis(url), prefix)
+    else:
+        backend = MemoryCacheBackend(max_entries)
+    return ResultCache(backend, ttl=ttl, enabled=enabled)
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, IndexModel
+from pymongo.errors import PyMongoError
+from app.core.config.universities import UNIVERSITIES
+
+logger = logging.getLogger(__name__)
+
+
+def _campus_indexes() -> List[IndexModel]:
+    """One index per campus for distance-sorted searches near it.
+
+    Partial on listings that store a distance to that campus, which are the
+    only ones such a search can return.
+    """
+    return [
+        IndexModel(
+            [
+                (f"campus_distances.{university_id}", ASCENDING),
+                ("_id", ASCENDING),
+                ("price", ASCENDING)
+            ],
+            name=f"active_campus_{university_id}",
+            partialFilterExpression={
+                "status": "active",
+                f"campus_distances.{university_id}": {"$exists": True}
+            }
+        )
+        for university_id in UNIVERSITIES
+    ]
+
+
+# Declarative index registry: one list of specs per collection. IndexModel
+# derives each name from the keys, which is what drift detection compares.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "properties": [
+        IndexModel([("location", GEOSPHERE)]),
+        IndexModel([("telegram_user_id", ASCENDING)]),
+        # Scraper upserts are keyed on it; listings posted by users have none
+        IndexModel([("source_url", ASCENDING)], unique=True, sparse=True),
+        # Near-duplicate clusters; only scraped listings carry one
+        IndexModel([("canonical_id", ASCENDING)], sparse=True),
+        IndexModel([("status", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+        # Polled for new and changed listings when change streams are unavailable
+        IndexModel([("updated_at", ASCENDING), ("_id", ASCENDING)]),
+        # Preference and recommendation searches: equality on city, sort on
+        # (created_at, _id), ranges on price and available_from. Partial on
+        # active listings, which is every search's first predicate.
+        IndexModel(
+            [
+                ("city", ASCENDING),
+                ("created_at", DESCENDING),
+                ("_id", DESCENDING),
+                ("price", ASCENDING),
+                ("available_from", ASCENDING)
+            ],
+            name="active_city_created_price_available",
+            partialFilterExpression={"status": "active"}
+        ),
+        # Searches narrowed by area within a city
+        IndexModel(
+            [("city", ASCENDING), ("area", ASCENDING), ("price", ASCENDING)],
+            name="active_city_area_price",
+            partialFilterExpression={"status": "active"}
+        ),
+        IndexModel([("rules.rental_type", ASCENDING)]),
+        IndexModel([("verification.status", ASCENDING)]),
+        IndexModel([("verification.report_count", DESCENDING)]),
+        IndexModel([("description", TEXT), ("title", TEXT)]),
+        *_campus_indexes(),
+    ],
+    "searchers": [
+        IndexModel([("telegram_user_id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING)]),
+        IndexModel([("last_active", DESCENDING)]),
+        # Staleness sweep of materialized recommendations
+        IndexModel([("matches_computed_at", ASCENDING)]),
+        # Polled for preference changes when change streams are unavailable
+        IndexModel([("updated_at", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("searcher_type", ASCENDING)]),
+        IndexModel([("reputation.trust_score", DESCENDING)]),
+    ],
+    "matches": [
+        IndexModel([("searcher_id", ASCENDING)]),
+        # Materialized recommendations, read best first per searcher
+        IndexModel([("searcher_id", ASCENDING), ("status", ASCENDING), ("score", DESCENDING)]),
+        IndexModel([("property_id", ASCENDING)]),
+        IndexModel([("status", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    "reports": [
+        IndexModel([("property_id", ASCENDING)]),
+        IndexModel([("reporter_id", ASCENDING)]),
+        IndexModel([("status", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+        IndexModel([("report_type", ASCENDING)]),
+    ],
+    "verifications": [
+        IndexModel([("property_id", ASCENDING)]),
+        IndexModel([("verifier_id", ASCENDING)]),
+        IndexModel([("status", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+        IndexModel([("verification_type", ASCENDING)]),
+    ],
+    # MinHash signatures written by the scraper pipeline (scrapers/dedupe.py)
+    "property_signatures": [
+        IndexModel([("bands", ASCENDING)]),
+        IndexModel([("canonical_id", ASCENDING)]),
+    ],
+    # Bot conversation states (app/telegram/persistence.py), loaded per handler
+    "telegram_conversations": [
+        IndexModel([("name", ASCENDING)]),
+    ],
+    # Webhook updates relayed to the process running the bot (app/telegram/webhook.py)
+    "telegram_updates": [
+        # Telegram itself gives up on an update after a day
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=86400),
+    ],
+    # Telegram notification outbox (app/telegram/notifications.py)
+    "notifications": [
+        # Pending entries are loaded in creation order at start and when polling
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]),
+        # Entries whose sender's claim lapsed are taken over
+        IndexModel([("status", ASCENDING), ("claim_expires_at", ASCENDING)]),
+        # A listing is announced to a chat once
+        IndexModel(
+            [("chat_id", ASCENDING), ("property_id", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"property_id": {"$exists": True}}
+        ),
+    ],
+}
+
+# Index options that change behaviour and therefore count as drift.
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+@dataclass
+class IndexDrift:
+    """Difference between the registry and the live indexes of one collection."""
+    collection: str
+    missing: List[str] = field(default_factory=list)
+    conflicting: List[str] = field(default_factory=list)
+    unexpected: List[str] = field(default_factory=list)
+
+    @property
+    def clean(self) -> bool:
+        return not (self.missing or self.conflicting or self.unexpected)
+
+
+def _conflicts(spec: Mapping[str, Any], live: Mapping[str, Any]) -> bool:
+    """Whether a live index differs from its spec in keys or options."""
+    keys = list(spec["key"].items())
+    # Text indexes are stored under internal _fts/_ftsx keys; compare by name only.
+    if not any(direction == TEXT for _, direction in keys):
+        if keys != list(live["key"].items()):
+            return True
+    return any(spec.get(option) != live.get(option) for option in _COMPARED_OPTIONS)
+
+
+class IndexManager:
+    """Diff the registry against ``list_indexes()`` and build what is missing."""
+
+    def __init__(self, database: AsyncIOMotorDatabase, registry: Dict[str, List[IndexModel]] = INDEXES):
+        self.database = database
+        self.registry = registry
+        self.last_report: Dict[str, IndexDrift] = {}
+
+    async def _diff(self, collection: str, specs: List[IndexModel]) -> IndexDrift:
+        live = {
+            index["name"]: index
+            async for index in self.database[collection].list_indexes()
+        }
+        drift = IndexDrift(collection)
+        wanted = set()
+        for spec in specs:
+            document = spec.document
+            wanted.add(document["name"])
+            if document["name"] not in live:
+                drift.missing.append(document["name"])
+            elif _conflicts(document, live[document["name"]]):
+                drift.conflicting.append(document["name"])
+        drift.unexpected = sorted(set(live) - wanted - {"_id_"})
+        return drift
+
+    async def check(self) -> Dict[str, IndexDrift]:
+        """Compare every registered collection with the live indexes."""
+        reports = await asyncio.gather(*(
+            self._diff(collection, specs)
+            for collection, specs in self.registry.items()
+        ))
+        self.last_report = {report.collection: report for report in reports}
+        return self.last_report
+
+    async def ensure(self) -> Dict[str, IndexDrift]:
+        """Build missing indexes, one batched ``create_indexes`` per collection."""
+        reports = await self.check()
+
+        async def build(collection: str, drift: IndexDrift) -> None:
+            specs = [
+                spec for spec in self.registry[collection]
+                if spec.document["name"] in drift.missing
+            ]
+            try:
+                await self.database[collection].create_indexes(specs)
+                drift.missing = []
+            except PyMongoError as e:
+                logger.error("Building indexes on %s failed: %s", collection, e)
+
+        await asyncio.gather(*(
+            build(collection, drift)
+            for collection, drift in reports.items()
+            if drift.missing
+        ))
+
+        for drift in reports.values():
+            if drift.conflicting:
+                logger.warning(
+                    "Indexes on %s differ from the registry: %s",
+                    drift.collection, ", ".join(drift.conflicting)
+                )
+            if drift.unexpected:
+                logger.warning(
+                    "Indexes on %s are not in the registry: %s",
+                    drift.collection, ", ".join(drift.unexpected)
+                )
+        return reports
+
+    def start(self) -> "asyncio.Task[Dict[str, IndexDrift]]":
+        """Run ``ensure`` in the background, off the startup path."""
+        task = asyncio.create_task(self.ensure())
+        task.add_done_callback(self._log_failure)
+        return task
+
+    @staticmethod
+    def _log_failure(task: "asyncio.Task[Any]") -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Index maintenance failed: %s", task.exception())
@@ -0,0 +1,195 @@
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import monitoring
+from app.core.metrics import (
+    DB_CONNECTIONS_CURRENT,
+    DB_CONNECTIONS_IN_USE,
+    MONGODB_COMMAND_DURATION,
+    MONGODB_COMMAND_FAILURES,
+    MONGODB_DOCUMENTS_RETURNED,
+    MONGODB_POOL_CHECKOUT_FAILURES,
+    MONGODB_POOL_CHECKOUT_WAIT
+)
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Commands awaiting their reply; a connection that dies without reporting
+# the outcome leaves its entries behind, so the oldest are dropped beyond this.
+MAX_PENDING_COMMANDS = 10_000
+
+# Driver bookkeeping that says nothing about the query itself.
+_IGNORED_COMMAND_FIELDS = {
+    "$db", "lsid", "$clusterTime", "txnNumber", "$readPreference",
+    "autocommit", "startTransaction", "documents", "cursor", "batchSize", "comment"
+}
+
+
+def query_shape(value: Any) -> Any:
+    """``value`` with every literal replaced by ``"?"``.
+
+    Field names and operators are kept, so queries that differ only in
+    their parameters have the same shape. Runs of identical list entries
+    (e.g. the members of an ``$in``) collapse to one.
+    """
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes: List[Any] = []
+        for item in value:
+            shape = query_shape(item)
+            if not shapes or shapes[-1] != shape:
+                shapes.append(shape)
+        return shapes
+    return "?"
+
+
+def command_shape(command_name: str, command: Dict[str, Any]) -> str:
+    """Normalized, loggable form of a command document."""
+    shape: Dict[str, Any] = {command_name: _collection(command_name, command) or "?"}
+    for key, value in command.items():
+        if key != command_name and key not in _IGNORED_COMMAND_FIELDS:
+            shape[key] = query_shape(value)
+    return json.dumps(shape)
+
+
+def _collection(command_name: str, command: Dict[str, Any]) -> str:
+    target = command.get(command_name)
+    if command_name == "getMore":
+        target = command.get("collection")
+    return target if isinstance(target, str) else ""
+
+
+def _documents_returned(command_name: str, reply: Dict[str, Any]) -> Optional[int]:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+        return len(batch) if batch is not None else None
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") is not None else 0
+    return None
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Per-collection command latency and result sizes, plus a slow-command log.
+
+    Only the collection and, while slow commands are logged, the command's
+    shape are kept until the reply arrives, never the command document with
+    its payload. A ``slow_command_ms`` of 0 turns the log off.
+    """
+
+    def __init__(self, slow_command_ms: float):
+        self.slow_command_ms = slow_command_ms
+        # (connection, request id) -> (collection, command shape)
+        self._pending: Dict[Tuple[Any, int], Tuple[str, Optional[str]]] = {}
+
+    def started(self, event) -> None:
+        collection = _collection(event.command_name, event.command)
+        shape = command_shape(event.command_name, event.command) if self.slow_command_ms > 0 else None
+        self._pending[(event.connection_id, event.request_id)] = (collection, shape)
+        while len(self._pending) > MAX_PENDING_COMMANDS:
+            del self._pending[next(iter(self._pending))]
+
+    def succeeded(self, event) -> None:
+        collection, shape = self._pending.pop(
+            (event.connection_id, event.request_id), ("", None)
+        )
+        seconds = event.duration_micros / 1_000_000
+        MONGODB_COMMAND_DURATION.labels(collection, event.command_name).observe(seconds)
+        documents = _documents_returned(event.command_name, event.reply)
+        if documents is not None:
+            MONGODB_DOCUMENTS_RETURNED.labels(collection, event.command_name).observe(documents)
+        self._log_if_slow(event.command_name, collection, shape, seconds, documents)
+
+    def failed(self, event) -> None:
+        collection, shape = self._pending.pop(
+            (event.connection_id, event.request_id), ("", None)
+        )
+        seconds = event.duration_micros / 1_000_000
+        MONGODB_COMMAND_DURATION.labels(collection, event.command_name).observe(seconds)
+        MONGODB_COMMAND_FAILURES.labels(collection, event.command_name).inc()
+        self._log_if_slow(event.command_name, collection, shape, seconds, None)
+
+    def _log_if_slow(
+        self,
+        command_name: str,
+        collection: str,
+        shape: Optional[str],
+        seconds: float,
+        documents: Optional[int]
+    ) -> None:
+        if shape is None or seconds * 1000 < self.slow_command_ms:
+            return
+        logger.warning(
+            "Slow MongoDB %s on %s: %.1f ms, %s documents, shape %s",
+            command_name,
+            collection or "<none>",
+            seconds * 1000,
+            "?" if documents is None else documents,
+            shape
+        )
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Connection counts and checkout wait times for the driver pools."""
+
+    def __init__(self):
+        # pymongo < 4.7 does not report the checkout duration; checkouts
+        # start and finish on the same thread, so time them per thread.
+        self._local = threading.local()
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_created(self, event) -> None:
+        DB_CONNECTIONS_CURRENT.inc()
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_closed(self, event) -> None:
+        DB_CONNECTIONS_CURRENT.dec()
+
+    def connection_check_out_started(self, event) -> None:
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event) -> None:
+        self._observe_wait(event)
+        MONGODB_POOL_CHECKOUT_FAILURES.labels(str(event.reason)).inc()
+
+    def connection_checked_out(self, event) -> None:
+        self._observe_wait(event)
+        DB_CONNECTIONS_IN_USE.inc()
+
+    def connection_checked_in(self, event) -> None:
+        DB_CONNECTIONS_IN_USE.dec()
+
+    def _observe_wait(self, event) -> None:
+        duration = getattr(event, "duration", None)
+        if duration is None:
+            started = getattr(self._local, "started", None)
+            if started is None:
+                return
+            duration = time.perf_counter() - started
+        self._local.started = None
+        MONGODB_POOL_CHECKOUT_WAIT.observe(duration)
+
+
+def mongo_event_listeners() -> List[Any]:
+    """Listeners to pass as ``event_listeners`` when building a client."""
+    return [
+        CommandMetricsListener(settings.MONGODB_SLOW_COMMAND_MS),
+        PoolMetricsListener()
+    ]
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import AnyHttpUrl, validator
 
@@ -13,15 +13,68 @@ class Settings(BaseSettings):
     # MongoDB
     MONGODB_URL: str
     MONGODB_DB_NAME: str
+    MONGODB_SLOW_COMMAND_MS: float = 100.0  # log commands slower than this with their query shape; 0 turns it off
     
     # Telegram
     TELEGRAM_BOT_TOKEN: str
     TELEGRAM_WEBHOOK_URL: str
     TELEGRAM_ADMIN_USER_ID: str
+    TELEGRAM_API_BASE_URL: Optional[str] = None  # e.g. a local fake Bot API server, http://localhost:8081/bot
+    TELEGRAM_PERSISTENCE_UPDATE_SECONDS: float = 5.0  # how often conversation state and user_data are written
+    TELEGRAM_WEBHOOK_ENABLED: bool = False  # run the bot in the API process holding its lease instead of run_bot.py
+    TELEGRAM_BOT_LEASE_SECONDS: float = 15.0  # another API process takes the bot over this long after its holder stops
+    TELEGRAM_WEBHOOK_RELAY_SECONDS: float = 0.5  # polling for updates received by the other API processes
+    TELEGRAM_WEBHOOK_SECRET: Optional[str] = None  # required with the webhook; 1-256 of A-Z, a-z, 0-9, _ and -
+    TELEGRAM_WEBHOOK_WORKERS: int = 8  # updates processed concurrently, one chat at a time each
+    TELEGRAM_WEBHOOK_QUEUE_SIZE: int = 1000  # updates queued before the webhook answers 503
+    TELEGRAM_WEBHOOK_MAX_CONNECTIONS: int = 40  # concurrent deliveries Telegram may open
     
     # Security
     CORS_ORIGINS: List[str] = ["http://localhost:3000"]
     MAX_REQUESTS_PER_MINUTE: int = 60
+    TELEGRAM_REQUESTS_PER_MINUTE: int = 120
+    RATE_LIMIT_KEY: str = "ip"  # comma-separated: ip, telegram_id, route
+    RATE_LIMIT_URL: Optional[str] = None  # e.g. redis://redis:6379/1 to share limits across workers
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    RATE_LIMIT_IP_REQUESTS_PER_MINUTE: int = 600  # per client address across telegram_id keys
+    
+    # Search
+    SEARCH_TOTAL_CACHE_TTL_SECONDS: float = 5.0
+    SEARCH_CACHE_ENABLED: bool = True
+    SEARCH_CACHE_TTL_SECONDS: float = 30.0
+    SEARCH_CACHE_MAX_ENTRIES: int = 2048
+    SEARCH_CACHE_URL: Optional[str] = None  # e.g. redis://redis:6379/0 to share across workers
+    SEARCH_CACHE_INVALIDATE_SECONDS: float = 1.0  # at most one invalidation per interval on property writes
+    RECOMMENDATION_CANDIDATES: int = 2000  # newest matches scored per recommendation request
+    EXPORT_BATCH_SIZE: int = 1000  # documents per cursor round trip in /search/export
+    EXPORT_CHUNK_BYTES: int = 65536  # NDJSON buffered before each write to the client
+    EXPORT_MAX_ROWS: int = 10000  # most properties one /search/export streams
+    
+    # Materialized recommendations (matches collection)
+    MATCHES_MATERIALIZER_ENABLED: bool = True  # runs in whichever API process holds its lease
+    MATCHES_LEASE_SECONDS: float = 30.0  # another process takes over this long after the holder dies
+    MATCHES_TOP_K: int = 20
+    MATCHES_WORKERS: int = 4
+    MATCHES_MAX_AGE_SECONDS: float = 3600.0  # matches older than this are recomputed
+    MATCHES_SWEEP_SECONDS: float = 10.0
+    MATCHES_POLL_SECONDS: float = 5.0  # property polling when change streams are unavailable
+    
+    # Telegram notifications (notifications outbox)
+    NOTIFICATIONS_ENABLED: bool = True  # send from the bot process
+    NOTIFICATIONS_PER_SECOND: float = 25.0  # Telegram allows about 30 messages/s per bot
+    NOTIFICATIONS_CHAT_INTERVAL_SECONDS: float = 1.0  # and about one message/s per chat
+    NOTIFICATIONS_CONCURRENCY: int = 8  # messages in flight at once
+    NOTIFICATIONS_MAX_ATTEMPTS: int = 5
+    NOTIFICATIONS_MAX_COALESCED: int = 10  # notifications merged into one message
+    NOTIFICATIONS_POLL_SECONDS: float = 2.0  # outbox polling for entries written by other processes
+    NOTIFICATIONS_CLAIM_SECONDS: float = 60.0  # a sender's claim on outbox entries, renewed at every poll
+    NOTIFICATIONS_NEW_LISTING_SECONDS: float = 86400.0  # listings created this recently are announced to matching searchers
+    
+    # Searcher lookups
+    SEARCHER_CACHE_TTL_SECONDS: float = 30.0
+    SEARCHER_CACHE_NEGATIVE_TTL_SECONDS: float = 5.0
+    SEARCHER_CACHE_MAX_ENTRIES: int = 50_000
+    SEARCHER_LAST_ACTIVE_INTERVAL_SECONDS: float = 300.0
     
     # Logging
     LOG_LEVEL: str = "INFO"
@@ -0,0 +1,20 @@
+import json
+from pathlib import Path
+from typing import Dict, List
+
+# Bundled table of campuses: id, name, city and GeoJSON [longitude, latitude].
+# The scraper pipeline reads the same file to precompute campus_distances.
+UNIVERSITIES_PATH = Path(__file__).resolve().parents[2] / "data" / "universities.json"
+
+# Listings only store distances to campuses closer than this.
+MAX_CAMPUS_DISTANCE_KM = 30
+
+
+def load_universities(path: Path = UNIVERSITIES_PATH) -> Dict[str, dict]:
+    """Universities keyed by id, in file order."""
+    with open(path, encoding="utf-8") as f:
+        entries: List[dict] = json.load(f)
+    return {entry["id"]: entry for entry in entries}
+
+
+UNIVERSITIES = load_universities()
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from app.core.config.mongodb import db
+
+logger = logging.getLogger(__name__)
+
+LEASES = "leases"
+
+
+def owner_id() -> str:
+    """Identifies this process in lease documents."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Lease:
+    """A named lease in Mongo, held by at most one process at a time.
+
+    The holder renews it before ``ttl`` seconds run out; once it stops, any
+    other process can take the lease over.
+    """
+
+    def __init__(self, name: str, ttl: float, owner: Optional[str] = None):
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner or owner_id()
+
+    async def acquire(self) -> bool:
+        """Take or renew the lease; False while another process holds it."""
+        now = datetime.utcnow()
+        try:
+            await db.db[LEASES].find_one_and_update(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.ttl)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The lease exists and is someone else's
+            return False
+        return True
+
+    async def release(self) -> None:
+        await db.db[LEASES].delete_one({"_id": self.name, "owner": self.owner})
+
+
+class LeasedService:
+    """Run a service only in the process that holds ``lease``.
+
+    Every process tries to take the lease every ``ttl / 3`` seconds. The
+    holder starts the service and keeps renewing; when a renewal fails it
+    stops the service, before the lease can expire and pass to another
+    process.
+    """
+
+    def __init__(
+        self,
+        lease: Lease,
+        start: Callable[[], Any],
+        stop: Callable[[], Awaitable[None]]
+    ):
+        self.lease = lease
+        self._start = start
+        self._stop = stop
+        self.running = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def _hold(self) -> None:
+        while True:
+            try:
+                held = await self.lease.acquire()
+            except PyMongoError as e:
+                logger.warning("Renewing the %s lease failed: %s", self.lease.name, e)
+                held = False
+            if held and not self.running:
+                logger.info("Took the %s lease; starting it here", self.lease.name)
+                try:
+                    result = self._start()
+                    if asyncio.iscoroutine(result):
+                        await result
+                    self.running = True
+                except Exception:
+                    logger.exception("Starting %s failed", self.lease.name)
+            elif not held and self.running:
+                logger.info("Lost the %s lease; stopping it here", self.lease.name)
+                self.running = False
+                await self._stop()
+            await asyncio.sleep(self.lease.ttl / 3)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._hold())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.running:
+            self.running = False
+            await self._stop()
+            try:
+                await self.lease.release()
+            except PyMongoError as e:
+                logger.warning("Releasing the %s lease failed: %s", self.lease.name, e)
@@ -0,0 +1,197 @@
+import os
+from typing import Tuple
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+
+# Label used for requests that matched no route, so scans of random paths
+# cannot blow up series cardinality.
+UNMATCHED_ROUTE = "<unmatched>"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by route template and status code.",
+    ["method", "endpoint", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last response byte.",
+    ["method", "endpoint"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Response body size.",
+    ["method", "endpoint"],
+    buckets=SIZE_BUCKETS
+)
+# The route is only known once routing has run, so in-flight requests are
+# counted per method.
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being served.",
+    ["method"],
+    multiprocess_mode="livesum"
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total",
+    "Requests rejected with 429 by the rate limiter.",
+    ["route"]
+)
+
+
+MONGODB_COMMAND_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+DOCUMENT_COUNT_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 500, 1000, 10_000)
+
+MONGODB_COMMAND_DURATION = Histogram(
+    "mongodb_command_duration_seconds",
+    "Server round trip of MongoDB commands as seen by the driver.",
+    ["collection", "command"],
+    buckets=MONGODB_COMMAND_BUCKETS
+)
+MONGODB_COMMAND_FAILURES = Counter(
+    "mongodb_command_failures_total",
+    "MongoDB commands that returned an error.",
+    ["collection", "command"]
+)
+MONGODB_DOCUMENTS_RETURNED = Histogram(
+    "mongodb_documents_returned",
+    "Documents in each find/aggregate/getMore batch or findAndModify reply.",
+    ["collection", "command"],
+    buckets=DOCUMENT_COUNT_BUCKETS
+)
+MONGODB_POOL_CHECKOUT_WAIT = Histogram(
+    "mongodb_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection.",
+    buckets=MONGODB_COMMAND_BUCKETS
+)
+MONGODB_POOL_CHECKOUT_FAILURES = Counter(
+    "mongodb_pool_checkout_failures_total",
+    "Connection checkouts that failed, by reason.",
+    ["reason"]
+)
+# Name and meaning expected by the DatabaseConnectionIssues alert.
+DB_CONNECTIONS_CURRENT = Gauge(
+    "db_connections_current",
+    "Open connections in the MongoDB driver pools.",
+    multiprocess_mode="livesum"
+)
+DB_CONNECTIONS_IN_USE = Gauge(
+    "db_connections_in_use",
+    "MongoDB connections currently checked out.",
+    multiprocess_mode="livesum"
+)
+
+
+RESULT_CACHE_LOOKUPS = Counter(
+    "result_cache_lookups_total",
+    "Result cache lookups: a hit, a miss, or an error reading or writing the shared store.",
+    ["result"]
+)
+RESULT_CACHE_WATCHING = Gauge(
+    "result_cache_watching",
+    "1 while a change stream retires cached results as the data changes.",
+    multiprocess_mode="livemin"
+)
+
+MATCHES_RECOMPUTE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+MATCHES_STALENESS_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+MATCHES_RECOMPUTED = Counter(
+    "matches_recomputed_total",
+    "Searchers whose materialized matches were rewritten, by what queued them.",
+    ["trigger"]
+)
+MATCHES_RECOMPUTE_FAILURES = Counter(
+    "matches_recompute_failures_total",
+    "Match recomputations that failed with a database error."
+)
+MATCHES_RECOMPUTE_DURATION = Histogram(
+    "matches_recompute_duration_seconds",
+    "Time to rank and rewrite one searcher's matches.",
+    buckets=MATCHES_RECOMPUTE_BUCKETS
+)
+MATCHES_STALENESS = Histogram(
+    "matches_staleness_seconds",
+    "Time from a searcher being queued to its matches being rewritten.",
+    ["trigger"],
+    buckets=MATCHES_STALENESS_BUCKETS
+)
+MATCHES_PENDING = Gauge(
+    "matches_pending_searchers",
+    "Searchers queued for a match recomputation.",
+    multiprocess_mode="livesum"
+)
+MATCHES_OLDEST_AGE = Gauge(
+    "matches_oldest_age_seconds",
+    "Age of the oldest materialized matches among active searchers, as of the last sweep.",
+    multiprocess_mode="max"
+)
+
+NOTIFICATION_DELIVERY_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+NOTIFICATIONS_SENT = Counter(
+    "notifications_sent_total",
+    "Notifications delivered to Telegram; coalesced ones count individually."
+)
+NOTIFICATIONS_FAILED = Counter(
+    "notifications_failed_total",
+    "Notifications given up on, by reason.",
+    ["reason"]
+)
+NOTIFICATIONS_RETRIED = Counter(
+    "notifications_retried_total",
+    "Sends put back in the queue, after a RetryAfter or another Telegram error.",
+    ["reason"]
+)
+NOTIFICATIONS_DELIVERY_SECONDS = Histogram(
+    "notifications_delivery_seconds",
+    "Time from a notification entering the outbox to its delivery.",
+    buckets=NOTIFICATION_DELIVERY_BUCKETS
+)
+NOTIFICATIONS_PENDING = Gauge(
+    "notifications_pending",
+    "Notifications queued in the sending process.",
+    multiprocess_mode="livesum"
+)
+
+TELEGRAM_UPDATES = Counter(
+    "telegram_updates_total",
+    "Webhook updates by outcome: processed, failed, rejected with a full queue, or relayed to the process running the bot.",
+    ["outcome"]
+)
+TELEGRAM_UPDATE_DURATION = Histogram(
+    "telegram_update_duration_seconds",
+    "Time the bot spent processing one webhook update.",
+    buckets=LATENCY_BUCKETS
+)
+TELEGRAM_UPDATES_QUEUED = Gauge(
+    "telegram_updates_queued",
+    "Webhook updates waiting to be processed.",
+    multiprocess_mode="livesum"
+)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Exposition for this process, or for all workers in multiprocess mode.
+
+    With several workers, set ``PROMETHEUS_MULTIPROC_DIR`` to an empty
+    directory shared by them before the app is imported; every worker then
+    writes its samples there and whichever one is scraped aggregates them.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
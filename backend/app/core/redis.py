@@ -0,0 +1,24 @@
+from typing import Any, Dict
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # optional dependency, only needed for shared state
+    aioredis = None
+
+    class RedisError(Exception):
+        """Stands in for ``redis.RedisError``; nothing raises it without the package."""
+
+_clients: Dict[str, Any] = {}
+
+
+def get_redis(url: str) -> Any:
+    """Return a shared asyncio client for a Redis-protocol server."""
+    if aioredis is None:
+        raise RuntimeError(
+            f"The 'redis' package is required to use {url}; install it with pip install redis"
+        )
+    client = _clients.get(url)
+    if client is None:
+        client = _clients[url] = aioredis.from_url(url)
+    return client
@@ -1,10 +1,17 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config.settings import settings
 from app.core.config.mongodb import db
+from app.core.lease import Lease, LeasedService
+from app.core.metrics import render_metrics
 from app.api.v1.router import api_router
-from app.middleware.rate_limit import RateLimitMiddleware
+from app.services.recommendations import recommendation_materializer
+from app.services.search import search_cache
+from app.middleware.rate_limit import RateLimitMiddleware, rate_limit_options
 from app.middleware.validation import ValidationMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.telegram.webhook import telegram_webhook
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -21,8 +28,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-app.add_middleware(RateLimitMiddleware)
+app.add_middleware(RateLimitMiddleware, **rate_limit_options())
 app.add_middleware(ValidationMiddleware)
+# Outermost, so rejections by the middleware above are measured too
+app.add_middleware(MetricsMiddleware)
 
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_PREFIX)
@@ -31,10 +40,38 @@ app.include_router(api_router, prefix=settings.API_V1_PREFIX)
 async def startup_db_client():
     """Initialize database connection."""
     await db.connect_to_database()
+    # Drop cached search results whenever properties change
+    app.state.search_cache_watcher = asyncio.create_task(
+        search_cache.watch(db.properties, debounce=settings.SEARCH_CACHE_INVALIDATE_SECONDS)
+    )
+    if settings.MATCHES_MATERIALIZER_ENABLED:
+        # One materializer per deployment, however many API processes run
+        app.state.materializer = LeasedService(
+            Lease("matches_materializer", settings.MATCHES_LEASE_SECONDS),
+            recommendation_materializer.start,
+            recommendation_materializer.stop
+        )
+        app.state.materializer.start()
+    if settings.TELEGRAM_WEBHOOK_ENABLED:
+        if not settings.TELEGRAM_WEBHOOK_SECRET:
+            raise ValueError("TELEGRAM_WEBHOOK_SECRET is required to receive webhook updates")
+        # One bot and one notification sender per deployment; the other
+        # processes relay the updates they receive to it
+        app.state.telegram_bot = LeasedService(
+            Lease("telegram_bot", settings.TELEGRAM_BOT_LEASE_SECONDS),
+            telegram_webhook.start,
+            telegram_webhook.stop
+        )
+        app.state.telegram_bot.start()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     """Close database connection."""
+    app.state.search_cache_watcher.cancel()
+    if settings.TELEGRAM_WEBHOOK_ENABLED:
+        await app.state.telegram_bot.stop()
+    if settings.MATCHES_MATERIALIZER_ENABLED:
+        await app.state.materializer.stop()
     await db.close_database_connection()
 
 # Root endpoint
@@ -50,3 +87,9 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
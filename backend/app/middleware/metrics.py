@@ -0,0 +1,91 @@
+import time
+from typing import Callable, Dict, Optional
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.metrics import (
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS,
+    HTTP_REQUESTS_IN_PROGRESS,
+    HTTP_RESPONSE_SIZE,
+    UNMATCHED_ROUTE
+)
+
+# Methods labelled as sent; anything else a client invents is "OTHER".
+KNOWN_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+OTHER_METHOD = "OTHER"
+
+
+class MetricsMiddleware:
+    """Record request count, latency and response size per route template.
+
+    Requests are labelled with the matched route's path template (e.g.
+    ``/api/v1/searchers/me/preferences``), never the raw path, and with
+    unknown methods collapsed into ``OTHER``, so clients cannot create new
+    series. Add it last so it wraps the rest of the stack and also sees 429s
+    and 400s produced by the other middleware.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # endpoint -> template, for routers that don't put the route in scope
+        self._templates: Dict[Callable, str] = {}
+
+    def _route_template(self, scope: Scope) -> str:
+        route = scope.get("route")
+        path_format = getattr(route, "path_format", None)
+        if path_format is not None:
+            # Included routers may match only the tail of the path; put the
+            # router prefix back in front of the route's own template.
+            params = {name: str(value) for name, value in scope.get("path_params", {}).items()}
+            try:
+                concrete = path_format.format(**params)
+            except (KeyError, IndexError, ValueError):
+                return path_format
+            path = scope["path"]
+            if concrete and path.endswith(concrete):
+                return path[:len(path) - len(concrete)] + path_format
+            return path_format
+
+        # Older Starlette doesn't record the route; routes are flat there
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        template = self._templates.get(endpoint)
+        if template is None:
+            template = UNMATCHED_ROUTE
+            for candidate in getattr(scope.get("app"), "routes", ()):
+                if getattr(candidate, "endpoint", None) is endpoint:
+                    template = candidate.path_format
+                    break
+            self._templates[endpoint] = template
+        return template
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"] if scope["method"] in KNOWN_METHODS else OTHER_METHOD
+        status: Optional[int] = None
+        size = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_progress.dec()
+            endpoint = self._route_template(scope)
+            # No response started means the app raised; the server sends a 500
+            HTTP_REQUESTS.labels(method, endpoint, str(status or 500)).inc()
+            HTTP_REQUEST_DURATION.labels(method, endpoint).observe(elapsed)
+            HTTP_RESPONSE_SIZE.labels(method, endpoint).observe(size)
@@ -1,52 +1,205 @@
-from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+import logging
 import time
-from collections import defaultdict
-import asyncio
+from collections import OrderedDict
+from typing import Any, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.core.config.settings import settings
+from app.core.metrics import RATE_LIMIT_REJECTIONS
+from app.core.redis import get_redis
+from app.telegram.webhook import SECRET_TOKEN_HEADER, valid_secret_token
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 60
+TELEGRAM_PATH_PREFIX = "/api/v1/telegram"
+TELEGRAM_WEBHOOK_PATH = f"{TELEGRAM_PATH_PREFIX}/webhook"
+_SECRET_TOKEN_HEADER = SECRET_TOKEN_HEADER.lower().encode("latin-1")
+KEY_PARTS = ("ip", "telegram_id", "route")
+
+
+class MemoryRateLimitBackend:
+    """Per-process window counters with LRU eviction of idle keys."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # key -> [window index, count in that window, count in the window before]
+        self._counters: "OrderedDict[str, List[int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    async def increment(self, key: str, window: int) -> Tuple[int, int]:
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = [window, 0, 0]
+            while len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+        else:
+            self._counters.move_to_end(key)
+            if counter[0] != window:
+                # Roll forward; anything older than the last window is irrelevant
+                counter[2] = counter[1] if counter[0] == window - 1 else 0
+                counter[0], counter[1] = window, 0
+        counter[1] += 1
+        return counter[1], counter[2]
+
+
+class RedisRateLimitBackend:
+    """Window counters shared by every worker through a Redis-protocol server."""
+
+    def __init__(self, client: Any, prefix: str = "ratelimit"):
+        self.client = client
+        self.prefix = prefix
+
+    async def increment(self, key: str, window: int) -> Tuple[int, int]:
+        current_key = f"{self.prefix}:{key}:{window}"
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.incr(current_key)
+            pipe.expire(current_key, WINDOW_SECONDS * 2)
+            pipe.get(f"{self.prefix}:{key}:{window - 1}")
+            current, _, previous = await pipe.execute()
+        return int(current), int(previous or 0)
+
+
+class RateLimitMiddleware:
+    """Sliding-window-counter rate limiting with constant work per request.
+
+    Each key keeps a count for the current and previous fixed window; the
+    previous count is weighted by how much of it still overlaps the sliding
+    window. Keys combine any of ``ip``, ``telegram_id`` and ``route``.
+
+    ``telegram_id`` comes from the query string, so anyone can send a new
+    one with every request: keys with it always include the client address,
+    and ``ip_requests_per_minute`` caps what one address sends in total.
+    When the shared backend fails, limits fall back to this process's own
+    counters rather than failing requests.
+
+    Webhook deliveries carrying the secret token are not limited: they all
+    come from Telegram's few addresses, or from the proxy's one.
+    """
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
     def __init__(
         self,
-        app,
+        app: ASGIApp,
         requests_per_minute: int = 60,
-        telegram_requests_per_minute: int = 120
+        telegram_requests_per_minute: int = 120,
+        key_parts: Sequence[str] = ("ip",),
+        backend_url: Optional[str] = None,
+        max_keys: int = 100_000,
+        ip_requests_per_minute: Optional[int] = None
     ):
-        super().__init__(app)
+        self.app = app
         self.requests_per_minute = requests_per_minute
         self.telegram_requests_per_minute = telegram_requests_per_minute
-        self.request_counts = defaultdict(list)
-        
-    async def dispatch(self, request: Request, call_next):
-        # Get client IP
-        client_ip = request.client.host
-        
+        self.ip_requests_per_minute = ip_requests_per_minute
+        unknown = set(key_parts) - set(KEY_PARTS)
+        if unknown:
+            raise ValueError(f"Unknown rate limit key parts: {', '.join(sorted(unknown))}")
+        self.key_parts = tuple(key_parts)
+        self.backend = (
+            RedisRateLimitBackend(get_redis(backend_url)) if backend_url
+            else MemoryRateLimitBackend(max_keys)
+        )
+        self.fallback = MemoryRateLimitBackend(max_keys) if backend_url else None
+        self._fallback_logged_window: Optional[int] = None
+
+    def _key(self, scope: Scope, client_ip: str, route_class: str) -> str:
+        parts = []
+        for part in self.key_parts:
+            if part == "ip":
+                parts.append(client_ip)
+            elif part == "telegram_id":
+                query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+                parts.append(query.get("telegram_id", [""])[0])
+            else:
+                parts.append(route_class)
+        if "telegram_id" in self.key_parts and "ip" not in self.key_parts:
+            # Unverified, so a telegram_id only ever narrows the client address
+            parts.insert(0, client_ip)
+        return ":".join(parts)
+
+    async def _increment(self, key: str, window: int) -> Tuple[int, int]:
+        try:
+            return await self.backend.increment(key, window)
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            # Fail open to per-process limits; log once per window
+            if self._fallback_logged_window != window:
+                self._fallback_logged_window = window
+                logger.warning("Shared rate limit backend failed, limiting per process: %s", e)
+            return await self.fallback.increment(key, window)
+
+    @staticmethod
+    def _verified_webhook(scope: Scope) -> bool:
+        if scope["path"] != TELEGRAM_WEBHOOK_PATH:
+            return False
+        for name, value in scope.get("headers", ()):
+            if name == _SECRET_TOKEN_HEADER:
+                return valid_secret_token(value.decode("latin-1"))
+        return False
+
+    @staticmethod
+    def _over(counts: Tuple[int, int], elapsed: float, limit: int) -> bool:
+        current, previous = counts
+        return current + previous * (1 - elapsed) > limit
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._verified_webhook(scope):
+            await self.app(scope, receive, send)
+            return
+
         # Check if it's a Telegram webhook request
-        is_telegram = request.url.path.startswith("/api/v1/telegram")
+        is_telegram = scope["path"].startswith(TELEGRAM_PATH_PREFIX)
+        route_class = "telegram" if is_telegram else "api"
         rate_limit = (
             self.telegram_requests_per_minute if is_telegram
             else self.requests_per_minute
         )
-        
-        # Clean old requests
-        current_time = time.time()
-        self.request_counts[client_ip] = [
-            req_time for req_time in self.request_counts[client_ip]
-            if current_time - req_time < 60
-        ]
-        
+
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+        now = time.time()
+        window = int(now // WINDOW_SECONDS)
+        elapsed = (now % WINDOW_SECONDS) / WINDOW_SECONDS
+        over = self._over(
+            await self._increment(self._key(scope, client_ip, route_class), window),
+            elapsed,
+            rate_limit
+        )
+        if not over and self.ip_requests_per_minute and "telegram_id" in self.key_parts:
+            over = self._over(
+                await self._increment(f"ip-total:{client_ip}", window),
+                elapsed,
+                self.ip_requests_per_minute
+            )
+
         # Check rate limit
-        if len(self.request_counts[client_ip]) >= rate_limit:
-            return JSONResponse(
+        if over:
+            RATE_LIMIT_REJECTIONS.labels(route_class).inc()
+            response = JSONResponse(
                 status_code=429,
                 content={
                     "detail": "Too many requests. Please try again later."
-                }
+                },
+                headers={"Retry-After": str(int(WINDOW_SECONDS * (1 - elapsed)) + 1)}
             )
-        
-        # Add current request
-        self.request_counts[client_ip].append(current_time)
-        
+            await response(scope, receive, send)
+            return
+
         # Process request
-        response = await call_next(request)
-        return response
+        await self.app(scope, receive, send)
+
+
+def rate_limit_options() -> dict:
+    """Middleware keyword arguments from settings."""
+    return {
+        "requests_per_minute": settings.MAX_REQUESTS_PER_MINUTE,
+        "telegram_requests_per_minute": settings.TELEGRAM_REQUESTS_PER_MINUTE,
+        "key_parts": [part.strip() for part in settings.RATE_LIMIT_KEY.split(",") if part.strip()],
+        "backend_url": settings.RATE_LIMIT_URL,
+        "max_keys": settings.RATE_LIMIT_MAX_KEYS,
+        "ip_requests_per_minute": settings.RATE_LIMIT_IP_REQUESTS_PER_MINUTE
+    }
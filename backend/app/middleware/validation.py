@@ -1,117 +1,137 @@
-from fastapi import Request, HTTPException
-from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
 import json
-from typing import Dict, Any
+from typing import Any, List, Optional, Tuple
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.api.routing import JSON_BODY_STATE_KEY
+
+
+class RequestValidationError(Exception):
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class ValidationMiddleware:
+    """Validate JSON bodies of POST and PUT requests as raw ASGI middleware.
+
+    The size limit is enforced from ``Content-Length`` and again while the
+    body streams in, before it is buffered in full. The body is decoded
+    once and checked in a single pass; the decoded value is left in
+    ``scope["state"]`` for ``ParsedBodyRoute`` so endpoints do not parse it
+    again.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_body_size: int = 1_000_000,
+        max_depth: int = 10,
+        max_key_length: int = 100,
+        max_string_length: int = 10_000,
+        max_array_items: int = 1000
+    ):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.max_depth = max_depth
+        self.max_key_length = max_key_length
+        self.max_string_length = max_string_length
+        self.max_array_items = max_array_items
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Only validate POST and PUT requests
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            await self.app(scope, receive, send)
+            return
 
-class ValidationMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
         try:
-            # Only validate POST and PUT requests
-            if request.method in ["POST", "PUT"]:
-                body = await self._get_request_body(request)
-                if body:
-                    await self._validate_request_body(body)
-            
-            response = await call_next(request)
-            return response
-            
-        except HTTPException as e:
-            return JSONResponse(
+            body, more_messages = await self._read_body(scope, receive)
+            if body:
+                parsed = self._parse(body)
+                self._validate(parsed)
+                scope.setdefault("state", {})[JSON_BODY_STATE_KEY] = parsed
+        except RequestValidationError as e:
+            response = JSONResponse(
                 status_code=e.status_code,
-                content={"detail": str(e.detail)}
+                content={"detail": e.detail}
             )
-        except Exception as e:
-            return JSONResponse(
-                status_code=400,
-                content={"detail": str(e)}
-            )
-    
-    async def _get_request_body(self, request: Request) -> Dict[str, Any]:
-        """Get and parse request body."""
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, self._replay(body, more_messages, receive), send)
+
+    async def _read_body(self, scope: Scope, receive: Receive) -> Tuple[bytes, bool]:
+        """Buffer the request body, rejecting it as soon as it is too large."""
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    raise RequestValidationError("Invalid Content-Length header")
+                if declared > self.max_body_size:
+                    raise RequestValidationError("Request body too large")
+                break
+
+        chunks: List[bytes] = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return b"".join(chunks), False
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_size:
+                raise RequestValidationError("Request body too large")
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                return b"".join(chunks), True
+
+    @staticmethod
+    def _replay(body: bytes, read_all: bool, receive: Receive) -> Receive:
+        """Hand the buffered body to the app, then defer to the real channel."""
+        sent = False
+
+        async def replay() -> Message:
+            nonlocal sent
+            if not sent and read_all:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return replay
+
+    @staticmethod
+    def _parse(body: bytes) -> Any:
         try:
-            body = await request.body()
-            if body:
-                return json.loads(body)
-            return {}
-        except json.JSONDecodeError:
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid JSON format in request body"
-            )
-    
-    async def _validate_request_body(self, body: Dict[str, Any]):
-        """Validate request body content."""
-        # Validate maximum depth
-        if self._get_json_depth(body) > 10:
-            raise HTTPException(
-                status_code=400,
-                detail="Request body nested too deeply"
-            )
-        
-        # Validate maximum length
-        if len(str(body)) > 1000000:  # 1MB limit
-            raise HTTPException(
-                status_code=400,
-                detail="Request body too large"
-            )
-        
-        # Validate field types and values
-        self._validate_field_types(body)
-    
-    def _get_json_depth(self, obj: Any, current_depth: int = 0) -> int:
-        """Calculate the maximum depth of a JSON object."""
-        if current_depth > 10:  # Early exit for efficiency
-            return current_depth
-        
-        if isinstance(obj, dict):
-            if not obj:
-                return current_depth
-            return max(
-                self._get_json_depth(v, current_depth + 1)
-                for v in obj.values()
-            )
-        elif isinstance(obj, list):
-            if not obj:
-                return current_depth
-            return max(
-                self._get_json_depth(item, current_depth + 1)
-                for item in obj
-            )
-        return current_depth
-    
-    def _validate_field_types(self, body: Dict[str, Any]):
-        """Validate field types and values."""
-        for key, value in body.items():
-            # Validate field names
-            if not isinstance(key, str):
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Field name must be string, got {type(key)}"
-                )
-            
-            if len(key) > 100:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Field name too long: {key}"
-                )
-            
-            # Validate string values
-            if isinstance(value, str):
-                if len(value) > 10000:  # 10KB limit for string values
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Field value too long: {key}"
-                    )
-            
-            # Validate arrays
+            return json.loads(body)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise RequestValidationError("Invalid JSON format in request body")
+
+    def _validate(self, body: Any) -> None:
+        """Check depth, key and value sizes in one iterative walk."""
+        stack: List[Tuple[Any, int, Optional[str]]] = [(body, 0, None)]
+        while stack:
+            value, depth, key = stack.pop()
+            if depth > self.max_depth:
+                raise RequestValidationError("Request body nested too deeply")
+
+            if isinstance(value, dict):
+                for child_key, child in value.items():
+                    if len(child_key) > self.max_key_length:
+                        raise RequestValidationError(f"Field name too long: {child_key}")
+                    if isinstance(child, (dict, list)):
+                        stack.append((child, depth + 1, child_key))
+                    elif isinstance(child, str) and len(child) > self.max_string_length:
+                        raise RequestValidationError(f"Field value too long: {child_key}")
+                    elif depth + 1 > self.max_depth:
+                        raise RequestValidationError("Request body nested too deeply")
             elif isinstance(value, list):
-                if len(value) > 1000:  # 1000 items limit
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Too many items in array: {key}"
-                    )
-            
-            # Validate nested objects
-            elif isinstance(value, dict):
-                self._validate_field_types(value)
+                if len(value) > self.max_array_items:
+                    raise RequestValidationError(f"Too many items in array: {key}")
+                for child in value:
+                    if isinstance(child, (dict, list)):
+                        stack.append((child, depth + 1, key))
+                    elif isinstance(child, str) and len(child) > self.max_string_length:
+                        raise RequestValidationError(f"Field value too long: {key}")
+                    elif depth + 1 > self.max_depth:
+                        raise RequestValidationError("Request body nested too deeply")
@@ -1,34 +1,59 @@
 from datetime import datetime
 from typing import Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from telegram import Update
 from telegram.ext import ContextTypes
 from app.core.config.settings import settings
 from app.core.config.mongodb import db
-from app.models.entities.searcher import Searcher, SearcherType
+from app.models.entities.searcher import Searcher, SearcherStatus, SearcherType
+from app.services.searcher import SearcherService
+from app.services.searcher_cache import searcher_cache
 
 
 class TelegramAuth:
     @staticmethod
     async def get_or_create_searcher(telegram_id: str, searcher_type: SearcherType = SearcherType.ANY) -> Searcher:
         """Get existing searcher or create a new one."""
-        searcher_data = await db.db.searchers.find_one({"telegram_user_id": telegram_id})
+        cached = searcher_cache.get(telegram_id)
+        if isinstance(cached, Searcher):
+            # Refresh last_active at most once per interval per searcher
+            now = datetime.utcnow()
+            if (now - cached.last_active).total_seconds() >= settings.SEARCHER_LAST_ACTIVE_INTERVAL_SECONDS:
+                await db.db.searchers.update_one(
+                    {"telegram_user_id": telegram_id},
+                    {"$set": {"last_active": now}}
+                )
+                cached = cached.model_copy(update={"last_active": now})
+                searcher_cache.set(telegram_id, cached)
+            return cached
         
-        if searcher_data:
-            # Update last_active
-            await db.db.searchers.update_one(
-                {"telegram_user_id": telegram_id},
-                {"$set": {"last_active": datetime.utcnow()}}
-            )
-            return Searcher(**searcher_data)
-        
-        # Create new searcher
+        # Load or create in one atomic upsert; concurrent /start taps cannot
+        # both insert, because telegram_user_id is unique
+        now = datetime.utcnow()
         new_searcher = Searcher(
             telegram_user_id=telegram_id,
-            searcher_type=searcher_type
-        )
-        
-        await db.db.searchers.insert_one(new_searcher.model_dump())
-        return new_searcher
+            searcher_type=searcher_type,
+            last_active=now
+        ).model_dump(exclude={"telegram_user_id", "last_active"})
+        update = {"$set": {"last_active": now}, "$setOnInsert": new_searcher}
+        try:
+            searcher_data = await db.db.searchers.find_one_and_update(
+                {"telegram_user_id": telegram_id},
+                update,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Lost an insert race the server did not retry; the document exists now
+            searcher_data = await db.db.searchers.find_one_and_update(
+                {"telegram_user_id": telegram_id},
+                update,
+                return_document=ReturnDocument.AFTER
+            )
+        searcher = Searcher(**searcher_data)
+        searcher_cache.set(telegram_id, searcher)
+        return searcher
 
     @staticmethod
     async def handle_telegram_login(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[Searcher]:
@@ -42,24 +67,22 @@ class TelegramAuth:
     @staticmethod
     async def verify_telegram_user(telegram_id: str) -> bool:
         """Verify if a Telegram user exists and is active."""
-        searcher = await db.db.searchers.find_one({"telegram_user_id": telegram_id})
-        return searcher is not None and searcher.get("status") == "active"
+        searcher = await SearcherService.get_searcher(telegram_id)
+        return searcher is not None and searcher.status == SearcherStatus.ACTIVE
         
     @staticmethod
     async def update_searcher_type(telegram_id: str, searcher_type: SearcherType) -> Optional[Searcher]:
         """Update searcher type."""
-        result = await db.db.searchers.update_one(
+        searcher_data = await db.db.searchers.find_one_and_update(
             {"telegram_user_id": telegram_id},
             {
                 "$set": {
                     "searcher_type": searcher_type,
                     "updated_at": datetime.utcnow()
                 }
-            }
+            },
+            return_document=ReturnDocument.AFTER
         )
-        
-        if result.modified_count:
-            searcher_data = await db.db.searchers.find_one({"telegram_user_id": telegram_id})
-            return Searcher(**searcher_data) if searcher_data else None
-            
-        return None
+        searcher = Searcher(**searcher_data) if searcher_data else None
+        searcher_cache.set(telegram_id, searcher)
+        return searcher
@@ -0,0 +1,214 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Set, Tuple
+from app.core.config.mongodb import db
+from app.models.entities.searcher import (
+    Searcher,
+    SearcherStatus,
+    SearchPreferences
+)
+
+logger = logging.getLogger(__name__)
+
+# Width (in euros) of the price buckets a searcher's price range is spread over.
+PRICE_BUCKET_SIZE = 50
+
+# Ranges spanning more buckets than this go to a per-city overflow set instead.
+MAX_BUCKETS_PER_RANGE = 200
+
+REQUIREMENT_BITS = {
+    "furnished": 1,
+    "internet": 2,
+    "utilities_included": 4,
+}
+
+
+def requirements_mask(requirements: Mapping[str, Any]) -> int:
+    """Pack requirement flags (from preferences or a property) into a bitmask."""
+    mask = 0
+    for field, bit in REQUIREMENT_BITS.items():
+        if requirements.get(field):
+            mask |= bit
+    return mask
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """Mongo hands back naive UTC datetimes; normalise aware ones to match."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@dataclass(slots=True)
+class _Entry:
+    telegram_user_id: str
+    price_min: float
+    price_max: float
+    cities: Tuple[str, ...]
+    areas: FrozenSet[str]
+    move_in: datetime
+    duration: int
+    mask: int
+    keys: Tuple[Tuple[str, int], ...]
+
+
+class MatchingEngine:
+    """In-memory reverse index from property attributes to interested searchers.
+
+    Mirrors the filter built by ``SearchService.search_properties``: a property
+    matches a searcher when its city (and area, if the searcher picked any),
+    price, availability, minimum stay and requirement flags all fit the
+    searcher's preferences.
+    """
+
+    def __init__(self, bucket_size: int = PRICE_BUCKET_SIZE):
+        self.bucket_size = bucket_size
+        self._entries: Dict[str, _Entry] = {}
+        # (city, price bucket) -> telegram ids
+        self._buckets: Dict[Tuple[str, int], Set[str]] = {}
+        # city -> telegram ids whose price range is too wide to bucket
+        self._wide: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, telegram_id: str) -> bool:
+        return telegram_id in self._entries
+
+    def _bucket(self, price: float) -> int:
+        return int(price // self.bucket_size)
+
+    def upsert(self, telegram_id: str, preferences: SearchPreferences) -> None:
+        """Index (or re-index) a searcher's preferences."""
+        self.remove(telegram_id)
+
+        cities = tuple(dict.fromkeys(preferences.location.cities))
+        low = self._bucket(preferences.price_range.min)
+        high = self._bucket(preferences.price_range.max)
+        keys: Tuple[Tuple[str, int], ...] = ()
+        if high - low < MAX_BUCKETS_PER_RANGE:
+            keys = tuple(
+                (city, bucket)
+                for city in cities
+                for bucket in range(low, high + 1)
+            )
+            for key in keys:
+                self._buckets.setdefault(key, set()).add(telegram_id)
+        else:
+            for city in cities:
+                self._wide.setdefault(city, set()).add(telegram_id)
+
+        self._entries[telegram_id] = _Entry(
+            telegram_user_id=telegram_id,
+            price_min=preferences.price_range.min,
+            price_max=preferences.price_range.max,
+            cities=cities,
+            areas=frozenset(preferences.location.areas),
+            move_in=_naive_utc(preferences.dates.move_in),
+            duration=preferences.dates.duration,
+            mask=requirements_mask(preferences.requirements.model_dump()),
+            keys=keys
+        )
+
+    def remove(self, telegram_id: str) -> None:
+        """Drop a searcher from the index, if present."""
+        entry = self._entries.pop(telegram_id, None)
+        if entry is None:
+            return
+        if entry.keys:
+            for key in entry.keys:
+                ids = self._buckets.get(key)
+                if ids is not None:
+                    ids.discard(telegram_id)
+                    if not ids:
+                        del self._buckets[key]
+        else:
+            for city in entry.cities:
+                ids = self._wide.get(city)
+                if ids is not None:
+                    ids.discard(telegram_id)
+                    if not ids:
+                        del self._wide[city]
+
+    def sync(self, searcher: Searcher) -> None:
+        """Bring the index in line with a searcher's current state."""
+        if searcher.status == SearcherStatus.ACTIVE and searcher.search_preferences:
+            self.upsert(searcher.telegram_user_id, searcher.search_preferences)
+        else:
+            self.remove(searcher.telegram_user_id)
+
+    def sync_document(self, searcher: Mapping[str, Any]) -> None:
+        """``sync`` for a raw ``searchers`` document."""
+        preferences = searcher.get("search_preferences")
+        if searcher.get("status") == SearcherStatus.ACTIVE and preferences:
+            self.upsert(searcher["telegram_user_id"], SearchPreferences(**preferences))
+        else:
+            self.remove(searcher["telegram_user_id"])
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._buckets.clear()
+        self._wide.clear()
+
+    def match(self, prop: Mapping[str, Any]) -> List[str]:
+        """Return the telegram ids of searchers interested in a property document."""
+        if prop.get("status") != "active":
+            return []
+        price = prop.get("price")
+        city = prop.get("city")
+        available_from = prop.get("available_from")
+        minimum_stay = prop.get("minimum_stay")
+        if (
+            not isinstance(price, (int, float))
+            or city is None
+            or available_from is None
+            or minimum_stay is None
+        ):
+            return []
+
+        candidates: Iterable[str] = self._buckets.get((city, self._bucket(price)), ())
+        wide = self._wide.get(city)
+        if wide:
+            candidates = wide.union(candidates)
+
+        available_from = _naive_utc(available_from)
+        area = prop.get("area")
+        mask = requirements_mask(prop)
+        matches = []
+        for telegram_id in candidates:
+            entry = self._entries[telegram_id]
+            if not entry.price_min <= price <= entry.price_max:
+                continue
+            if entry.areas and area not in entry.areas:
+                continue
+            if available_from > entry.move_in or minimum_stay > entry.duration:
+                continue
+            if entry.mask & mask != entry.mask:
+                continue
+            matches.append(telegram_id)
+        return matches
+
+    async def load(self) -> int:
+        """Rebuild the index from every active searcher with preferences."""
+        self.clear()
+        cursor = db.db.searchers.find(
+            {
+                "status": SearcherStatus.ACTIVE,
+                "search_preferences": {"$ne": None}
+            },
+            {"telegram_user_id": 1, "search_preferences": 1}
+        )
+        async for searcher_data in cursor:
+            try:
+                preferences = SearchPreferences(**searcher_data["search_preferences"])
+            except ValueError as e:
+                # Stored in a shape that no longer validates; it matches nothing
+                logger.warning("Not indexing searcher %s: %s", searcher_data["telegram_user_id"], e)
+                continue
+            self.upsert(searcher_data["telegram_user_id"], preferences)
+        return len(self._entries)
+
+
+# Global instance
+matching_engine = MatchingEngine()
@@ -0,0 +1,60 @@
+import base64
+import binascii
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+from bson import json_util
+
+SortSpec = Sequence[Tuple[str, int]]
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the sort-key values of the last returned document as an opaque token."""
+    raw = json_util.dumps(list(values)).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: SortSpec) -> List[Any]:
+    """Decode a cursor token, raising ``ValueError`` if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json_util.loads(raw)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise ValueError("Invalid pagination cursor") from e
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise ValueError("Invalid pagination cursor")
+    return values
+
+
+def cursor_for(document: Mapping[str, Any], sort: SortSpec) -> str:
+    """Build the cursor that resumes right after ``document``."""
+    return encode_cursor([document.get(field) for field, _ in sort])
+
+
+def keyset_filter(sort: SortSpec, values: Sequence[Any]) -> Dict[str, Any]:
+    """Filter matching documents strictly after ``values`` in ``sort`` order.
+
+    For a sort on (a desc, _id desc) this expands to
+    ``{a: {"$lte": va}, "$or": [{a: {"$lt": va}}, {a: va, _id: {"$lt": vid}}]}``.
+    The redundant bound on the leading key lets the planner turn it into
+    index bounds instead of filtering the ``$or`` after the scan.
+    """
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        branch = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort[:i])}
+        branch[field] = {"$lt" if direction < 0 else "$gt": values[i]}
+        branches.append(branch)
+    leading_field, leading_direction = sort[0]
+    return {
+        leading_field: {"$lte" if leading_direction < 0 else "$gte": values[0]},
+        "$or": branches
+    }
+
+
+def paginate_query(
+    query: Dict[str, Any],
+    sort: SortSpec,
+    cursor: Optional[str]
+) -> Dict[str, Any]:
+    """Combine a search query with the keyset filter for ``cursor``, if any."""
+    if not cursor:
+        return query
+    return {"$and": [query, keyset_filter(sort, decode_cursor(cursor, sort))]}
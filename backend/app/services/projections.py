@@ -0,0 +1,92 @@
+import re
+from typing import Any, Dict, Iterable, Optional
+
+# What a list view shows for each property.
+CARD_FIELDS = (
+    "title",
+    "price",
+    "city",
+    "area",
+    "images",
+    "available_from",
+    "furnished",
+    "internet",
+    "utilities_included",
+    "created_at",
+)
+# What a single-property view shows; internal bookkeeping stays out.
+DETAIL_FIELDS = CARD_FIELDS + (
+    "description",
+    "minimum_stay",
+    "location",
+    "source",
+    "source_url",
+    "status",
+    "updated_at",
+    # Near-duplicates found on other sources, collapsed under this listing
+    "alternates",
+)
+VIEWS = {"card": CARD_FIELDS, "detail": DETAIL_FIELDS, "full": None}
+
+# Array fields a card keeps only the first elements of.
+CARD_SLICES = {"images": 1}
+
+MAX_FIELDS = 30
+_FIELD_NAME = re.compile(r"^[A-Za-z][A-Za-z0-9_]{0,63}$")
+
+
+def resolve_projection(view: str = "full", fields: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Find-style projection for a named view, or for a comma-separated ``fields`` list.
+
+    ``fields`` takes precedence over ``view``. ``None`` means whole documents.
+    """
+    if fields is not None:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        if not names:
+            raise ValueError("fields must name at least one field")
+        if len(names) > MAX_FIELDS:
+            raise ValueError(f"At most {MAX_FIELDS} fields can be selected")
+        invalid = [name for name in names if not _FIELD_NAME.match(name)]
+        if invalid:
+            raise ValueError(f"Invalid field names: {', '.join(invalid)}")
+        return dict.fromkeys(names, 1)
+
+    if view not in VIEWS:
+        raise ValueError(f"Unknown view: {view}; expected one of {', '.join(VIEWS)}")
+    selected = VIEWS[view]
+    if selected is None:
+        return None
+    projection: Dict[str, Any] = dict.fromkeys(selected, 1)
+    if view == "card":
+        for field, count in CARD_SLICES.items():
+            projection[field] = {"$slice": count}
+    return projection
+
+
+def with_fields(projection: Optional[Dict[str, Any]], fields: Iterable[str]) -> Optional[Dict[str, Any]]:
+    """Add fields the server needs back, such as sort keys for the next cursor."""
+    if projection is None:
+        return None
+    return {**projection, **{field: 1 for field in fields if field not in projection}}
+
+
+def project_stage(projection: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The same projection as an aggregation ``$project`` stage.
+
+    ``$slice`` takes an array expression there rather than a count alone.
+    """
+    if projection is None:
+        return None
+    stage = {}
+    for field, value in projection.items():
+        if isinstance(value, dict) and "$slice" in value:
+            value = {"$slice": [f"${field}", value["$slice"]]}
+        stage[field] = value
+    return {"$project": stage}
+
+
+def nested(projection: Optional[Dict[str, Any]], prefix: str) -> Optional[Dict[str, Any]]:
+    """Find-style projection applied to a subdocument at ``prefix``."""
+    if projection is None:
+        return None
+    return {f"{prefix}.{field}": value for field, value in projection.items()}
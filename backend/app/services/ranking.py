@@ -0,0 +1,181 @@
+from datetime import datetime, timezone
+from operator import itemgetter
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+from app.models.entities.searcher import SearchPreferences
+from app.services.matching import REQUIREMENT_BITS, requirements_mask
+
+# Relative weight of each component; every component scores 0..1.
+RANKING_WEIGHTS = {
+    "price": 0.30,
+    "area": 0.15,
+    "requirements": 0.20,
+    "move_in": 0.10,
+    "freshness": 0.15,
+    "distance": 0.10,
+}
+
+# Prices this far outside the range (as a fraction of the bound) score 0.
+PRICE_TOLERANCE = 0.10
+# Days between availability and move-in at which that component halves.
+MOVE_IN_HALF_LIFE_DAYS = 30.0
+# Listing age at which freshness halves.
+FRESHNESS_HALF_LIFE_DAYS = 14.0
+# Campus distance at which that component halves.
+DISTANCE_HALF_KM = 2.0
+
+# Newest candidates first; the same order as SearchService's PROPERTIES_SORT,
+# which the partial city index serves.
+CANDIDATE_SORT = [("created_at", -1), ("_id", -1)]
+
+# Set bits per value of a requirements mask.
+_POPCOUNT = np.array([bin(value).count("1") for value in range(1 << len(REQUIREMENT_BITS))])
+_EPOCH = datetime(1970, 1, 1)
+_MS_PER_DAY = 86_400_000.0
+_NAN = float("nan")
+
+
+def _seconds(value: datetime) -> float:
+    """Seconds since the epoch; Mongo hands back naive UTC datetimes."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH).total_seconds()
+
+
+def candidates_query(preferences: SearchPreferences) -> dict:
+    """Properties worth ranking for a searcher: its filter, relaxed on price."""
+    return {
+        "status": "active",
+        "price": {
+            "$gte": preferences.price_range.min * (1 - PRICE_TOLERANCE),
+            "$lte": preferences.price_range.max * (1 + PRICE_TOLERANCE)
+        },
+        "city": {"$in": preferences.location.cities},
+        "available_from": {"$lte": preferences.dates.move_in}
+    }
+
+
+def candidate_pipeline(preferences: SearchPreferences, limit: int) -> List[dict]:
+    """Aggregation returning the newest ``limit`` candidates as ranking rows."""
+    return [
+        {"$match": candidates_query(preferences)},
+        {"$sort": dict(CANDIDATE_SORT)},
+        {"$limit": limit},
+        {"$project": ranking_projection()}
+    ]
+
+
+def ranking_projection(university: Optional[str] = None) -> Dict[str, Any]:
+    """``$project`` that reduces a property to the numbers the ranker reads.
+
+    The server does the per-document conversions (dates to epoch
+    milliseconds, requirement flags to a bitmask, nearest campus distance),
+    so turning the rows into arrays is a plain copy per column. Missing
+    values come back as NaN.
+    """
+    if university is None:
+        distance = {"$min": {"$map": {
+            "input": {"$objectToArray": {"$ifNull": ["$campus_distances", {}]}},
+            "in": "$$this.v"
+        }}}
+    else:
+        distance = f"$campus_distances.{university}"
+    return {
+        "price": {"$ifNull": ["$price", _NAN]},
+        "area": {"$ifNull": ["$area", None]},
+        "mask": {"$add": [
+            {"$cond": [{"$eq": [f"${field}", True]}, bit, 0]}
+            for field, bit in REQUIREMENT_BITS.items()
+        ]},
+        # date minus date is milliseconds
+        "available_from": {"$ifNull": [{"$subtract": ["$available_from", _EPOCH]}, _NAN]},
+        "created_at": {"$ifNull": [{"$subtract": ["$created_at", _EPOCH]}, _NAN]},
+        "distance": {"$ifNull": [distance, _NAN]},
+    }
+
+
+def candidate_columns(rows: Sequence[Mapping[str, Any]]) -> Dict[str, np.ndarray]:
+    """Turn projected candidate rows into one array per ranked field."""
+    count = len(rows)
+    columns = {
+        field: np.fromiter(map(itemgetter(field), rows), np.float64, count)
+        for field in ("price", "available_from", "created_at", "distance")
+    }
+    columns["mask"] = np.fromiter(map(itemgetter("mask"), rows), np.int64, count)
+    columns["area"] = np.array(list(map(itemgetter("area"), rows)), dtype=object)
+    return columns
+
+
+def score_columns(
+    columns: Mapping[str, np.ndarray],
+    preferences: SearchPreferences,
+    now: datetime,
+    weights: Mapping[str, float] = RANKING_WEIGHTS
+) -> np.ndarray:
+    """Weighted relevance of every candidate at once."""
+    low, high = preferences.price_range.min, preferences.price_range.max
+    price = columns["price"]
+    # Full marks inside the range, a little more for the cheaper end;
+    # linear decay to zero across the tolerance outside it.
+    span = max(high - low, 1.0)
+    inside = 1.0 - 0.25 * (price - low) / span
+    below = 1.0 - (low - price) / max(low * PRICE_TOLERANCE, 1.0)
+    above = 1.0 - (price - high) / max(high * PRICE_TOLERANCE, 1.0)
+    price_score = np.where(price < low, below, np.where(price > high, above, inside))
+    price_score = np.nan_to_num(np.clip(price_score, 0.0, 1.0))
+
+    areas = preferences.location.areas
+    area_score = (
+        np.isin(columns["area"], areas).astype(np.float64) if areas
+        else np.ones(len(price))
+    )
+
+    wanted = requirements_mask(preferences.requirements.model_dump())
+    requirement_score = (
+        _POPCOUNT[columns["mask"] & wanted] / _POPCOUNT[wanted] if wanted
+        else np.ones(len(price))
+    )
+
+    move_in = _seconds(preferences.dates.move_in) * 1000
+    gap_days = np.abs(move_in - columns["available_from"]) / _MS_PER_DAY
+    move_in_score = np.nan_to_num(0.5 ** (gap_days / MOVE_IN_HALF_LIFE_DAYS))
+
+    age_days = np.maximum(_seconds(now) * 1000 - columns["created_at"], 0.0) / _MS_PER_DAY
+    freshness_score = np.nan_to_num(0.5 ** (age_days / FRESHNESS_HALF_LIFE_DAYS))
+
+    # Listings without coordinates get no credit for distance
+    distance_score = np.nan_to_num(0.5 ** (columns["distance"] / 1000 / DISTANCE_HALF_KM))
+
+    return (
+        weights["price"] * price_score
+        + weights["area"] * area_score
+        + weights["requirements"] * requirement_score
+        + weights["move_in"] * move_in_score
+        + weights["freshness"] * freshness_score
+        + weights["distance"] * distance_score
+    )
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` best scores, best first, without a full sort."""
+    if k <= 0 or not len(scores):
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        best = np.argpartition(-scores, k - 1)[:k]
+    else:
+        best = np.arange(len(scores))
+    return best[np.argsort(-scores[best], kind="stable")]
+
+
+def rank_candidates(
+    rows: Sequence[Mapping[str, Any]],
+    preferences: SearchPreferences,
+    limit: int,
+    now: Optional[datetime] = None
+) -> List[Tuple[Any, float]]:
+    """``(_id, score)`` of the ``limit`` most relevant rows, best first."""
+    if not rows:
+        return []
+    columns = candidate_columns(rows)
+    scores = score_columns(columns, preferences, now or datetime.now(timezone.utc))
+    return [(rows[index]["_id"], float(scores[index])) for index in top_k(scores, limit)]
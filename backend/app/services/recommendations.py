@@ -0,0 +1,425 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+from pymongo import DeleteMany, UpdateOne
+from pymongo.errors import PyMongoError
+from app.core.config.mongodb import db
+from app.core.config.settings import settings
+from app.core.metrics import (
+    MATCHES_OLDEST_AGE,
+    MATCHES_PENDING,
+    MATCHES_RECOMPUTE_DURATION,
+    MATCHES_RECOMPUTE_FAILURES,
+    MATCHES_RECOMPUTED,
+    MATCHES_STALENESS
+)
+from app.models.entities.searcher import SearcherStatus, SearchPreferences
+from app.services.matching import matching_engine
+from app.services.projections import nested
+from app.services.ranking import candidate_pipeline, rank_candidates
+from app.telegram.notifications import listing_message, notification_dispatcher
+
+logger = logging.getLogger(__name__)
+
+# ``matches`` documents written by the materializer carry this status.
+RECOMMENDED = "recommended"
+MATCHES_SORT = [("score", -1)]
+
+# Properties read per poll when no change stream is available.
+POLL_BATCH_SIZE = 1000
+
+# Searcher writes that can change what the matching engine indexes; the
+# materializer's own matches_computed_at and last_active touches leave
+# updated_at alone and are skipped.
+SEARCHER_CHANGES = [{"$match": {
+    "operationType": {"$in": ["insert", "update", "replace"]},
+    "$or": [
+        {"operationType": {"$ne": "update"}},
+        {"updateDescription.updatedFields.updated_at": {"$exists": True}}
+    ]
+}}]
+
+
+async def rank_properties(
+    preferences: SearchPreferences,
+    limit: int,
+    projection: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """The ``limit`` best properties for ``preferences``, each with its ``score``.
+
+    Properties are loaded in full unless a ``projection`` is given.
+    """
+    rows = await db.db.properties.aggregate(
+        candidate_pipeline(preferences, settings.RECOMMENDATION_CANDIDATES)
+    ).to_list(length=settings.RECOMMENDATION_CANDIDATES)
+    ranked = rank_candidates(rows, preferences, limit)
+    if not ranked:
+        return []
+
+    properties = {
+        doc["_id"]: doc
+        async for doc in db.db.properties.find(
+            {"_id": {"$in": [_id for _id, _ in ranked]}},
+            projection
+        )
+    }
+    return [
+        {**properties[_id], "score": score}
+        for _id, score in ranked if _id in properties
+    ]
+
+
+class RecommendationMaterializer:
+    """Keep each searcher's top recommendations precomputed in ``matches``.
+
+    Searchers are marked dirty when their preferences change and when a
+    property they match (or already hold) is written. Workers drain the
+    dirty set, coalescing repeated requests, and replace the searcher's
+    ``matches`` documents with the current top ``MATCHES_TOP_K``. A sweep
+    re-queues searchers whose matches are older than
+    ``MATCHES_MAX_AGE_SECONDS``, which bounds staleness from changes no
+    trigger sees (for example properties only inside the relaxed price range).
+    """
+
+    def __init__(
+        self,
+        top_k: int = settings.MATCHES_TOP_K,
+        workers: int = settings.MATCHES_WORKERS,
+        max_age: float = settings.MATCHES_MAX_AGE_SECONDS,
+        sweep_interval: float = settings.MATCHES_SWEEP_SECONDS,
+        poll_interval: float = settings.MATCHES_POLL_SECONDS
+    ):
+        self.top_k = top_k
+        self.workers = workers
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self.poll_interval = poll_interval
+        # telegram id -> (when it was first marked dirty, what triggered it)
+        self._dirty: Dict[str, Tuple[float, str]] = {}
+        self._running: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self.recomputed = 0
+        self.failures = 0
+        self.started_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._dirty)
+
+    def request(self, telegram_id: str, trigger: str = "request") -> None:
+        """Mark a searcher's matches as out of date.
+
+        Ignored until ``start``; processes that do not run the materializer
+        (such as the bot) rely on ``SearcherService`` clearing
+        ``matches_computed_at``, which the next sweep picks up.
+        """
+        if self._wakeup is None:
+            return
+        if telegram_id not in self._dirty:
+            self._dirty[telegram_id] = (time.monotonic(), trigger)
+            MATCHES_PENDING.set(len(self._dirty))
+        self._wakeup.set()
+
+    def request_many(self, telegram_ids: Iterable[str], trigger: str) -> None:
+        for telegram_id in telegram_ids:
+            self.request(telegram_id, trigger)
+
+    async def recompute(self, telegram_id: str) -> List[Dict[str, Any]]:
+        """Rewrite one searcher's matches now and return them, best first."""
+        searcher = await db.db.searchers.find_one(
+            {"telegram_user_id": telegram_id},
+            {"status": 1, "search_preferences": 1}
+        )
+        if (
+            not searcher
+            or searcher.get("status") != SearcherStatus.ACTIVE
+            or not searcher.get("search_preferences")
+        ):
+            await db.db.matches.delete_many({"searcher_id": telegram_id, "status": RECOMMENDED})
+            return []
+
+        preferences = SearchPreferences(**searcher["search_preferences"])
+        properties = await rank_properties(preferences, self.top_k)
+        # BSON dates keep milliseconds; truncate so the stale-match cutoff
+        # below cannot catch the documents this pass writes
+        now = datetime.utcnow()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        operations: List[Any] = [
+            UpdateOne(
+                {"searcher_id": telegram_id, "property_id": prop["_id"], "status": RECOMMENDED},
+                {
+                    "$set": {
+                        "score": prop["score"],
+                        "rank": rank,
+                        "property": {key: value for key, value in prop.items() if key != "score"},
+                        "computed_at": now
+                    },
+                    "$setOnInsert": {"created_at": now}
+                },
+                upsert=True
+            )
+            for rank, prop in enumerate(properties)
+        ]
+        # Whatever this pass did not rewrite has dropped out of the top k
+        operations.append(DeleteMany({
+            "searcher_id": telegram_id,
+            "status": RECOMMENDED,
+            "computed_at": {"$lt": now}
+        }))
+        await db.db.matches.bulk_write(operations, ordered=True)
+        await db.db.searchers.update_one(
+            {"telegram_user_id": telegram_id},
+            {"$set": {"matches_computed_at": now}}
+        )
+        return properties
+
+    def _next(self) -> Optional[Tuple[str, float, str]]:
+        """Oldest dirty searcher that no worker is recomputing."""
+        for telegram_id, (requested_at, trigger) in self._dirty.items():
+            if telegram_id not in self._running:
+                del self._dirty[telegram_id]
+                MATCHES_PENDING.set(len(self._dirty))
+                return telegram_id, requested_at, trigger
+        return None
+
+    async def _worker(self) -> None:
+        while True:
+            job = self._next()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            telegram_id, requested_at, trigger = job
+            self._running.add(telegram_id)
+            started = time.monotonic()
+            try:
+                await self.recompute(telegram_id)
+            except PyMongoError as e:
+                self.failures += 1
+                MATCHES_RECOMPUTE_FAILURES.inc()
+                logger.warning("Recomputing matches of %s failed: %s", telegram_id, e)
+                # Leave it to the sweep rather than retrying in a tight loop
+                continue
+            except Exception:
+                # Such as preferences stored in an older shape; keep the worker alive
+                self.failures += 1
+                MATCHES_RECOMPUTE_FAILURES.inc()
+                logger.exception("Recomputing matches of %s failed", telegram_id)
+                continue
+            finally:
+                self._running.discard(telegram_id)
+                # A request that arrived meanwhile may be waiting on this one
+                self._wakeup.set()
+            finished = time.monotonic()
+            self.recomputed += 1
+            MATCHES_RECOMPUTED.labels(trigger).inc()
+            MATCHES_RECOMPUTE_DURATION.observe(finished - started)
+            MATCHES_STALENESS.labels(trigger).observe(finished - requested_at)
+
+    async def properties_changed(self, properties: List[Mapping[str, Any]]) -> None:
+        """Queue searchers who match changed properties or already hold them.
+
+        Searchers matching a new listing are also sent an alert.
+        """
+        affected: Set[str] = set()
+        new_since = datetime.utcnow() - timedelta(seconds=settings.NOTIFICATIONS_NEW_LISTING_SECONDS)
+        for prop in properties:
+            matched = matching_engine.match(prop)
+            affected.update(matched)
+            created_at = prop.get("created_at")
+            if settings.NOTIFICATIONS_ENABLED and created_at is not None and created_at >= new_since:
+                await self._notify(prop, matched)
+        holders = await db.db.matches.distinct(
+            "searcher_id",
+            {"property_id": {"$in": [prop["_id"] for prop in properties]}, "status": RECOMMENDED}
+        )
+        affected.update(holders)
+        self.request_many(affected, "property")
+
+    @staticmethod
+    async def _notify(prop: Mapping[str, Any], telegram_ids: Iterable[str]) -> None:
+        """Queue a new listing's alert for searchers; once per chat and listing."""
+        # Private chats share the user's id
+        chat_ids = [int(telegram_id) for telegram_id in telegram_ids if telegram_id.isdigit()]
+        try:
+            await notification_dispatcher.enqueue_many(
+                chat_ids, listing_message(prop), property_id=prop["_id"], listed_at=prop.get("created_at")
+            )
+        except PyMongoError as e:
+            logger.warning("Queueing alerts for property %s failed: %s", prop["_id"], e)
+
+    async def watch_properties(self) -> None:
+        """Follow property writes through a change stream, or poll ``updated_at``.
+
+        Change streams need a replica set; on a standalone server this falls
+        back to polling every ``MATCHES_POLL_SECONDS``.
+        """
+        try:
+            async with db.db.properties.watch(
+                [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}],
+                full_document="updateLookup"
+            ) as stream:
+                async for change in stream:
+                    batch = [change]
+                    # Scraper flushes arrive as bursts; handle them together
+                    while len(batch) < POLL_BATCH_SIZE:
+                        change = await stream.try_next()
+                        if change is None:
+                            break
+                        batch.append(change)
+                    documents = [c["fullDocument"] for c in batch if c.get("fullDocument")]
+                    if documents:
+                        await self.properties_changed(documents)
+        except PyMongoError as e:
+            logger.info("Polling properties for matches instead of watching them: %s", e)
+            await self._poll_properties()
+
+    async def _poll_properties(self) -> None:
+        await self._poll(db.db.properties, self.properties_changed, datetime.utcnow())
+
+    async def _poll(
+        self,
+        collection: Any,
+        changed: Callable[[List[Mapping[str, Any]]], Awaitable[None]],
+        since: datetime
+    ) -> None:
+        """Hand ``changed`` the documents of ``collection`` written after ``since``."""
+        # (updated_at, _id) of the last document handled: a bulk write stamps
+        # a whole batch with one updated_at, which a page may end inside of
+        watermark: Tuple[datetime, Any] = (since, None)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                while True:
+                    updated_at, last_id = watermark
+                    query: Dict[str, Any] = {"updated_at": {"$gt": updated_at}}
+                    if last_id is not None:
+                        query = {"$or": [query, {"updated_at": updated_at, "_id": {"$gt": last_id}}]}
+                    documents = await collection.find(query).sort(
+                        [("updated_at", 1), ("_id", 1)]
+                    ).limit(POLL_BATCH_SIZE).to_list(length=POLL_BATCH_SIZE)
+                    if not documents:
+                        break
+                    watermark = (documents[-1]["updated_at"], documents[-1]["_id"])
+                    await changed(documents)
+                    if len(documents) < POLL_BATCH_SIZE:
+                        break
+            except PyMongoError as e:
+                logger.warning("Polling %s for matches failed: %s", collection.name, e)
+
+    async def searchers_changed(self, searchers: List[Mapping[str, Any]]) -> None:
+        """Re-index written searchers in the matching engine."""
+        for searcher in searchers:
+            try:
+                matching_engine.sync_document(searcher)
+            except ValueError as e:
+                # Preferences in a shape that no longer validates match nothing
+                matching_engine.remove(searcher["telegram_user_id"])
+                logger.warning("Indexing searcher %s failed: %s", searcher["telegram_user_id"], e)
+
+    async def watch_searchers(self) -> None:
+        """Keep ``matching_engine`` in line with searcher writes from every process.
+
+        The engine is reloaded first, so a process taking over the lease does
+        not match against what it indexed at startup. Writes, including the
+        bot's, are followed like properties: through a change stream, or by
+        polling ``updated_at``.
+        """
+        try:
+            async with db.db.searchers.watch(
+                SEARCHER_CHANGES, full_document="updateLookup"
+            ) as stream:
+                # Opened first, so nothing written during the load is missed
+                await matching_engine.load()
+                async for change in stream:
+                    if change.get("fullDocument"):
+                        await self.searchers_changed([change["fullDocument"]])
+        except PyMongoError as e:
+            logger.info("Polling searchers for matches instead of watching them: %s", e)
+            since = datetime.utcnow()
+            await matching_engine.load()
+            await self._poll(db.db.searchers, self.searchers_changed, since)
+
+    async def sweep(self) -> int:
+        """Queue searchers whose matches are older than ``max_age``; report the oldest."""
+        active = {"status": SearcherStatus.ACTIVE, "search_preferences": {"$ne": None}}
+        cutoff = datetime.utcnow() - timedelta(seconds=self.max_age)
+        # Missing or null means never computed, or preferences changed since
+        stale = await db.db.searchers.find(
+            {**active, "matches_computed_at": {"$not": {"$gte": cutoff}}},
+            {"telegram_user_id": 1}
+        ).to_list(length=None)
+        self.request_many((doc["telegram_user_id"] for doc in stale), "sweep")
+
+        oldest = await db.db.searchers.find_one(
+            active,
+            {"matches_computed_at": 1},
+            sort=[("matches_computed_at", 1)]
+        )
+        if oldest is not None:
+            computed_at = oldest.get("matches_computed_at")
+            MATCHES_OLDEST_AGE.set(
+                (datetime.utcnow() - computed_at).total_seconds() if computed_at
+                else float("inf")
+            )
+        return len(stale)
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except PyMongoError as e:
+                logger.warning("Sweeping stale matches failed: %s", e)
+            await asyncio.sleep(self.sweep_interval)
+
+    def start(self) -> None:
+        """Start the workers, the searcher and property watchers and the staleness sweep."""
+        self._wakeup = asyncio.Event()
+        self.started_at = time.monotonic()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self.watch_searchers()))
+        self._tasks.append(asyncio.create_task(self.watch_properties()))
+        self._tasks.append(asyncio.create_task(self._sweep_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+        self._dirty.clear()
+
+    async def get(
+        self,
+        telegram_id: str,
+        limit: int,
+        projection: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Materialized matches of a searcher, best first: one indexed read."""
+        matches = await db.db.matches.find(
+            {"searcher_id": telegram_id, "status": RECOMMENDED},
+            {**(nested(projection, "property") or {"property": 1}), "score": 1}
+        ).sort(MATCHES_SORT).limit(limit).to_list(length=limit)
+        return [{**match["property"], "score": match["score"]} for match in matches]
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started_at
+        now = time.monotonic()
+        return {
+            "pending": len(self._dirty),
+            "running": len(self._running),
+            "recomputed": self.recomputed,
+            "failures": self.failures,
+            "recomputed_per_second": self.recomputed / elapsed if elapsed else 0.0,
+            "oldest_pending_seconds": max(
+                (now - requested_at for requested_at, _ in self._dirty.values()),
+                default=0.0
+            )
+        }
+
+
+# Global instance
+recommendation_materializer = RecommendationMaterializer()
@@ -1,15 +1,48 @@
+import asyncio
 from typing import List, Optional
 from datetime import datetime
-from app.models.entities.searcher import SearchPreferences
+from app.models.entities.searcher import Requirements, SearchPreferences
+from app.core.cache import TTLCache, create_result_cache
 from app.core.config.mongodb import db
+from app.core.config.settings import settings
+from app.core.config.universities import UNIVERSITIES
+from app.services.pagination import cursor_for, decode_cursor, keyset_filter, paginate_query
+from app.services.projections import project_stage, with_fields
+from app.services.ranking import candidates_query
+from app.services.recommendations import rank_properties, recommendation_materializer
+from app.services.searcher import SearcherService
 from motor.motor_asyncio import AsyncIOMotorClient
-from bson import ObjectId
+from bson import ObjectId, json_util
+
+# Sort orders used for pagination; ``_id`` makes every sort key unique so
+# that cursors resume exactly where the previous page stopped.
+PROPERTIES_SORT = [("created_at", -1), ("_id", -1)]
+TEXT_SORT = [("score", -1), ("created_at", -1), ("_id", -1)]
+
+# Totals per normalized query, reused by ``approximate_total`` requests.
+_total_counts = TTLCache(ttl=settings.SEARCH_TOTAL_CACHE_TTL_SECONDS, max_entries=10_000)
+
+# Results of search_properties / search_by_text, invalidated on property writes.
+search_cache = create_result_cache(
+    settings.SEARCH_CACHE_URL,
+    prefix="search",
+    ttl=settings.SEARCH_CACHE_TTL_SECONDS,
+    max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+    enabled=settings.SEARCH_CACHE_ENABLED
+)
+
+
+def _possibly_stale(result: dict) -> dict:
+    """A cached page served without change-stream invalidation may be out of date."""
+    if "total" not in result:
+        return result
+    return {**result, "total_approximate": True}
+
 
 class SearchService:
     @staticmethod
-    async def search_properties(preferences: SearchPreferences, page: int = 1, limit: int = 10):
-        """Search for properties based on searcher preferences."""
-        # Build the search query
+    def build_preferences_query(preferences: SearchPreferences) -> dict:
+        """Build the properties filter for a searcher's preferences."""
         query = {
             "status": "active",
             "price": {
@@ -33,45 +66,141 @@ class SearchService:
         if preferences.requirements.utilities_included:
             query["utilities_included"] = True
         
+        return query
+
+    @staticmethod
+    async def search_properties(
+        preferences: SearchPreferences,
+        page: int = 1,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        approximate_total: bool = False,
+        projection: Optional[dict] = None
+    ):
+        """Search for properties based on searcher preferences.
+
+        Pages with ``page`` (skip/limit) or, when ``cursor`` is given, with
+        keyset pagination on ``PROPERTIES_SORT``. Cursor pages carry no total.
+        ``projection`` (see ``app.services.projections``) limits the fields
+        returned for each property.
+        """
+        query = SearchService.build_preferences_query(preferences)
+        return await search_cache.get_or_compute(
+            {
+                "search": "properties",
+                "query": query,
+                "page": page,
+                "limit": limit,
+                "cursor": cursor,
+                "approximate_total": approximate_total,
+                "projection": projection
+            },
+            lambda: SearchService._search_properties(
+                query, page, limit, cursor, approximate_total, projection
+            ),
+            on_unwatched_hit=_possibly_stale
+        )
+
+    @staticmethod
+    async def _search_properties(
+        query: dict,
+        page: int,
+        limit: int,
+        cursor: Optional[str],
+        approximate_total: bool,
+        projection: Optional[dict] = None
+    ) -> dict:
+        # The next cursor is built from the sort keys of the last document
+        projection = with_fields(projection, [field for field, _ in PROPERTIES_SORT])
+        if cursor:
+            results = db.properties.find(
+                paginate_query(query, PROPERTIES_SORT, cursor),
+                projection
+            ).sort(PROPERTIES_SORT).limit(limit + 1)
+            properties = await results.to_list(length=limit + 1)
+            return SearchService._cursor_page(properties, limit, PROPERTIES_SORT)
+        
         # Calculate skip for pagination
         skip = (page - 1) * limit
         
-        # Execute search
-        cursor = db.properties.find(query)
-        
-        # Get total count
-        total = await cursor.count()
-        
-        # Apply pagination
-        cursor = cursor.skip(skip).limit(limit)
+        pipeline = [
+            {"$match": query},
+            {"$sort": dict(PROPERTIES_SORT)}
+        ]
+        return await SearchService._paged_with_total(
+            pipeline, query, page, skip, limit, PROPERTIES_SORT, approximate_total, projection
+        )
+
+    @staticmethod
+    async def _paged_with_total(
+        pipeline: List[dict],
+        query: dict,
+        page: int,
+        skip: int,
+        limit: int,
+        sort,
+        approximate_total: bool,
+        projection: Optional[dict] = None
+    ) -> dict:
+        """Run a page of ``pipeline`` and, concurrently, count its total.
+
+        The page keeps ``$sort`` next to ``$skip``/``$limit``, so the server
+        reads the top ``skip + limit`` documents off the index instead of
+        sorting every match. With ``approximate_total`` a total counted for
+        the same query within the last few seconds is reused and only the
+        page itself is fetched. ``projection`` is applied to the page only,
+        after ``$limit``.
+        """
+        count_key = json_util.dumps(query, sort_keys=True)
+        total = _total_counts.get(count_key) if approximate_total else None
+        total_approximate = total is not None
+        page_stages = [{"$skip": skip}, {"$limit": limit + 1}]
+        if projection is not None:
+            page_stages.append(project_stage(projection))
+        page_query = db.properties.aggregate(pipeline + page_stages).to_list(length=limit + 1)
         
-        # Convert cursor to list
-        properties = await cursor.to_list(length=limit)
+        if total is not None:
+            properties = await page_query
+        else:
+            # Ordering and computed fields do not change the count
+            count_stages = [
+                stage for stage in pipeline
+                if "$sort" not in stage and "$addFields" not in stage
+            ]
+            properties, counted = await asyncio.gather(
+                page_query,
+                db.properties.aggregate(count_stages + [{"$count": "count"}]).to_list(length=1)
+            )
+            total = counted[0]["count"] if counted else 0
+            _total_counts.set(count_key, total)
         
         return {
-            "properties": properties,
+            **SearchService._cursor_page(properties, limit, sort),
             "total": total,
+            "total_approximate": total_approximate,
             "page": page,
             "pages": (total + limit - 1) // limit
         }
+
+    @staticmethod
+    def _cursor_page(properties: List[dict], limit: int, sort) -> dict:
+        """Trim the look-ahead document and derive the next cursor from the page."""
+        has_more = len(properties) > limit
+        properties = properties[:limit]
+        return {
+            "properties": properties,
+            "next_cursor": cursor_for(properties[-1], sort) if has_more and sort else None,
+            "limit": limit
+        }
     
     @staticmethod
-    async def search_by_text(
+    def build_text_query(
         query: str,
         city: Optional[str] = None,
         min_price: Optional[float] = None,
-        max_price: Optional[float] = None,
-        page: int = 1,
-        limit: int = 10
-    ):
-        """Search properties by text query with optional filters."""
-        # Create text index if it doesn't exist
-        await db.properties.create_index([
-            ("description", "text"),
-            ("title", "text")
-        ])
-        
-        # Build search query
+        max_price: Optional[float] = None
+    ) -> dict:
+        """Build the properties filter for a text search."""
         search_query = {
             "$text": {"$search": query},
             "status": "active"
@@ -85,56 +214,226 @@ class SearchService:
         if max_price is not None:
             search_query.setdefault("price", {})["$lte"] = max_price
         
+        return search_query
+
+    @staticmethod
+    async def search_by_text(
+        query: str,
+        city: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        page: int = 1,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        approximate_total: bool = False,
+        projection: Optional[dict] = None
+    ):
+        """Search properties by text query with optional filters."""
+        # Case and spacing do not change $text results, so share cache entries
+        query = " ".join(query.lower().split())
+        search_query = SearchService.build_text_query(query, city, min_price, max_price)
+        return await search_cache.get_or_compute(
+            {
+                "search": "text",
+                "query": search_query,
+                "page": page,
+                "limit": limit,
+                "cursor": cursor,
+                "approximate_total": approximate_total,
+                "projection": projection
+            },
+            lambda: SearchService._search_by_text(
+                search_query, page, limit, cursor, approximate_total, projection
+            ),
+            on_unwatched_hit=_possibly_stale
+        )
+
+    @staticmethod
+    async def _search_by_text(
+        search_query: dict,
+        page: int,
+        limit: int,
+        cursor: Optional[str],
+        approximate_total: bool,
+        projection: Optional[dict] = None
+    ) -> dict:
+        projection = with_fields(projection, [field for field, _ in TEXT_SORT])
+        if cursor:
+            # textScore is only addressable after $addFields, so resume with
+            # an aggregation rather than a find filter.
+            pipeline = [
+                {"$match": search_query},
+                {"$addFields": {"score": {"$meta": "textScore"}}},
+                {"$match": keyset_filter(TEXT_SORT, decode_cursor(cursor, TEXT_SORT))},
+                {"$sort": dict(TEXT_SORT)},
+                {"$limit": limit + 1}
+            ]
+            if projection is not None:
+                pipeline.append(project_stage(projection))
+            properties = await db.properties.aggregate(pipeline).to_list(length=limit + 1)
+            return SearchService._cursor_page(properties, limit, TEXT_SORT)
+        
         # Calculate skip for pagination
         skip = (page - 1) * limit
         
-        # Execute search with text score sorting
-        cursor = db.properties.find(
-            search_query,
-            {"score": {"$meta": "textScore"}}
-        ).sort([
-            ("score", {"$meta": "textScore"}),
-            ("created_at", -1)
-        ])
-        
-        # Get total count
-        total = await cursor.count()
-        
-        # Apply pagination
-        cursor = cursor.skip(skip).limit(limit)
-        
-        # Convert cursor to list
-        properties = await cursor.to_list(length=limit)
-        
-        return {
-            "properties": properties,
-            "total": total,
-            "page": page,
-            "pages": (total + limit - 1) // limit
-        }
+        # Sort by text score, newest first among equal scores
+        pipeline = [
+            {"$match": search_query},
+            {"$addFields": {"score": {"$meta": "textScore"}}},
+            {"$sort": dict(TEXT_SORT)}
+        ]
+        return await SearchService._paged_with_total(
+            pipeline, search_query, page, skip, limit, TEXT_SORT, approximate_total, projection
+        )
     
     @staticmethod
-    async def get_property_recommendations(searcher_id: str, limit: int = 5):
-        """Get property recommendations based on searcher preferences."""
-        # Get searcher preferences
-        searcher = await db.searchers.find_one({"telegram_id": searcher_id})
-        if not searcher or not searcher.get("preferences"):
-            return []
-        
-        preferences = SearchPreferences(**searcher["preferences"])
-        
-        # Search for properties with a bit more relaxed criteria
-        query = {
-            "status": "active",
-            "price": {
-                "$gte": preferences.price_range.min * 0.9,  # 10% below min
-                "$lte": preferences.price_range.max * 1.1   # 10% above max
+    def build_near_query(
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        requirements: Optional[Requirements] = None
+    ) -> dict:
+        """Build the properties filter applied within a near search's radius."""
+        query = {"status": "active"}
+        if min_price is not None:
+            query.setdefault("price", {})["$gte"] = min_price
+        if max_price is not None:
+            query.setdefault("price", {})["$lte"] = max_price
+        if requirements is not None:
+            if requirements.furnished:
+                query["furnished"] = True
+            if requirements.internet:
+                query["internet"] = True
+            if requirements.utilities_included:
+                query["utilities_included"] = True
+        return query
+
+    @staticmethod
+    def build_near_pipeline(
+        query: dict,
+        radius_km: float,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        university: Optional[str] = None
+    ) -> List[dict]:
+        """Stages selecting ``query`` matches within ``radius_km``, nearest first.
+
+        Around a point this is ``$geoNear`` on the ``location`` index. Around
+        a named university it reads the ``campus_distances`` computed at
+        ingestion, so no distance is computed per query. Either way each
+        result carries its ``distance`` in metres.
+        """
+        radius = radius_km * 1000
+        if university is not None:
+            if latitude is not None or longitude is not None:
+                raise ValueError("Search near a point or a university, not both")
+            if university not in UNIVERSITIES:
+                raise ValueError(f"Unknown university: {university}")
+            field = f"campus_distances.{university}"
+            return [
+                {"$match": {**query, field: {"$lte": radius}}},
+                {"$sort": {field: 1, "_id": 1}},
+                {"$addFields": {"distance": f"${field}"}}
+            ]
+
+        if latitude is None or longitude is None:
+            raise ValueError("A near search needs latitude and longitude, or a university")
+        return [{
+            "$geoNear": {
+                "near": {"type": "Point", "coordinates": [longitude, latitude]},
+                "key": "location",
+                "distanceField": "distance",
+                "maxDistance": radius,
+                "query": query,
+                "spherical": True
+            }
+        }]
+
+    @staticmethod
+    async def search_near(
+        radius_km: float,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        university: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        requirements: Optional[Requirements] = None,
+        page: int = 1,
+        limit: int = 10,
+        approximate_total: bool = False,
+        projection: Optional[dict] = None
+    ):
+        """Search properties within a radius of a point or a university, nearest first."""
+        query = SearchService.build_near_query(min_price, max_price, requirements)
+        pipeline = SearchService.build_near_pipeline(
+            query, radius_km, latitude, longitude, university
+        )
+        return await search_cache.get_or_compute(
+            {
+                "search": "near",
+                "pipeline": pipeline,
+                "page": page,
+                "limit": limit,
+                "approximate_total": approximate_total,
+                "projection": projection
             },
-            "city": {"$in": preferences.location.cities},
-            "available_from": {"$lte": preferences.dates.move_in}
-        }
-        
-        # Execute search
-        properties = await db.properties.find(query).limit(limit).to_list(length=limit)
+            # Distance order has no cursor; the first stage holds the whole filter
+            lambda: SearchService._paged_with_total(
+                pipeline, pipeline[0], page, (page - 1) * limit, limit, None,
+                approximate_total, with_fields(projection, ["distance"])
+            ),
+            on_unwatched_hit=_possibly_stale
+        )
+
+    @staticmethod
+    def export_properties(
+        city: str,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        projection: Optional[dict] = None,
+        limit: int = settings.EXPORT_MAX_ROWS,
+        batch_size: int = settings.EXPORT_BATCH_SIZE
+    ):
+        """Cursor over the newest ``limit`` active properties in ``city``.
+
+        Neither cached nor paged: Motor fetches the next ``batch_size``
+        documents only once the caller has consumed the previous batch. The
+        sort follows the partial city index, so no in-memory sort is needed.
+        """
+        query = {"status": "active", "city": city}
+        if min_price is not None:
+            query.setdefault("price", {})["$gte"] = min_price
+        if max_price is not None:
+            query.setdefault("price", {})["$lte"] = max_price
+        return (
+            db.properties.find(query, projection)
+            .sort(PROPERTIES_SORT)
+            .limit(limit)
+            .batch_size(batch_size)
+        )
+
+    @staticmethod
+    def build_recommendations_query(preferences: SearchPreferences) -> dict:
+        """Build the properties filter for recommendations."""
+        # Search for properties with a bit more relaxed criteria
+        return candidates_query(preferences)
+
+    @staticmethod
+    async def get_property_recommendations(
+        searcher_id: str,
+        limit: int = 5,
+        projection: Optional[dict] = None
+    ):
+        """Get the best-ranked properties for a searcher's preferences.
+
+        Served from the matches materialized by ``RecommendationMaterializer``.
+        A searcher with none yet is ranked on the spot and queued.
+        """
+        recommendations = await recommendation_materializer.get(searcher_id, limit, projection)
+        if recommendations:
+            return recommendations
         
-        return properties
+        searcher = await SearcherService.get_searcher(searcher_id)
+        if not searcher or not searcher.search_preferences:
+            return []
+        recommendation_materializer.request(searcher_id, "request")
+        return await rank_properties(searcher.search_preferences, limit, projection)
@@ -1,5 +1,6 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
+from pymongo import ReturnDocument
 from app.core.config.mongodb import db
 from app.models.entities.searcher import (
     Searcher,
@@ -7,6 +8,9 @@ from app.models.entities.searcher import (
     SearcherStatus,
     SearchPreferences
 )
+from app.services.matching import matching_engine
+from app.services.recommendations import recommendation_materializer
+from app.services.searcher_cache import MISSING, searcher_cache
 
 
 class SearcherService:
@@ -19,13 +23,38 @@ class SearcherService:
         )
         
         await db.db.searchers.insert_one(searcher.model_dump())
+        searcher_cache.set(telegram_id, searcher)
         return searcher
 
     @staticmethod
     async def get_searcher(telegram_id: str) -> Optional[Searcher]:
         """Get a searcher by Telegram ID."""
+        cached = searcher_cache.get(telegram_id)
+        if cached is MISSING:
+            return None
+        if cached is not None:
+            return cached
+        
         searcher_data = await db.db.searchers.find_one({"telegram_user_id": telegram_id})
-        return Searcher(**searcher_data) if searcher_data else None
+        searcher = Searcher(**searcher_data) if searcher_data else None
+        searcher_cache.set(telegram_id, searcher)
+        return searcher
+
+    @staticmethod
+    async def _update(telegram_id: str, fields: Dict[str, Any]) -> Optional[Searcher]:
+        """Set ``fields`` and return the updated searcher in one round trip.
+
+        Returns None only when there is no such searcher; an update that
+        changes nothing still returns it.
+        """
+        searcher_data = await db.db.searchers.find_one_and_update(
+            {"telegram_user_id": telegram_id},
+            {"$set": {**fields, "updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        searcher = Searcher(**searcher_data) if searcher_data else None
+        searcher_cache.set(telegram_id, searcher)
+        return searcher
 
     @staticmethod
     async def update_preferences(
@@ -33,21 +62,18 @@ class SearcherService:
         preferences: SearchPreferences
     ) -> Optional[Searcher]:
         """Update searcher preferences."""
-        result = await db.db.searchers.update_one(
-            {"telegram_user_id": telegram_id},
+        searcher = await SearcherService._update(
+            telegram_id,
             {
-                "$set": {
-                    "search_preferences": preferences.model_dump(),
-                    "updated_at": datetime.utcnow()
-                }
+                "search_preferences": preferences.model_dump(),
+                # Lets the materializer's sweep see the change from any process
+                "matches_computed_at": None
             }
         )
-        
-        if result.modified_count:
-            searcher_data = await db.db.searchers.find_one({"telegram_user_id": telegram_id})
-            return Searcher(**searcher_data) if searcher_data else None
-        
-        return None
+        if searcher:
+            matching_engine.sync(searcher)
+            recommendation_materializer.request(telegram_id, "preferences")
+        return searcher
 
     @staticmethod
     async def update_status(
@@ -55,21 +81,11 @@ class SearcherService:
         status: SearcherStatus
     ) -> Optional[Searcher]:
         """Update searcher status."""
-        result = await db.db.searchers.update_one(
-            {"telegram_user_id": telegram_id},
-            {
-                "$set": {
-                    "status": status,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-        
-        if result.modified_count:
-            searcher_data = await db.db.searchers.find_one({"telegram_user_id": telegram_id})
-            return Searcher(**searcher_data) if searcher_data else None
-        
-        return None
+        searcher = await SearcherService._update(telegram_id, {"status": status})
+        if searcher:
+            matching_engine.sync(searcher)
+            recommendation_materializer.request(telegram_id, "status")
+        return searcher
 
     @staticmethod
     async def delete_searcher(telegram_id: str) -> bool:
@@ -83,6 +99,9 @@ class SearcherService:
                 }
             }
         )
+        matching_engine.remove(telegram_id)
+        searcher_cache.invalidate(telegram_id)
+        recommendation_materializer.request(telegram_id, "status")
         return result.modified_count > 0
 
     @staticmethod
@@ -107,3 +126,4 @@ class SearcherService:
             {"telegram_user_id": telegram_id},
             {"$set": {"last_active": datetime.utcnow()}}
         )
+        searcher_cache.invalidate(telegram_id)
@@ -0,0 +1,44 @@
+from typing import Optional, Union
+from app.core.cache import TTLCache
+from app.core.config.settings import settings
+from app.models.entities.searcher import Searcher
+
+# Cached marker for "no searcher with this Telegram ID".
+MISSING = object()
+
+
+class SearcherCache:
+    """Short-lived in-process cache of searcher lookups by Telegram ID.
+
+    Absent searchers are cached too (for a shorter time) so repeated calls
+    from unknown IDs do not each hit Mongo. Writers must call ``invalidate``
+    or ``set``; other processes see changes once the TTL runs out.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float, max_entries: int):
+        self.negative_ttl = negative_ttl
+        self._entries = TTLCache(ttl=ttl, max_entries=max_entries)
+
+    def get(self, telegram_id: str) -> Union[Searcher, object, None]:
+        """Return the cached searcher, ``MISSING``, or ``None`` if not cached."""
+        return self._entries.get(telegram_id)
+
+    def set(self, telegram_id: str, searcher: Optional[Searcher]) -> None:
+        if searcher is None:
+            self._entries.set(telegram_id, MISSING, ttl=self.negative_ttl)
+        else:
+            self._entries.set(telegram_id, searcher)
+
+    def invalidate(self, telegram_id: str) -> None:
+        self._entries.pop(telegram_id)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# Global instance
+searcher_cache = SearcherCache(
+    ttl=settings.SEARCHER_CACHE_TTL_SECONDS,
+    negative_ttl=settings.SEARCHER_CACHE_NEGATIVE_TTL_SECONDS,
+    max_entries=settings.SEARCHER_CACHE_MAX_ENTRIES
+)
@@ -1,5 +1,8 @@
+import asyncio
 from telegram.ext import Application, CommandHandler
 from app.core.config.settings import settings
+from app.telegram.notifications import notification_dispatcher
+from app.telegram.persistence import MongoPersistence
 from app.telegram.handlers.searcher_handlers import (
     get_searcher_conversation_handler,
 )
@@ -17,10 +20,19 @@ async def help_command(update, context):
     )
     await update.message.reply_text(help_text)
 
-def create_application() -> Application:
-    """Create and configure the bot application."""
+def create_application(webhook: bool = False) -> Application:
+    """Create and configure the bot application.
+
+    With ``webhook`` there is no updater; updates arrive through the API
+    (see ``app.telegram.webhook``).
+    """
     # Create application
-    application = Application.builder().token(settings.TELEGRAM_BOT_TOKEN).build()
+    builder = Application.builder().token(settings.TELEGRAM_BOT_TOKEN).persistence(MongoPersistence())
+    if settings.TELEGRAM_API_BASE_URL:
+        builder = builder.base_url(settings.TELEGRAM_API_BASE_URL)
+    if webhook:
+        builder = builder.updater(None)
+    application = builder.build()
 
     # Add conversation handler
     application.add_handler(get_searcher_conversation_handler())
@@ -31,13 +43,23 @@ def create_application() -> Application:
     return application
 
 async def start_bot():
-    """Start the bot."""
+    """Start the bot and the notification dispatcher; run until cancelled."""
     app = create_application()
     await app.initialize()
     await app.start()
-    await app.run_polling()
+    try:
+        if settings.NOTIFICATIONS_ENABLED:
+            await notification_dispatcher.start(app.bot)
+        # run_polling() manages its own event loop; this one is already running
+        await app.updater.start_polling()
+        await asyncio.Event().wait()
+    finally:
+        await stop_bot(app)
 
 async def stop_bot(app: Application):
     """Stop the bot."""
+    await notification_dispatcher.stop()
+    if app.updater.running:
+        await app.updater.stop()
     await app.stop()
     await app.shutdown()
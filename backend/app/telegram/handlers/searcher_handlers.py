@@ -1,5 +1,5 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, CallbackQueryHandler
+from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, CallbackQueryHandler, MessageHandler, filters
 from app.services.auth.telegram import TelegramAuth
 from app.services.searcher import SearcherService
 from app.models.entities.searcher import SearcherType, SearchPreferences, PriceRange, LocationPreference, DatePreference, Requirements
@@ -344,6 +344,8 @@ def get_searcher_conversation_handler():
     """Create and return the conversation handler for searcher setup."""
     return ConversationHandler(
         entry_points=[CommandHandler('start', start)],
+        name="searcher_setup",
+        persistent=True,
         states={
             SELECTING_TYPE: [CallbackQueryHandler(type_selected)],
             SETTING_PRICE_MIN: [MessageHandler(filters.TEXT & ~filters.COMMAND, price_min_received)],
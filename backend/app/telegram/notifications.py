@@ -0,0 +1,580 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, RetryAfter
+from app.core.config.mongodb import db
+from app.core.config.settings import settings
+from app.core.lease import owner_id
+from app.core.metrics import (
+    NOTIFICATIONS_DELIVERY_SECONDS,
+    NOTIFICATIONS_FAILED,
+    NOTIFICATIONS_PENDING,
+    NOTIFICATIONS_RETRIED,
+    NOTIFICATIONS_SENT
+)
+
+logger = logging.getLogger(__name__)
+
+# Outbox documents move from pending to sending, claimed by one
+# dispatcher, and then to sent or failed.
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+# Telegram rejects longer messages.
+MAX_MESSAGE_LENGTH = 4096
+# Outbox documents read per poll.
+POLL_BATCH_SIZE = 1000
+# Polls re-read this far behind the newest outbox entry seen, so entries
+# committed late by other processes are not skipped.
+POLL_OVERLAP_SECONDS = 5.0
+# First delay after a network error; doubles with every attempt.
+RETRY_BACKOFF_SECONDS = 1.0
+# Idle per-chat buckets are dropped beyond this many.
+MAX_CHAT_BUCKETS = 10_000
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class TokenBucket:
+    """``rate`` tokens per second, holding at most ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self) -> float:
+        now = self.clock()
+        # ``updated`` is in the future while paused
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        return now
+
+    def delay(self) -> float:
+        """Seconds until a token is available; 0 when one is."""
+        now = self._refill()
+        wait = max(self.updated - now, 0.0)
+        if self.tokens < 1:
+            wait += (1 - self.tokens) / self.rate
+        return wait
+
+    def take(self) -> None:
+        self._refill()
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        """Hand out nothing for ``seconds``, then refill from empty."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+        self.updated = max(self.updated, self.clock() + seconds)
+
+    def idle(self) -> bool:
+        """Whether the bucket is full, so dropping it changes nothing."""
+        self._refill()
+        return self.tokens >= self.capacity and self.updated <= self.clock()
+
+
+def _timestamp(value: datetime) -> float:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH).total_seconds()
+
+
+def notification_key(notification: Dict[str, Any]) -> float:
+    """Send order: the freshest listings first."""
+    return -_timestamp(notification["listed_at"])
+
+
+def listing_message(prop: Mapping[str, Any]) -> str:
+    """The alert sent for a new listing that matches a search."""
+    lines = [f"New listing in {prop.get('city')}: {prop.get('title') or 'untitled'}"]
+    if isinstance(prop.get("price"), (int, float)):
+        lines.append(f"€{prop['price']:.0f}/month")
+    if prop.get("source_url"):
+        lines.append(prop["source_url"])
+    return "\n".join(lines)
+
+
+def coalesce(notifications: List[Dict[str, Any]]) -> str:
+    """One message for several pending notifications of a chat."""
+    if len(notifications) == 1:
+        return notifications[0]["text"]
+    header = f"{len(notifications)} new listings match your search:"
+    return "\n\n".join([header] + [notification["text"] for notification in notifications])
+
+
+class NotificationDispatcher:
+    """Deliver queued Telegram notifications within the Bot API flood limits.
+
+    Notifications are written to the ``notifications`` outbox first, so a
+    restart or another process (the API, the scraper) can hand them to the
+    bot process, which polls the outbox. Sending is paced by a global token
+    bucket and one bucket per chat, the chat with the freshest listing first. Whatever is
+    pending for a chat when its turn comes is coalesced into one message.
+    ``RetryAfter`` pauses sending for the time Telegram asks; network
+    errors are retried with backoff up to ``max_attempts``.
+
+    Several dispatchers can share the outbox. Entries are claimed a page
+    at a time before they are queued: moved from pending to sending, with
+    this dispatcher as ``owner`` and a claim that lapses after
+    ``claim_seconds`` unless renewed at every poll. Entries whose claim
+    lapsed, because their dispatcher crashed or lost MongoDB, are taken
+    over by the next poll anywhere.
+
+    Delivery is at least once: a crash between sending and marking the
+    outbox entries sent resends them once their claim lapses.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = settings.NOTIFICATIONS_PER_SECOND,
+        chat_interval: float = settings.NOTIFICATIONS_CHAT_INTERVAL_SECONDS,
+        concurrency: int = settings.NOTIFICATIONS_CONCURRENCY,
+        max_attempts: int = settings.NOTIFICATIONS_MAX_ATTEMPTS,
+        max_coalesced: int = settings.NOTIFICATIONS_MAX_COALESCED,
+        poll_interval: float = settings.NOTIFICATIONS_POLL_SECONDS,
+        claim_seconds: float = settings.NOTIFICATIONS_CLAIM_SECONDS,
+        owner: Optional[str] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.chat_interval = chat_interval
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.max_coalesced = max_coalesced
+        self.poll_interval = poll_interval
+        self.claim_seconds = claim_seconds
+        self.owner = owner or owner_id()
+        self.clock = clock
+        # Short bursts are fine; the sustained rate is what Telegram limits
+        self.global_bucket = TokenBucket(global_rate, max(1.0, global_rate / 10), clock)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        # chat id -> outbox documents not yet handed to a sender
+        self._pending: Dict[int, List[Dict[str, Any]]] = {}
+        # Outbox ids held in memory, pending or being sent
+        self._known: Set[Any] = set()
+        # Chats ready to send: (key, sequence, chat id), with stale entries
+        # skipped on pop by comparing against ``_keys``
+        self._ready: List[Tuple[float, int, int]] = []
+        self._keys: Dict[int, float] = {}
+        # Chats held back by their bucket or a retry: (ready at, sequence, chat id)
+        self._waiting: List[Tuple[float, int, int]] = []
+        self._deferred: Dict[int, float] = {}
+        self._sending: Set[int] = set()
+        self._attempts: Dict[Any, int] = {}
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+        self._senders: Set[asyncio.Task] = set()
+        self.bot: Optional[Bot] = None
+        self.sent = 0
+        self.failed = 0
+
+    def __len__(self) -> int:
+        return len(self._known)
+
+    def _notification(self, chat_id: int, text: str, listed_at: Optional[datetime]) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        notification = {
+            "chat_id": chat_id,
+            "text": text[:MAX_MESSAGE_LENGTH],
+            "listed_at": listed_at or now,
+            "status": PENDING,
+            "created_at": now
+        }
+        if self._wakeup is not None:
+            # Sent from here; written already claimed
+            notification.update(self._claim_fields(now))
+        return notification
+
+    async def enqueue(
+        self,
+        chat_id: int,
+        text: str,
+        property_id: Any = None,
+        listed_at: Optional[datetime] = None
+    ) -> bool:
+        """Write a notification to the outbox and queue it if this process sends.
+
+        With a ``property_id`` the same listing is queued at most once per
+        chat; returns False when it already was.
+        """
+        notification = self._notification(chat_id, text, listed_at)
+        if property_id is None:
+            result = await db.db.notifications.insert_one(notification)
+            notification["_id"] = result.inserted_id
+        else:
+            try:
+                result = await db.db.notifications.update_one(
+                    {"chat_id": chat_id, "property_id": property_id},
+                    {"$setOnInsert": {**notification, "property_id": property_id}},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                # A concurrent upsert of the same listing won the insert
+                return False
+            if result.upserted_id is None:
+                return False
+            notification.update(_id=result.upserted_id, property_id=property_id)
+        if self._wakeup is not None:
+            self._add(notification)
+        return True
+
+    async def enqueue_many(
+        self,
+        chat_ids: Iterable[int],
+        text: str,
+        property_id: Any,
+        listed_at: Optional[datetime] = None
+    ) -> int:
+        """``enqueue`` one listing for several chats in a single bulk write.
+
+        Chats it was already queued for are skipped; returns how many it
+        was queued for.
+        """
+        notifications = [
+            {**self._notification(chat_id, text, listed_at), "property_id": property_id}
+            for chat_id in dict.fromkeys(chat_ids)
+        ]
+        if not notifications:
+            return 0
+        operations = [
+            UpdateOne(
+                {"chat_id": notification["chat_id"], "property_id": property_id},
+                {"$setOnInsert": notification},
+                upsert=True
+            )
+            for notification in notifications
+        ]
+        try:
+            result = await db.db.notifications.bulk_write(operations, ordered=False)
+            upserted = result.upserted_ids
+        except BulkWriteError as e:
+            # Unordered: everything but the failed upserts was applied.
+            # Duplicate keys are concurrent upserts of the same listing.
+            details = e.details
+            upserted = {entry["index"]: entry["_id"] for entry in details.get("upserted", [])}
+            errors = [error for error in details.get("writeErrors", []) if error.get("code") != 11000]
+            if errors:
+                logger.warning("Queueing %d of %d alerts failed: %s", len(errors), len(operations), errors[:3])
+        if self._wakeup is not None:
+            for index, _id in upserted.items():
+                self._add({**notifications[index], "_id": _id})
+        return len(upserted)
+
+    def _add(self, notification: Dict[str, Any]) -> None:
+        if notification["_id"] in self._known:
+            return
+        self._known.add(notification["_id"])
+        self._pending.setdefault(notification["chat_id"], []).append(notification)
+        NOTIFICATIONS_PENDING.set(len(self._known))
+        self._schedule(notification["chat_id"])
+
+    def _schedule(self, chat_id: int) -> None:
+        """(Re)queue a chat under the key of its most urgent notification."""
+        pending = self._pending.get(chat_id)
+        if not pending or chat_id in self._sending or chat_id in self._deferred:
+            return
+        key = min(map(notification_key, pending))
+        if self._keys.get(chat_id) == key:
+            return
+        self._keys[chat_id] = key
+        heapq.heappush(self._ready, (key, next(self._sequence), chat_id))
+        self._wakeup.set()
+
+    def _defer(self, chat_id: int, delay: float) -> None:
+        ready_at = self.clock() + delay
+        self._keys.pop(chat_id, None)
+        self._deferred[chat_id] = ready_at
+        heapq.heappush(self._waiting, (ready_at, next(self._sequence), chat_id))
+
+    def _release_waiting(self) -> None:
+        now = self.clock()
+        while self._waiting and self._waiting[0][0] <= now:
+            ready_at, _, chat_id = heapq.heappop(self._waiting)
+            if self._deferred.get(chat_id) == ready_at:
+                del self._deferred[chat_id]
+                self._schedule(chat_id)
+
+    def _pop_ready(self) -> Optional[int]:
+        while self._ready:
+            key, _, chat_id = heapq.heappop(self._ready)
+            if self._keys.get(chat_id) == key:
+                del self._keys[chat_id]
+                return chat_id
+        return None
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_CHAT_BUCKETS:
+                self._chat_buckets = {
+                    chat: kept for chat, kept in self._chat_buckets.items() if not kept.idle()
+                }
+            bucket = self._chat_buckets[chat_id] = TokenBucket(1 / self.chat_interval, 1.0, self.clock)
+        return bucket
+
+    async def _next_chat(self) -> int:
+        """Wait for a global token and the most urgent chat allowed to send."""
+        while True:
+            delay = self.global_bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            self._release_waiting()
+            chat_id = self._pop_ready()
+            if chat_id is not None:
+                delay = self._chat_bucket(chat_id).delay()
+                if delay > 0:
+                    self._defer(chat_id, delay)
+                    continue
+                return chat_id
+
+            self._wakeup.clear()
+            timeout = self._waiting[0][0] - self.clock() if self._waiting else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _take(self, chat_id: int) -> List[Dict[str, Any]]:
+        """The chat's most urgent notifications that fit in one message."""
+        pending = sorted(self._pending.pop(chat_id), key=notification_key)
+        batch = [pending[0]]
+        for notification in pending[1:self.max_coalesced]:
+            if len(coalesce(batch + [notification])) > MAX_MESSAGE_LENGTH:
+                break
+            batch.append(notification)
+        rest = pending[len(batch):]
+        if rest:
+            self._pending[chat_id] = rest
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            await self._slots.acquire()
+            try:
+                chat_id = await self._next_chat()
+            except BaseException:
+                self._slots.release()
+                raise
+            self.global_bucket.take()
+            self._chat_bucket(chat_id).take()
+            self._sending.add(chat_id)
+            task = asyncio.create_task(self._deliver(chat_id, self._take(chat_id)))
+            self._senders.add(task)
+            task.add_done_callback(self._sender_done)
+
+    def _sender_done(self, task: asyncio.Task) -> None:
+        self._senders.discard(task)
+        self._slots.release()
+
+    async def _deliver(self, chat_id: int, batch: List[Dict[str, Any]]) -> None:
+        try:
+            await self.bot.send_message(chat_id, coalesce(batch), disable_web_page_preview=True)
+        except RetryAfter as e:
+            # Flood control: stop sending until Telegram allows it again
+            NOTIFICATIONS_RETRIED.labels("retry_after").inc()
+            logger.warning("Telegram asked to retry after %ss", e.retry_after)
+            self.global_bucket.pause(float(e.retry_after))
+            self._chat_bucket(chat_id).pause(float(e.retry_after))
+            self._requeue(chat_id, batch)
+        except (Forbidden, BadRequest) as e:
+            # Blocked bot, deleted chat, bad text: retrying will not help
+            await self._finish(batch, FAILED, type(e).__name__, error=str(e))
+        except Exception as e:
+            # Network errors and timeouts, or anything else that went wrong
+            logger.warning("Sending notifications to %s failed: %s", chat_id, e)
+            attempts = max(self._attempts.get(n["_id"], 0) for n in batch) + 1
+            if attempts >= self.max_attempts:
+                await self._finish(batch, FAILED, "attempts", error=str(e))
+            else:
+                NOTIFICATIONS_RETRIED.labels("error").inc()
+                for notification in batch:
+                    self._attempts[notification["_id"]] = attempts
+                self._requeue(chat_id, batch)
+                self._defer(chat_id, RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1))
+        else:
+            await self._finish(batch, SENT)
+        finally:
+            self._sending.discard(chat_id)
+            self._schedule(chat_id)
+
+    def _requeue(self, chat_id: int, batch: List[Dict[str, Any]]) -> None:
+        self._pending[chat_id] = batch + self._pending.get(chat_id, [])
+
+    async def _finish(
+        self,
+        batch: List[Dict[str, Any]],
+        status: str,
+        reason: Optional[str] = None,
+        error: Optional[str] = None
+    ) -> None:
+        """Record the outcome in the outbox and forget the notifications."""
+        ids = [notification["_id"] for notification in batch]
+        update: Dict[str, Any] = {"status": status, f"{status}_at": datetime.utcnow()}
+        if error is not None:
+            update["error"] = error
+        try:
+            await db.db.notifications.update_many({"_id": {"$in": ids}}, {"$set": update})
+        except PyMongoError as e:
+            # No longer renewed here, their claim lapses and they go out again
+            logger.warning("Recording %d notifications as %s failed: %s", len(ids), status, e)
+        for _id in ids:
+            self._known.discard(_id)
+            self._attempts.pop(_id, None)
+        NOTIFICATIONS_PENDING.set(len(self._known))
+
+        if status == SENT:
+            self.sent += 1
+            NOTIFICATIONS_SENT.inc(len(batch))
+            now = datetime.utcnow()
+            for notification in batch:
+                NOTIFICATIONS_DELIVERY_SECONDS.observe(
+                    (now - notification["created_at"]).total_seconds()
+                )
+        else:
+            self.failed += 1
+            NOTIFICATIONS_FAILED.labels(reason).inc(len(batch))
+            logger.info("Dropping %d notifications for a chat: %s", len(batch), error)
+
+    def _claim_fields(self, now: datetime) -> Dict[str, Any]:
+        return {
+            "status": SENDING,
+            "owner": self.owner,
+            "claim_expires_at": now + timedelta(seconds=self.claim_seconds)
+        }
+
+    async def _claim(self, ids: List[Any]) -> List[Dict[str, Any]]:
+        """Take the outbox entries among ``ids`` that are pending or whose claim lapsed.
+
+        One update claims them all; another dispatcher may have taken some
+        first, so only the entries now owned here are read back.
+        """
+        now = datetime.utcnow()
+        await db.db.notifications.update_many(
+            {"_id": {"$in": ids}, "$or": [
+                {"status": PENDING},
+                {"status": SENDING, "claim_expires_at": {"$lte": now}}
+            ]},
+            {"$set": self._claim_fields(now)}
+        )
+        return await db.db.notifications.find(
+            {"_id": {"$in": ids}, "status": SENDING, "owner": self.owner}
+        ).to_list(length=len(ids))
+
+    async def _renew(self) -> None:
+        """Extend the claims on the entries held here."""
+        if not self._known:
+            return
+        now = datetime.utcnow()
+        await db.db.notifications.update_many(
+            {"_id": {"$in": list(self._known)}, "status": SENDING, "owner": self.owner},
+            {"$set": {"claim_expires_at": now + timedelta(seconds=self.claim_seconds)}}
+        )
+
+    async def load(self, since: Optional[datetime] = None) -> Optional[datetime]:
+        """Claim and queue pending outbox entries created at or after ``since``.
+
+        Entries whose claim lapsed are taken over whenever they were
+        created. Returns the creation time of the newest entry read.
+        """
+        pending: Dict[str, Any] = {"status": PENDING}
+        if since is not None:
+            pending["created_at"] = {"$gte": since}
+        query = {"$or": [
+            pending,
+            {"status": SENDING, "claim_expires_at": {"$lte": datetime.utcnow()}}
+        ]}
+        newest = since
+        page_query = query
+        while True:
+            documents = await db.db.notifications.find(page_query, {"created_at": 1}).sort(
+                [("created_at", 1), ("_id", 1)]
+            ).limit(POLL_BATCH_SIZE).to_list(length=POLL_BATCH_SIZE)
+            if not documents:
+                return newest
+            for claimed in await self._claim([document["_id"] for document in documents]):
+                self._add(claimed)
+            last = documents[-1]
+            newest = last["created_at"]
+            if len(documents) < POLL_BATCH_SIZE:
+                return newest
+            page_query = {"$and": [query, {"$or": [
+                {"created_at": {"$gt": newest}},
+                {"created_at": newest, "_id": {"$gt": last["_id"]}}
+            ]}]}
+
+    async def _poll(self, since: Optional[datetime]) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self._renew()
+                newest = await self.load(since)
+            except PyMongoError as e:
+                logger.warning("Polling the notification outbox failed: %s", e)
+                continue
+            if newest is not None:
+                since = min(newest, datetime.utcnow() - timedelta(seconds=POLL_OVERLAP_SECONDS))
+
+    async def start(self, bot: Bot) -> None:
+        """Queue the pending outbox and start sending through ``bot``."""
+        self.bot = bot
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        newest = await self.load()
+        self._tasks = [
+            asyncio.create_task(self._run()),
+            asyncio.create_task(self._poll(newest))
+        ]
+
+    async def stop(self) -> None:
+        """Stop sending and hand unsent notifications back to the outbox."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # Let messages already on the wire be recorded
+        await asyncio.gather(*self._senders, return_exceptions=True)
+        if self._known:
+            # Lapse the claims so the next poll of any dispatcher takes them
+            try:
+                await db.db.notifications.update_many(
+                    {"_id": {"$in": list(self._known)}, "status": SENDING, "owner": self.owner},
+                    {"$set": {"claim_expires_at": datetime.utcnow()}}
+                )
+            except PyMongoError as e:
+                logger.warning("Releasing %d notifications failed: %s", len(self._known), e)
+        self._tasks = []
+        self._wakeup = None
+        self._pending.clear()
+        self._known.clear()
+        self._ready.clear()
+        self._keys.clear()
+        self._waiting.clear()
+        self._deferred.clear()
+        self._attempts.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._known),
+            "chats": len(self._pending),
+            "sending": len(self._sending),
+            "sent": self.sent,
+            "failed": self.failed
+        }
+
+
+# Global instance
+notification_dispatcher = NotificationDispatcher()
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional, Set, Tuple
+from pymongo import DeleteOne, ReplaceOne
+from pymongo.errors import PyMongoError
+from telegram.ext import BasePersistence, PersistenceInput
+from app.core.config.mongodb import db
+from app.core.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+USER_DATA = "telegram_user_data"
+CHAT_DATA = "telegram_chat_data"
+BOT_DATA = "telegram_bot_data"
+CONVERSATIONS = "telegram_conversations"
+COLLECTIONS = (USER_DATA, CHAT_DATA, BOT_DATA, CONVERSATIONS)
+
+# ``_id`` of the single bot_data document.
+BOT_DATA_ID = "bot"
+
+# (chat id, user id) with the default ConversationHandler settings
+ConversationKey = Tuple[Any, ...]
+
+
+def conversation_id(name: str, key: ConversationKey) -> str:
+    return ":".join([name, *map(str, key)])
+
+
+class MongoPersistence(BasePersistence[Dict[Any, Any], Dict[Any, Any], Dict[Any, Any]]):
+    """Bot persistence in Mongo, written behind and loaded per chat.
+
+    The ``Application`` hands over everything that changed once every
+    ``update_interval`` seconds; those changes are coalesced per document
+    and written as one unordered bulk write per collection, not one write
+    per update. ``user_data`` and ``chat_data`` are read the first time a
+    user or chat is seen rather than all at start-up. Conversation states
+    are loaded per handler at start-up, but only unfinished conversations
+    are stored.
+
+    State survives restarts and can be handed from one process to another,
+    but only one process may run the bot at a time: conversation states
+    are read once, when the ``Application`` initializes, each chat's data is
+    cached after its first read, and writes lag by up to ``update_interval``.
+    A process taking over must start its ``Application`` after the previous
+    one has stopped, which writes everything staged. Arbitrary callback data
+    is not stored.
+    """
+
+    def __init__(self, update_interval: float = settings.TELEGRAM_PERSISTENCE_UPDATE_SECONDS):
+        super().__init__(store_data=PersistenceInput(callback_data=False), update_interval=update_interval)
+        # collection -> _id -> document to write, or None to delete it
+        self._pending: Dict[str, Dict[Any, Optional[Dict[str, Any]]]] = {
+            collection: {} for collection in COLLECTIONS
+        }
+        # Users and chats whose data this process already holds
+        self._loaded: Dict[str, Set[int]] = {USER_DATA: set(), CHAT_DATA: set()}
+        self._loading: Dict[Tuple[str, int], asyncio.Task] = {}
+        # Set while a write is scheduled that has not taken the staged documents yet
+        self._scheduled = False
+        self._writes: Set[asyncio.Task] = set()
+        self.writes = 0
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        # Loaded per user by refresh_user_data
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        # Loaded per chat by refresh_chat_data
+        return {}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        document = await db.db[BOT_DATA].find_one({"_id": BOT_DATA_ID})
+        return document["data"] if document else {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[ConversationKey, object]:
+        return {
+            tuple(document["key"]): document["state"]
+            async for document in db.db[CONVERSATIONS].find({"name": name})
+        }
+
+    async def update_conversation(
+        self,
+        name: str,
+        key: ConversationKey,
+        new_state: Optional[object]
+    ) -> None:
+        # ConversationHandler.END arrives as None: the conversation is over
+        self._stage(
+            CONVERSATIONS,
+            conversation_id(name, key),
+            None if new_state is None else {"name": name, "key": list(key), "state": new_state}
+        )
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        self._loaded[USER_DATA].add(user_id)
+        self._stage(USER_DATA, user_id, {"data": data})
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        self._loaded[CHAT_DATA].add(chat_id)
+        self._stage(CHAT_DATA, chat_id, {"data": data})
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        self._stage(BOT_DATA, BOT_DATA_ID, {"data": data})
+
+    async def update_callback_data(self, data: Any) -> None:
+        return None
+
+    async def drop_user_data(self, user_id: int) -> None:
+        # Still counts as loaded: there is nothing left to read back
+        self._loaded[USER_DATA].add(user_id)
+        self._stage(USER_DATA, user_id, None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._loaded[CHAT_DATA].add(chat_id)
+        self._stage(CHAT_DATA, chat_id, None)
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        await self._load(USER_DATA, user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        await self._load(CHAT_DATA, chat_id, chat_data)
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        # Read once at start-up; this process is its only writer
+        return None
+
+    async def _load(self, collection: str, _id: int, target: Dict[Any, Any]) -> None:
+        """Fill ``target`` from Mongo the first time ``_id`` is seen."""
+        if _id in self._loaded[collection]:
+            return
+        task = self._loading.get((collection, _id))
+        if task is None:
+            # Concurrent updates of a new chat share one read
+            task = asyncio.create_task(db.db[collection].find_one({"_id": _id}))
+            self._loading[(collection, _id)] = task
+            try:
+                document = await task
+            finally:
+                del self._loading[(collection, _id)]
+            self._loaded[collection].add(_id)
+        else:
+            document = await task
+        if document:
+            for key, value in document["data"].items():
+                target.setdefault(key, value)
+
+    def _stage(self, collection: str, _id: Any, document: Optional[Dict[str, Any]]) -> None:
+        """Queue a write; everything staged in one persistence run goes out together."""
+        self._pending[collection][_id] = document
+        if not self._scheduled:
+            self._scheduled = True
+            task = asyncio.create_task(self._write_soon())
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _write_soon(self) -> None:
+        # The Application stages a whole run at once; let the rest of it arrive
+        await asyncio.sleep(0)
+        await self._write()
+
+    async def _write(self) -> None:
+        staged = {collection: writes for collection, writes in self._pending.items() if writes}
+        self._pending = {collection: {} for collection in COLLECTIONS}
+        self._scheduled = False
+        now = datetime.utcnow()
+        for collection, writes in staged.items():
+            operations = [
+                DeleteOne({"_id": _id}) if document is None
+                else ReplaceOne({"_id": _id}, {**document, "updated_at": now}, upsert=True)
+                for _id, document in writes.items()
+            ]
+            try:
+                await db.db[collection].bulk_write(operations, ordered=False)
+                self.writes += 1
+            except PyMongoError as e:
+                logger.warning("Writing %d %s documents failed: %s", len(operations), collection, e)
+                # Retried with the next run, unless a newer version is staged by then
+                for _id, document in writes.items():
+                    self._pending[collection].setdefault(_id, document)
+
+    async def flush(self) -> None:
+        """Write whatever is staged; called when the Application stops."""
+        await asyncio.gather(*self._writes, return_exceptions=True)
+        await self._write()
@@ -0,0 +1,228 @@
+import asyncio
+import hmac
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from telegram import Update
+from telegram.ext import Application
+from app.core.config.mongodb import db
+from app.core.config.settings import settings
+from app.core.metrics import (
+    TELEGRAM_UPDATE_DURATION,
+    TELEGRAM_UPDATES,
+    TELEGRAM_UPDATES_QUEUED
+)
+from app.telegram.bot import create_application
+from app.telegram.notifications import notification_dispatcher
+
+logger = logging.getLogger(__name__)
+
+# Seconds stop() waits for queued updates before dropping them.
+DRAIN_TIMEOUT_SECONDS = 10.0
+
+# Telegram echoes the secret_token given to setWebhook in this header
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Updates received by API processes that do not run the bot
+RELAYED_UPDATES = "telegram_updates"
+# Relayed updates read per poll.
+RELAY_BATCH_SIZE = 100
+
+
+def valid_secret_token(token: Optional[str]) -> bool:
+    """Whether a request carries the webhook's secret token."""
+    expected = settings.TELEGRAM_WEBHOOK_SECRET
+    return bool(token and expected) and hmac.compare_digest(token.encode(), expected.encode())
+
+
+class TelegramWebhook:
+    """Run the bot inside the API process, fed by the webhook endpoint.
+
+    Updates are queued on one of ``workers`` bounded queues, picked by chat,
+    and each queue has a single worker calling ``Application.process_update``:
+    updates of one chat are handled in order while different chats proceed
+    concurrently. When a queue is full the endpoint refuses the update and
+    Telegram delivers it again later.
+
+    Only one API process runs the bot (see ``app.main``). Updates that
+    reach any other process are relayed through the ``telegram_updates``
+    collection, which the running bot polls every ``relay_interval``.
+    """
+
+    def __init__(
+        self,
+        workers: int = settings.TELEGRAM_WEBHOOK_WORKERS,
+        queue_size: int = settings.TELEGRAM_WEBHOOK_QUEUE_SIZE,
+        relay_interval: float = settings.TELEGRAM_WEBHOOK_RELAY_SECONDS
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.relay_interval = relay_interval
+        self.application: Optional[Application] = None
+        self._accepting = False
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.relayed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._accepting
+
+    def submit(self, data: Dict[str, Any]) -> bool:
+        """Queue an update received by the webhook; False when its queue is full.
+
+        Raises ValueError for a body that is not an update.
+        """
+        if not isinstance(data, dict):
+            raise ValueError("An update is a JSON object")
+        try:
+            update = Update.de_json(data, self.application.bot)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Malformed update: {e}") from e
+        if update is None:
+            raise ValueError("Empty update")
+        chat = update.effective_chat
+        user = update.effective_user
+        shard = chat.id if chat else user.id if user else update.update_id
+        try:
+            self._queues[shard % len(self._queues)].put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            TELEGRAM_UPDATES.labels("rejected").inc()
+            return False
+        TELEGRAM_UPDATES_QUEUED.inc()
+        return True
+
+    async def relay(self, data: Any) -> bool:
+        """Hand an update to the process running the bot; False when it could not be stored.
+
+        Raises ValueError for a body that is not an update.
+        """
+        if not isinstance(data, dict) or not isinstance(data.get("update_id"), int):
+            raise ValueError("An update is a JSON object with an update_id")
+        try:
+            await db.db[RELAYED_UPDATES].insert_one(
+                {"_id": data["update_id"], "update": data, "created_at": datetime.utcnow()}
+            )
+        except DuplicateKeyError:
+            # Delivered again by Telegram; one copy is enough
+            pass
+        except PyMongoError as e:
+            logger.warning("Relaying Telegram update %s failed: %s", data["update_id"], e)
+            return False
+        self.relayed += 1
+        TELEGRAM_UPDATES.labels("relayed").inc()
+        return True
+
+    async def take_relayed(self) -> int:
+        """Queue relayed updates, oldest first; returns how many were taken."""
+        documents = await db.db[RELAYED_UPDATES].find().sort("_id", 1).limit(
+            RELAY_BATCH_SIZE
+        ).to_list(length=RELAY_BATCH_SIZE)
+        taken = []
+        for document in documents:
+            try:
+                if not self.submit(document["update"]):
+                    # The rest waits for the next poll
+                    break
+            except ValueError as e:
+                logger.warning("Dropping relayed Telegram update %s: %s", document["_id"], e)
+            taken.append(document["_id"])
+        if taken:
+            await db.db[RELAYED_UPDATES].delete_many({"_id": {"$in": taken}})
+        return len(taken)
+
+    async def _poll_relayed(self) -> None:
+        while True:
+            await asyncio.sleep(self.relay_interval)
+            try:
+                await self.take_relayed()
+            except PyMongoError as e:
+                logger.warning("Polling relayed Telegram updates failed: %s", e)
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            update = await queue.get()
+            TELEGRAM_UPDATES_QUEUED.dec()
+            started = time.perf_counter()
+            try:
+                # Handler errors go to the Application's error handlers
+                await self.application.process_update(update)
+                self.processed += 1
+                TELEGRAM_UPDATES.labels("processed").inc()
+            except Exception:
+                self.failed += 1
+                TELEGRAM_UPDATES.labels("failed").inc()
+                logger.exception("Processing Telegram update %s failed", update.update_id)
+            finally:
+                TELEGRAM_UPDATE_DURATION.observe(time.perf_counter() - started)
+                queue.task_done()
+
+    async def start(self, application: Optional[Application] = None, register: bool = True) -> None:
+        """Start the bot without an updater and, with ``register``, point Telegram here."""
+        if not settings.TELEGRAM_WEBHOOK_SECRET:
+            raise ValueError("TELEGRAM_WEBHOOK_SECRET is required to receive webhook updates")
+        application = application or create_application(webhook=True)
+        await application.initialize()
+        await application.start()
+        if register:
+            await application.bot.set_webhook(
+                url=settings.TELEGRAM_WEBHOOK_URL,
+                secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=settings.TELEGRAM_WEBHOOK_MAX_CONNECTIONS
+            )
+        if settings.NOTIFICATIONS_ENABLED:
+            await notification_dispatcher.start(application.bot)
+
+        per_queue = max(1, self.queue_size // self.workers)
+        self._queues = [asyncio.Queue(maxsize=per_queue) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+        self.application = application
+        self._accepting = True
+        self._tasks.append(asyncio.create_task(self._poll_relayed()))
+
+    async def stop(self) -> None:
+        """Finish queued updates (for up to ``DRAIN_TIMEOUT_SECONDS``) and stop the bot."""
+        if self.application is None:
+            return
+        self._accepting = False
+        # Updates still being relayed are left for the next process running the bot
+        self._tasks[-1].cancel()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)),
+                DRAIN_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Dropping %d queued Telegram updates", sum(q.qsize() for q in self._queues))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues = []
+        TELEGRAM_UPDATES_QUEUED.set(0)
+        await notification_dispatcher.stop()
+        # Also writes the persistence one last time
+        await self.application.stop()
+        await self.application.shutdown()
+        self.application = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": sum(queue.qsize() for queue in self._queues),
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "relayed": self.relayed,
+            "running": self.running
+        }
+
+
+# Global instance
+telegram_webhook = TelegramWebhook()
@@ -0,0 +1,84 @@
+"""Per-request latency of the middleware stack.
+
+Drives a small app wrapped in RateLimitMiddleware, ValidationMiddleware and
+MetricsMiddleware (the same order as app.main) in-process through httpx, and prints
+p50/p99 for a GET and for a POST with a JSON body:
+
+    python -m benchmarks.bench_middleware --requests 5000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+from fastapi import APIRouter, FastAPI
+from app.api.routing import ParsedBodyRoute
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.rate_limit import RateLimitMiddleware
+from app.middleware.validation import ValidationMiddleware
+
+PAYLOAD = {
+    "price_range": {"min": 300, "max": 800},
+    "location": {"cities": ["Milan", "Turin"], "areas": ["Città Studi", "Navigli", "Centrale"]},
+    "dates": {"move_in": "2025-02-01T00:00:00Z", "duration": 6},
+    "requirements": {"furnished": True, "internet": True, "utilities_included": False},
+    "notes": "x" * 2000,
+}
+
+
+def build_app(with_middleware: bool) -> FastAPI:
+    app = FastAPI()
+    router = APIRouter(route_class=ParsedBodyRoute)
+
+    @router.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @router.post("/echo")
+    async def echo(body: dict):
+        return {"keys": len(body)}
+
+    app.include_router(router)
+    if with_middleware:
+        app.add_middleware(RateLimitMiddleware, requests_per_minute=10**9)
+        app.add_middleware(ValidationMiddleware)
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def measure(app: FastAPI, method: str, path: str, count: int, **kwargs):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(50):  # warm-up
+            await client.request(method, path, **kwargs)
+        samples = []
+        for _ in range(count):
+            started = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            samples.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.text
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+async def run(count: int) -> None:
+    print(f"{'case':<26} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, with_middleware in (("bare app", False), ("with middleware", True)):
+        app = build_app(with_middleware)
+        for method, path, kwargs in (
+            ("GET", "/ping", {}),
+            ("POST", "/echo", {"json": PAYLOAD}),
+        ):
+            p50, p99 = await measure(app, method, path, count, **kwargs)
+            print(f"{label + ' ' + method:<26} {p50:>8.3f} {p99:>8.3f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests))
+
+
+if __name__ == "__main__":
+    main()
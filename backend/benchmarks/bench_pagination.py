@@ -0,0 +1,118 @@
+"""Page-N latency of skip/limit vs. cursor pagination.
+
+Seeds a dedicated database with synthetic properties (once; reruns reuse
+it) and times ``SearchService.search_properties`` fetching page N both
+ways. Requires a reachable MongoDB:
+
+    MONGODB_DB_NAME=cercooffro_bench python -m benchmarks.bench_pagination --docs 1000000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from app.core.config.settings import settings
+from app.core.config.mongodb import db
+from app.models.entities.searcher import (
+    SearchPreferences,
+    PriceRange,
+    LocationPreference,
+    DatePreference,
+    Requirements
+)
+from app.services.pagination import cursor_for
+from app.services.search import PROPERTIES_SORT, SearchService
+
+CITIES = ["Milan", "Rome", "Turin", "Bologna", "Florence", "Padua", "Pisa", "Naples"]
+BATCH_SIZE = 10_000
+
+
+def seed(total: int) -> None:
+    collection = MongoClient(settings.MONGODB_URL)[settings.MONGODB_DB_NAME]["properties"]
+    existing = collection.estimated_document_count()
+    if existing >= total:
+        print(f"reusing {existing} seeded properties")
+        return
+
+    print(f"seeding {total - existing} properties ...")
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    for offset in range(existing, total, BATCH_SIZE):
+        collection.insert_many([
+            {
+                "status": "active" if rng.random() < 0.9 else "inactive",
+                "city": rng.choice(CITIES),
+                "price": rng.randrange(200, 1500),
+                "available_from": start + timedelta(days=rng.randrange(0, 365)),
+                "minimum_stay": rng.randrange(1, 12),
+                "furnished": rng.random() < 0.6,
+                "created_at": start + timedelta(seconds=i * 17),
+            }
+            for i in range(offset, min(offset + BATCH_SIZE, total))
+        ], ordered=False)
+    collection.create_index([
+        ("status", ASCENDING),
+        ("city", ASCENDING),
+        ("created_at", DESCENDING),
+        ("_id", DESCENDING)
+    ])
+
+
+async def timed(coro_factory, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await coro_factory()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+async def run(pages, limit: int, repeat: int) -> None:
+    preferences = SearchPreferences(
+        price_range=PriceRange(min=300, max=900),
+        location=LocationPreference(cities=["Milan"]),
+        dates=DatePreference(move_in=datetime(2025, 6, 1), duration=12),
+        requirements=Requirements()
+    )
+    query = SearchService.build_preferences_query(preferences)
+
+    print(f"{'page':>8} {'skip ms':>10} {'cursor ms':>10}")
+    for page in pages:
+        # Locate the last document of page N-1 once, outside the timing.
+        previous = await db.properties.find(query).sort(PROPERTIES_SORT) \
+            .skip((page - 1) * limit - 1).limit(1).to_list(length=1) if page > 1 else []
+        if page > 1 and not previous:
+            print(f"{page:>8} (past the end of the result set)")
+            continue
+        cursor = cursor_for(previous[0], PROPERTIES_SORT) if previous else None
+
+        skip_ms = await timed(
+            lambda: db.properties.find(query).sort(PROPERTIES_SORT)
+            .skip((page - 1) * limit).limit(limit).to_list(length=limit),
+            repeat
+        )
+        cursor_ms = await timed(
+            lambda: SearchService.search_properties(preferences, limit=limit, cursor=cursor)
+            if cursor else
+            db.properties.find(query).sort(PROPERTIES_SORT).limit(limit).to_list(length=limit),
+            repeat
+        )
+        print(f"{page:>8} {skip_ms:>10.2f} {cursor_ms:>10.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 1000, 5000])
+    args = parser.parse_args()
+
+    seed(args.docs)
+    asyncio.run(run(args.pages, args.limit, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
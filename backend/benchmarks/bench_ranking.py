@@ -0,0 +1,117 @@
+"""Latency of ranking a recommendation candidate set.
+
+Builds synthetic rows shaped like the output of ``ranking_projection`` and
+times the array build, the vectorized scoring and the
+``argpartition`` top-k separately, then end to end. No database needed:
+
+    python -m benchmarks.bench_ranking --candidates 10000 --max-ms 10
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app.models.entities.searcher import (
+    SearchPreferences,
+    PriceRange,
+    LocationPreference,
+    DatePreference,
+    Requirements
+)
+from app.services.matching import requirements_mask
+from app.services.ranking import (
+    candidate_columns,
+    rank_candidates,
+    score_columns,
+    top_k
+)
+
+AREAS = ["Città Studi", "Navigli", "Centrale", "Lambrate", "Isola", "Bovisa"]
+NOW = datetime(2025, 6, 1)
+EPOCH = datetime(1970, 1, 1)
+
+PREFERENCES = SearchPreferences(
+    price_range=PriceRange(min=400, max=800),
+    location=LocationPreference(cities=["Milan"], areas=["Città Studi", "Lambrate"]),
+    dates=DatePreference(move_in=datetime(2025, 9, 1), duration=10),
+    requirements=Requirements(furnished=True, internet=True)
+)
+
+
+def epoch_ms(value: datetime) -> float:
+    return (value - EPOCH).total_seconds() * 1000
+
+
+def make_candidates(count: int):
+    """Rows shaped like the output of ``ranking_projection``."""
+    rng = random.Random(3)
+    candidates = []
+    for _ in range(count):
+        flags = {
+            "furnished": rng.random() < 0.6,
+            "internet": rng.random() < 0.5,
+            "utilities_included": rng.random() < 0.3,
+        }
+        if rng.random() < 0.7:
+            distance = float(min(rng.randrange(100, 15_000) for _ in range(2)))
+        else:
+            distance = float("nan")
+        candidates.append({
+            "_id": ObjectId(),
+            "price": float(rng.randrange(360, 880)),
+            "area": rng.choice(AREAS),
+            "mask": requirements_mask(flags),
+            "available_from": epoch_ms(NOW + timedelta(days=rng.randrange(0, 90))),
+            "created_at": epoch_ms(NOW - timedelta(minutes=rng.randrange(0, 90 * 24 * 60))),
+            "distance": distance,
+        })
+    return candidates
+
+
+def measure(fn, repeats: int):
+    for _ in range(5):  # warm-up
+        fn()
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--candidates", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="exit non-zero if end-to-end p50 exceeds this")
+    args = parser.parse_args()
+
+    candidates = make_candidates(args.candidates)
+    columns = candidate_columns(candidates)
+    scores = score_columns(columns, PREFERENCES, NOW)
+
+    cases = (
+        ("build arrays", lambda: candidate_columns(candidates)),
+        ("score", lambda: score_columns(columns, PREFERENCES, NOW)),
+        ("top-k", lambda: top_k(scores, args.limit)),
+        ("rank end to end", lambda: rank_candidates(candidates, PREFERENCES, args.limit, NOW)),
+    )
+    print(f"{args.candidates} candidates, top {args.limit}")
+    print(f"{'stage':<18} {'p50 ms':>8} {'p99 ms':>8}")
+    p50 = None
+    for label, fn in cases:
+        p50, p99 = measure(fn, args.repeats)
+        print(f"{label:<18} {p50:>8.3f} {p99:>8.3f}")
+
+    if args.max_ms is not None and p50 > args.max_ms:
+        print(f"end-to-end p50 {p50:.3f} ms is above {args.max_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
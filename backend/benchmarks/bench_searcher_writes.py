@@ -0,0 +1,132 @@
+"""Round trips and latency of the searcher write paths.
+
+Counts the commands each call sends to MongoDB and times it, for the
+current single round-trip writes and for the read-after-write pattern
+they replaced. Uses a dedicated database with its own searchers, and
+requires a reachable MongoDB:
+
+    MONGODB_DB_NAME=cercooffro_bench python -m benchmarks.bench_searcher_writes --repeat 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from app.core.config.settings import settings
+from app.core.config.mongodb import db
+from app.models.entities.searcher import (
+    Searcher,
+    SearcherStatus,
+    SearcherType,
+    SearchPreferences,
+    PriceRange,
+    LocationPreference,
+    DatePreference,
+    Requirements
+)
+from app.services.auth.telegram import TelegramAuth
+from app.services.searcher import SearcherService
+from app.services.searcher_cache import searcher_cache
+
+PREFERENCES = SearchPreferences(
+    price_range=PriceRange(min=300, max=900),
+    location=LocationPreference(cities=["Milan"]),
+    dates=DatePreference(move_in=datetime(2025, 6, 1), duration=12),
+    requirements=Requirements()
+)
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def read_after_write(telegram_id: str, fields) -> None:
+    """The update_one + find_one pattern the services used before."""
+    result = await db.db.searchers.update_one(
+        {"telegram_user_id": telegram_id},
+        {"$set": {**fields, "updated_at": datetime.utcnow()}}
+    )
+    if result.modified_count:
+        await db.db.searchers.find_one({"telegram_user_id": telegram_id})
+
+
+async def read_then_insert(telegram_id: str) -> None:
+    """The find_one, update_one / insert_one get-or-create used before."""
+    searcher_data = await db.db.searchers.find_one({"telegram_user_id": telegram_id})
+    if searcher_data:
+        await db.db.searchers.update_one(
+            {"telegram_user_id": telegram_id},
+            {"$set": {"last_active": datetime.utcnow()}}
+        )
+        return
+    await db.db.searchers.insert_one(
+        Searcher(telegram_user_id=telegram_id, searcher_type=SearcherType.ANY).model_dump()
+    )
+
+
+async def measure(counter: CommandCounter, call, repeat: int):
+    samples = []
+    commands = 0
+    for i in range(repeat):
+        # Every call takes the uncached path
+        searcher_cache.clear()
+        before = counter.count
+        started = time.perf_counter()
+        await call(i)
+        samples.append(time.perf_counter() - started)
+        commands += counter.count - before
+    return commands / repeat, statistics.median(samples) * 1000
+
+
+async def run(repeat: int) -> None:
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(settings.MONGODB_URL, event_listeners=[counter])
+    db.db = client[settings.MONGODB_DB_NAME]
+    await db.db.searchers.delete_many({"telegram_user_id": {"$regex": "^bench-"}})
+    await db.db.searchers.create_index("telegram_user_id", unique=True)
+    await db.db.searchers.insert_one(
+        Searcher(telegram_user_id="bench-0", searcher_type=SearcherType.STUDENT).model_dump()
+    )
+    statuses = [SearcherStatus.ACTIVE, SearcherStatus.INACTIVE]
+
+    cases = [
+        ("update_preferences", lambda i: SearcherService.update_preferences("bench-0", PREFERENCES)),
+        ("update_status", lambda i: SearcherService.update_status("bench-0", statuses[i % 2])),
+        ("update_searcher_type", lambda i: TelegramAuth.update_searcher_type("bench-0", SearcherType.WORKER)),
+        ("get_or_create (existing)", lambda i: TelegramAuth.get_or_create_searcher("bench-0")),
+        ("get_or_create (new)", lambda i: TelegramAuth.get_or_create_searcher(f"bench-new-{i}")),
+        ("before: update + find", lambda i: read_after_write("bench-0", {"status": statuses[i % 2]})),
+        ("before: get_or_create (existing)", lambda i: read_then_insert("bench-0")),
+        ("before: get_or_create (new)", lambda i: read_then_insert(f"bench-old-{i}")),
+    ]
+    print(f"{'call':<34} {'round trips':>12} {'p50 ms':>8}")
+    for name, call in cases:
+        round_trips, p50 = await measure(counter, call, repeat)
+        print(f"{name:<34} {round_trips:>12.2f} {p50:>8.2f}")
+
+    await db.db.searchers.delete_many({"telegram_user_id": {"$regex": "^bench-"}})
+    client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 import asyncio
+from app.core.config.settings import settings
 from app.telegram.bot import start_bot
 from app.core.config.mongodb import db
 
 async def main():
+    if settings.TELEGRAM_WEBHOOK_ENABLED:
+        raise SystemExit("TELEGRAM_WEBHOOK_ENABLED is set: the bot runs in the API process")
     # Connect to database
     await db.connect_to_database()
     
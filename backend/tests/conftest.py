@@ -0,0 +1,8 @@
+import os
+
+# Settings are required at import time; provide harmless defaults for tests.
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGODB_DB_NAME", "cercooffro_test")
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test-token")
+os.environ.setdefault("TELEGRAM_WEBHOOK_URL", "https://example.com/api/v1/telegram/webhook")
+os.environ.setdefault("TELEGRAM_ADMIN_USER_ID", "0")
@@ -0,0 +1,212 @@
+import asyncio
+import time
+import pytest
+from bson import ObjectId
+from prometheus_client import REGISTRY
+from pymongo.errors import OperationFailure
+from app.core.cache import MemoryCacheBackend, RedisCacheBackend, ResultCache, TTLCache
+from app.core.redis import RedisError
+
+
+def test_get_set_and_default():
+    cache = TTLCache(ttl=60)
+    assert cache.get("a") is None
+    assert cache.get("a", 0) == 0
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+
+
+def test_entries_expire():
+    cache = TTLCache(ttl=0.01)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=60)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert len(cache) == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(ttl=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+class FakeRedis:
+    """In-memory stand-in for the few Redis commands the cache uses."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, px=None):
+        self.data[key] = value.encode() if isinstance(value, str) else value
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+
+def lookups(result):
+    return REGISTRY.get_sample_value("result_cache_lookups_total", {"result": result}) or 0
+
+
+def make_counter():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"properties": [{"_id": ObjectId(), "price": 500}], "total": len(calls)}
+
+    return calls, compute
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend_factory", [
+    lambda: MemoryCacheBackend(max_entries=16),
+    lambda: RedisCacheBackend(FakeRedis(), prefix="search"),
+])
+async def test_result_cache_hits_and_invalidation(backend_factory):
+    cache = ResultCache(backend_factory(), ttl=60)
+    before = {result: lookups(result) for result in ("hit", "miss")}
+    calls, compute = make_counter()
+    key = {"query": "stanza milano", "page": 1}
+
+    first = await cache.get_or_compute(key, compute)
+    second = await cache.get_or_compute(dict(reversed(list(key.items()))), compute)
+    assert first == second
+    assert len(calls) == 1
+
+    await cache.invalidate()
+    third = await cache.get_or_compute(key, compute)
+    assert third["total"] == 2
+
+    stats = await cache.stats()
+    assert (stats["hits"], stats["misses"], stats["version"]) == (1, 2, 1)
+    assert lookups("hit") - before["hit"] == 1
+    assert lookups("miss") - before["miss"] == 2
+
+
+@pytest.mark.asyncio
+async def test_disabled_result_cache_always_computes():
+    cache = ResultCache(MemoryCacheBackend(max_entries=16), ttl=60, enabled=False)
+    calls, compute = make_counter()
+    await cache.get_or_compute({"q": 1}, compute)
+    await cache.get_or_compute({"q": 1}, compute)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_hits_without_a_watch_are_adjusted():
+    cache = ResultCache(MemoryCacheBackend(max_entries=16), ttl=60)
+    calls, compute = make_counter()
+    stale = lambda value: {**value, "total_approximate": True}
+
+    first = await cache.get_or_compute({"q": 1}, compute, on_unwatched_hit=stale)
+    assert "total_approximate" not in first
+    assert (await cache.get_or_compute({"q": 1}, compute, on_unwatched_hit=stale))["total_approximate"]
+
+    cache.watching = True
+    assert "total_approximate" not in await cache.get_or_compute({"q": 1}, compute, on_unwatched_hit=stale)
+
+
+class FakeStream:
+    def __init__(self, events):
+        self.events = events
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        event = await self.events.get()
+        if isinstance(event, Exception):
+            raise event
+        return event
+
+
+class FakeWatchedCollection:
+    """Fails to open its change stream ``failures`` times, then streams ``events``."""
+
+    name = "properties"
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.opened = 0
+        self.events = asyncio.Queue()
+
+    def watch(self, pipeline):
+        self.opened += 1
+        if self.opened <= self.failures:
+            raise OperationFailure("The $changeStream stage is only supported on replica sets")
+        return FakeStream(self.events)
+
+
+@pytest.mark.asyncio
+async def test_watch_retries_and_debounces_invalidation():
+    cache = ResultCache(MemoryCacheBackend(max_entries=16), ttl=60)
+    collection = FakeWatchedCollection(failures=2)
+    watcher = asyncio.create_task(cache.watch(collection, debounce=0.2, retry_seconds=0.01))
+    try:
+        for _ in range(100):
+            if cache.watching:
+                break
+            await asyncio.sleep(0.01)
+        assert cache.watching and collection.opened == 3
+        assert REGISTRY.get_sample_value("result_cache_watching") == 1
+        await asyncio.sleep(0.25)
+        # Opening the stream retires what was cached while not watching
+        assert (await cache.stats())["version"] == 1
+
+        # A burst of writes retires the cache once
+        for _ in range(50):
+            collection.events.put_nowait({"_id": {}})
+        await asyncio.sleep(0.1)
+        assert (await cache.stats())["version"] == 2
+        await asyncio.sleep(0.2)
+        assert (await cache.stats())["version"] == 2
+
+        # A failed stream is reopened
+        collection.events.put_nowait(OperationFailure("cursor killed"))
+        await asyncio.sleep(0.1)
+        assert collection.opened == 4 and cache.watching
+    finally:
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+    assert not cache.watching
+    assert REGISTRY.get_sample_value("result_cache_watching") == 0
+
+
+class FailingRedis:
+    """A Redis client whose server went away."""
+
+    async def get(self, key):
+        raise RedisError("Connection refused")
+
+    async def set(self, key, value, px=None):
+        raise RedisError("Connection refused")
+
+
+@pytest.mark.asyncio
+async def test_failing_shared_cache_computes_uncached():
+    cache = ResultCache(RedisCacheBackend(FailingRedis(), prefix="search"), ttl=60)
+    calls, compute = make_counter()
+    errors = lookups("error")
+    assert (await cache.get_or_compute({"q": 1}, compute))["total"] == 1
+    assert (await cache.get_or_compute({"q": 1}, compute))["total"] == 2
+
+    stats = await cache.stats()
+    assert stats["errors"] == 3 and stats["version"] is None
+    assert lookups("error") - errors == 3
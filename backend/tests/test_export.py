@@ -0,0 +1,150 @@
+import gzip
+import zlib
+from datetime import datetime
+import orjson
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from app.api.responses import ndjson_chunks
+from app.core.config.settings import settings
+from app.main import app
+from app.services.auth.telegram import TelegramAuth
+from app.services.search import PROPERTIES_SORT, SearchService
+
+client = TestClient(app)
+
+
+class Source:
+    """Async iterator over ``count`` documents that records how many were read."""
+
+    def __init__(self, count=None):
+        self.count = count
+        self.read = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.count is not None and self.read >= self.count:
+            raise StopAsyncIteration
+        self.read += 1
+        return {"_id": ObjectId(), "n": self.read, "created_at": datetime(2026, 1, 1)}
+
+
+async def collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+@pytest.mark.asyncio
+async def test_documents_are_written_one_per_line():
+    chunks = await collect(ndjson_chunks(Source(250), chunk_bytes=1024))
+    assert all(len(chunk) < 1024 + 200 for chunk in chunks)
+    lines = b"".join(chunks).splitlines()
+    assert [orjson.loads(line)["n"] for line in lines] == list(range(1, 251))
+    assert orjson.loads(lines[0])["created_at"] == "2026-01-01T00:00:00"
+
+
+@pytest.mark.asyncio
+async def test_gzip_chunks_decode_as_they_arrive():
+    chunks = await collect(ndjson_chunks(Source(250), compress=True, chunk_bytes=1024))
+    decoder = zlib.decompressobj(wbits=31)
+    # The first chunk is decodable on its own thanks to the sync flush
+    assert decoder.decompress(chunks[0]).endswith(b"\n")
+    lines = gzip.decompress(b"".join(chunks)).splitlines()
+    assert len(lines) == 250
+
+
+@pytest.mark.asyncio
+async def test_reading_follows_the_consumer():
+    source = Source()  # endless
+    chunks = ndjson_chunks(source, chunk_bytes=4096)
+    await chunks.__anext__()
+    first = source.read
+    await chunks.__anext__()
+    # Each chunk reads only the documents it needs
+    assert source.read - first <= first + 1
+    await chunks.aclose()
+
+
+def test_export_reads_the_city_newest_first(monkeypatch):
+    calls = {}
+
+    class FakeCursor:
+        def __init__(self, query, projection):
+            calls["query"], calls["projection"] = query, projection
+
+        def sort(self, sort):
+            calls["sort"] = sort
+            return self
+
+        def limit(self, limit):
+            calls["limit"] = limit
+            return self
+
+        def batch_size(self, size):
+            calls["batch_size"] = size
+            return self
+
+    class FakeProperties:
+        find = FakeCursor
+
+    from app.core.config.mongodb import db
+    monkeypatch.setattr(db, "properties", FakeProperties())
+    SearchService.export_properties(
+        "Milan", max_price=700, projection={"title": 1}, limit=2000, batch_size=500
+    )
+    assert calls == {
+        "query": {"status": "active", "city": "Milan", "price": {"$lte": 700}},
+        "projection": {"title": 1},
+        "sort": PROPERTIES_SORT,
+        "limit": 2000,
+        "batch_size": 500
+    }
+
+
+@pytest.fixture
+def verified(monkeypatch):
+    async def verify(telegram_id):
+        return telegram_id == "1"
+
+    monkeypatch.setattr(TelegramAuth, "verify_telegram_user", verify)
+
+
+def test_export_endpoint_streams_ndjson(monkeypatch, verified):
+    calls = []
+
+    def export(**kwargs):
+        calls.append(kwargs)
+        return Source(3)
+
+    monkeypatch.setattr(SearchService, "export_properties", export)
+    response = client.get("/api/v1/search/export", params={"city": "Milan", "telegram_id": "1"})
+    assert response.status_code == 200
+    assert calls[0]["limit"] == settings.EXPORT_MAX_ROWS
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [orjson.loads(line)["n"] for line in response.content.splitlines()] == [1, 2, 3]
+
+    response = client.get(
+        "/api/v1/search/export", params={"city": "Milan", "telegram_id": "1", "gzip": True}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.content.splitlines()) == 3
+
+
+def test_export_endpoint_rejects_bad_fields(verified):
+    response = client.get(
+        "/api/v1/search/export", params={"city": "Milan", "telegram_id": "1", "fields": "a.b"}
+    )
+    assert response.status_code == 400
+    assert client.get("/api/v1/search/export", params={"telegram_id": "1"}).status_code == 422
+
+
+def test_export_endpoint_needs_a_user_and_caps_the_rows(verified):
+    response = client.get("/api/v1/search/export", params={"city": "Milan"})
+    assert response.status_code == 422
+    response = client.get("/api/v1/search/export", params={"city": "Milan", "telegram_id": "2"})
+    assert response.status_code == 401
+    response = client.get("/api/v1/search/export", params={
+        "city": "Milan", "telegram_id": "1", "limit": settings.EXPORT_MAX_ROWS + 1
+    })
+    assert response.status_code == 422
@@ -0,0 +1,72 @@
+import pytest
+from pymongo import ASCENDING, TEXT, IndexModel
+from app.core.config.indexes import IndexManager
+
+
+class FakeCollection:
+    def __init__(self, indexes):
+        self.indexes = {"_id_": {"name": "_id_", "key": {"_id": 1}}}
+        self.indexes.update({index["name"]: index for index in indexes})
+        self.create_calls = []
+
+    async def list_indexes(self):
+        for index in list(self.indexes.values()):
+            yield index
+
+    async def create_indexes(self, specs):
+        self.create_calls.append([spec.document["name"] for spec in specs])
+        for spec in specs:
+            self.indexes[spec.document["name"]] = dict(spec.document)
+
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection([])
+        return self[name]
+
+
+REGISTRY = {
+    "searchers": [
+        IndexModel([("telegram_user_id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING)]),
+    ],
+    "properties": [
+        IndexModel([("description", TEXT), ("title", TEXT)]),
+    ],
+}
+
+
+@pytest.mark.asyncio
+async def test_ensure_builds_only_missing_indexes_in_one_batch():
+    database = FakeDatabase(
+        searchers=FakeCollection([{"name": "status_1", "key": {"status": 1}}])
+    )
+    reports = await IndexManager(database, REGISTRY).ensure()
+
+    assert database["searchers"].create_calls == [["telegram_user_id_1"]]
+    assert database["properties"].create_calls == [["description_text_title_text"]]
+    assert all(report.clean for report in reports.values())
+
+    # A second pass finds nothing to do.
+    await IndexManager(database, REGISTRY).ensure()
+    assert database["searchers"].create_calls == [["telegram_user_id_1"]]
+
+
+@pytest.mark.asyncio
+async def test_check_reports_conflicting_and_unexpected_indexes():
+    database = FakeDatabase(
+        searchers=FakeCollection([
+            {"name": "telegram_user_id_1", "key": {"telegram_user_id": 1}},
+            {"name": "status_1", "key": {"status": 1}},
+            {"name": "legacy_1", "key": {"legacy": 1}},
+        ]),
+        properties=FakeCollection([
+            {"name": "description_text_title_text", "key": {"_fts": "text", "_ftsx": 1}},
+        ])
+    )
+    reports = await IndexManager(database, REGISTRY).check()
+
+    assert reports["searchers"].conflicting == ["telegram_user_id_1"]
+    assert reports["searchers"].unexpected == ["legacy_1"]
+    assert reports["searchers"].missing == []
+    assert reports["properties"].clean
@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from app.core.config.mongodb import db
+from app.core.lease import LEASES, Lease, LeasedService
+
+mongomock = pytest.importorskip("mongomock")
+
+
+class AsyncCollection:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one_and_update(self, *args, **kwargs):
+        return self.collection.find_one_and_update(*args, **kwargs)
+
+    async def delete_one(self, query):
+        return self.collection.delete_one(query)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.database = mongomock.MongoClient().db
+
+    def __getitem__(self, name):
+        return AsyncCollection(self.database[name])
+
+
+@pytest.fixture
+def leases(monkeypatch):
+    fake = FakeDatabase()
+    monkeypatch.setattr(db, "db", fake)
+    return fake.database[LEASES]
+
+
+@pytest.mark.asyncio
+async def test_one_holder_at_a_time(leases):
+    first, second = Lease("job", ttl=60, owner="a"), Lease("job", ttl=60, owner="b")
+    assert await first.acquire()
+    assert not await second.acquire()
+    # Renewing is taking it again
+    assert await first.acquire()
+
+    await first.release()
+    assert await second.acquire()
+    assert leases.find_one({"_id": "job"})["owner"] == "b"
+
+
+@pytest.mark.asyncio
+async def test_expired_leases_are_taken_over(leases):
+    assert await Lease("job", ttl=-1, owner="a").acquire()
+    assert await Lease("job", ttl=60, owner="b").acquire()
+
+
+@pytest.mark.asyncio
+async def test_only_the_holder_runs_the_service(leases):
+    started = []
+
+    async def stop():
+        started.pop()
+
+    services = [
+        LeasedService(Lease("job", ttl=0.06, owner=owner), lambda: started.append(1), stop)
+        for owner in ("a", "b")
+    ]
+    for service in services:
+        service.start()
+    await asyncio.sleep(0.05)
+    assert len(started) == 1
+    holder = next(service for service in services if service.running)
+    other = next(service for service in services if not service.running)
+
+    # The holder goes away; the other process takes over once the lease is free
+    await holder.stop()
+    await asyncio.sleep(0.05)
+    assert other.running and len(started) == 1
+    await other.stop()
+    assert started == []
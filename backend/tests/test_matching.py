@@ -0,0 +1,130 @@
+import time
+from datetime import datetime
+import pytest
+from app.models.entities.searcher import (
+    Searcher,
+    SearcherStatus,
+    SearcherType,
+    SearchPreferences,
+    PriceRange,
+    LocationPreference,
+    DatePreference,
+    Requirements
+)
+from app.services.matching import MatchingEngine
+
+
+def make_preferences(
+    min_price=300,
+    max_price=800,
+    cities=("Milan",),
+    areas=(),
+    move_in=datetime(2025, 2, 1),
+    duration=6,
+    **requirements
+):
+    return SearchPreferences(
+        price_range=PriceRange(min=min_price, max=max_price),
+        location=LocationPreference(cities=list(cities), areas=list(areas)),
+        dates=DatePreference(move_in=move_in, duration=duration),
+        requirements=Requirements(**requirements)
+    )
+
+
+def make_property(**overrides):
+    prop = {
+        "status": "active",
+        "price": 500,
+        "city": "Milan",
+        "area": "Navigli",
+        "available_from": datetime(2025, 1, 15),
+        "minimum_stay": 3,
+        "furnished": True,
+        "internet": False,
+        "utilities_included": False,
+    }
+    prop.update(overrides)
+    return prop
+
+
+@pytest.fixture
+def engine():
+    return MatchingEngine()
+
+
+def test_match_basic(engine):
+    engine.upsert("1", make_preferences())
+    engine.upsert("2", make_preferences(cities=["Rome"]))
+    assert engine.match(make_property()) == ["1"]
+
+
+def test_match_price_bounds(engine):
+    engine.upsert("1", make_preferences(min_price=300, max_price=500))
+    assert engine.match(make_property(price=500)) == ["1"]
+    assert engine.match(make_property(price=501)) == []
+    assert engine.match(make_property(price=299.99)) == []
+
+
+def test_match_areas_dates_and_requirements(engine):
+    engine.upsert("areas", make_preferences(areas=["Città Studi"]))
+    engine.upsert("internet", make_preferences(internet=True))
+    engine.upsert("short", make_preferences(duration=2))
+    engine.upsert("early", make_preferences(move_in=datetime(2025, 1, 1)))
+    engine.upsert("furnished", make_preferences(furnished=True))
+    assert engine.match(make_property()) == ["furnished"]
+
+
+def test_inactive_property_never_matches(engine):
+    engine.upsert("1", make_preferences())
+    assert engine.match(make_property(status="inactive")) == []
+    assert engine.match(make_property(available_from=None)) == []
+
+
+def test_wide_price_range(engine):
+    engine.upsert("1", make_preferences(min_price=0, max_price=1_000_000))
+    assert engine.match(make_property(price=123_456)) == ["1"]
+    engine.remove("1")
+    assert engine.match(make_property(price=123_456)) == []
+
+
+def test_upsert_replaces_previous_preferences(engine):
+    engine.upsert("1", make_preferences())
+    engine.upsert("1", make_preferences(cities=["Rome"]))
+    assert engine.match(make_property()) == []
+    assert engine.match(make_property(city="Rome")) == ["1"]
+    assert len(engine) == 1
+
+
+def test_sync_follows_status(engine):
+    searcher = Searcher(
+        telegram_user_id="1",
+        searcher_type=SearcherType.STUDENT,
+        search_preferences=make_preferences()
+    )
+    engine.sync(searcher)
+    assert "1" in engine
+    engine.sync(searcher.model_copy(update={"status": SearcherStatus.INACTIVE}))
+    assert "1" not in engine
+    assert engine._buckets == {}
+
+
+def test_match_is_fast_with_many_searchers(engine):
+    cities = ["Milan", "Rome", "Turin", "Bologna", "Florence"]
+    for i in range(20_000):
+        low = 200 + (i % 20) * 25
+        engine.upsert(
+            str(i),
+            make_preferences(
+                min_price=low,
+                max_price=low + 400,
+                cities=[cities[i % len(cities)]],
+                furnished=bool(i % 2)
+            )
+        )
+    prop = make_property()
+    start = time.perf_counter()
+    for _ in range(100):
+        matches = engine.match(prop)
+    elapsed = (time.perf_counter() - start) / 100
+    assert matches
+    assert elapsed < 0.005
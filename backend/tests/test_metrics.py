@@ -0,0 +1,90 @@
+import pytest
+from fastapi import APIRouter, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from app.core.metrics import UNMATCHED_ROUTE, render_metrics
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.rate_limit import RateLimitMiddleware
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    router = APIRouter()
+
+    @router.get("/metrics-test/items/{item_id}")
+    async def get_item(item_id: str):
+        if item_id == "missing":
+            raise HTTPException(status_code=404, detail="Not found")
+        return {"id": item_id}
+
+    @router.get("/metrics-test/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    app.include_router(router, prefix="/api")
+    app.add_middleware(MetricsMiddleware)
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_requests_are_labelled_by_route_template(client):
+    endpoint = "/api/metrics-test/items/{item_id}"
+    before = sample("http_requests_total", method="GET", endpoint=endpoint, status="200")
+    client.get("/api/metrics-test/items/1")
+    client.get("/api/metrics-test/items/2")
+    assert sample("http_requests_total", method="GET", endpoint=endpoint, status="200") == before + 2
+    assert sample("http_request_duration_seconds_count", method="GET", endpoint=endpoint) >= 2
+    assert sample("http_response_size_bytes_sum", method="GET", endpoint=endpoint) > 0
+    assert sample("http_requests_in_progress", method="GET") == 0
+
+
+def test_error_statuses_are_recorded(client):
+    endpoint = "/api/metrics-test/items/{item_id}"
+    before_404 = sample("http_requests_total", method="GET", endpoint=endpoint, status="404")
+    before_500 = sample("http_requests_total", method="GET", endpoint="/api/metrics-test/boom", status="500")
+    client.get("/api/metrics-test/items/missing")
+    assert client.get("/api/metrics-test/boom").status_code == 500
+    assert sample("http_requests_total", method="GET", endpoint=endpoint, status="404") == before_404 + 1
+    assert sample("http_requests_total", method="GET", endpoint="/api/metrics-test/boom", status="500") == before_500 + 1
+
+
+def test_unknown_paths_share_one_series(client):
+    before = sample("http_requests_total", method="GET", endpoint=UNMATCHED_ROUTE, status="404")
+    client.get("/no/such/path/1")
+    client.get("/no/such/path/2")
+    assert sample("http_requests_total", method="GET", endpoint=UNMATCHED_ROUTE, status="404") == before + 2
+
+
+def test_rate_limit_rejections_are_counted():
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    app.add_middleware(RateLimitMiddleware, requests_per_minute=1)
+    client = TestClient(app)
+    before = sample("rate_limit_rejections_total", route="api")
+    client.get("/ping")
+    assert client.get("/ping").status_code == 429
+    assert sample("rate_limit_rejections_total", route="api") == before + 1
+
+
+def test_render_metrics_aggregates_multiprocess_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    content, content_type = render_metrics()
+    assert content_type.startswith("text/plain")
+    # Only the (empty) shared directory is read, not this process's registry
+    assert b"http_requests_total" not in content
+
+
+def test_unknown_methods_share_one_series(client):
+    before = sample("http_requests_total", method="OTHER", endpoint=UNMATCHED_ROUTE, status="404")
+    client.request("FOO", "/no/such/path")
+    client.request("BAR", "/no/such/path")
+    assert sample("http_requests_total", method="OTHER", endpoint=UNMATCHED_ROUTE, status="404") == before + 2
+    assert sample("http_requests_total", method="FOO", endpoint=UNMATCHED_ROUTE, status="404") == 0
@@ -0,0 +1,171 @@
+import json
+import logging
+from types import SimpleNamespace
+from bson import ObjectId
+from prometheus_client import REGISTRY
+from app.core.config import monitoring
+from app.core.config.monitoring import (
+    CommandMetricsListener,
+    PoolMetricsListener,
+    command_shape,
+    query_shape
+)
+
+ADDRESS = ("localhost", 27017)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def run_command(listener, request_id, command, reply, micros, failed=False):
+    name = next(iter(command))
+    listener.started(SimpleNamespace(
+        command_name=name, command=command, request_id=request_id, connection_id=ADDRESS
+    ))
+    done = SimpleNamespace(
+        command_name=name, request_id=request_id, connection_id=ADDRESS,
+        duration_micros=micros, reply=reply, failure=reply
+    )
+    (listener.failed if failed else listener.succeeded)(done)
+
+
+def test_query_shape_hides_literals():
+    query = {
+        "status": "active",
+        "city": "Milan",
+        "price": {"$gte": 300, "$lte": 800},
+        "area": {"$in": ["Navigli", "Brera", "Isola"]},
+        "_id": ObjectId()
+    }
+    assert query_shape(query) == {
+        "status": "?",
+        "city": "?",
+        "price": {"$gte": "?", "$lte": "?"},
+        "area": {"$in": ["?"]},
+        "_id": "?"
+    }
+
+
+def test_command_shape_drops_driver_fields():
+    command = {
+        "find": "properties",
+        "filter": {"city": "Milan"},
+        "limit": 20,
+        "lsid": {"id": "x"},
+        "$db": "cercooffro"
+    }
+    assert json.loads(command_shape("find", command)) == {
+        "find": "properties",
+        "filter": {"city": "?"},
+        "limit": "?"
+    }
+
+
+def test_command_metrics_by_collection_and_command():
+    listener = CommandMetricsListener(slow_command_ms=10_000)
+    labels = {"collection": "monitoring_test", "command": "find"}
+    before = sample("mongodb_command_duration_seconds_count", **labels)
+    docs_before = sample("mongodb_documents_returned_sum", **labels)
+
+    run_command(
+        listener, 1,
+        {"find": "monitoring_test", "filter": {}},
+        {"ok": 1, "cursor": {"id": 0, "firstBatch": [{}, {}, {}]}},
+        micros=2_000
+    )
+
+    assert sample("mongodb_command_duration_seconds_count", **labels) == before + 1
+    assert sample("mongodb_documents_returned_sum", **labels) == docs_before + 3
+    assert listener._pending == {}
+
+
+def test_get_more_is_attributed_to_its_collection():
+    listener = CommandMetricsListener(slow_command_ms=10_000)
+    labels = {"collection": "monitoring_test", "command": "getMore"}
+    before = sample("mongodb_documents_returned_sum", **labels)
+    run_command(
+        listener, 2,
+        {"getMore": 12345, "collection": "monitoring_test"},
+        {"ok": 1, "cursor": {"id": 0, "nextBatch": [{}, {}]}},
+        micros=500
+    )
+    assert sample("mongodb_documents_returned_sum", **labels) == before + 2
+
+
+def test_failures_are_counted():
+    listener = CommandMetricsListener(slow_command_ms=10_000)
+    labels = {"collection": "monitoring_test", "command": "aggregate"}
+    before = sample("mongodb_command_failures_total", **labels)
+    run_command(
+        listener, 3,
+        {"aggregate": "monitoring_test", "pipeline": []},
+        {"ok": 0},
+        micros=100,
+        failed=True
+    )
+    assert sample("mongodb_command_failures_total", **labels) == before + 1
+
+
+def test_slow_commands_are_logged_with_shape(caplog):
+    listener = CommandMetricsListener(slow_command_ms=50)
+    with caplog.at_level(logging.WARNING, logger="app.core.config.monitoring"):
+        run_command(
+            listener, 4,
+            {"find": "properties", "filter": {"city": "Milan", "price": {"$lte": 700}}},
+            {"ok": 1, "cursor": {"id": 0, "firstBatch": []}},
+            micros=5_000
+        )
+        run_command(
+            listener, 5,
+            {"find": "searchers", "filter": {"telegram_id": "42"}},
+            {"ok": 1, "cursor": {"id": 0, "firstBatch": [{}]}},
+            micros=120_000
+        )
+    assert len(caplog.records) == 1
+    message = caplog.records[0].getMessage()
+    assert "on searchers" in message
+    assert '{"telegram_id": "?"}' in message
+    assert "42" not in message.split("shape", 1)[1]
+
+
+def test_pending_commands_keep_no_payload_and_are_bounded(monkeypatch):
+    monkeypatch.setattr(monitoring, "MAX_PENDING_COMMANDS", 2)
+    listener = CommandMetricsListener(slow_command_ms=50)
+    for request_id in range(3):
+        # Their connection died: no reply ever arrives
+        listener.started(SimpleNamespace(
+            command_name="insert",
+            command={"insert": "properties", "documents": [{"title": "x" * 1000}]},
+            request_id=request_id,
+            connection_id=ADDRESS
+        ))
+    assert list(listener._pending) == [(ADDRESS, 1), (ADDRESS, 2)]
+    assert listener._pending[(ADDRESS, 2)] == ("properties", '{"insert": "properties"}')
+
+    quiet = CommandMetricsListener(slow_command_ms=0)
+    run_command(quiet, 9, {"find": "properties", "filter": {}}, {"ok": 1}, micros=10_000_000)
+    assert quiet._pending == {}
+
+
+def test_pool_listener_tracks_connections_and_wait():
+    listener = PoolMetricsListener()
+    current = sample("db_connections_current")
+    in_use = sample("db_connections_in_use")
+    waits = sample("mongodb_pool_checkout_wait_seconds_count")
+
+    event = SimpleNamespace(address=ADDRESS, connection_id=1)
+    listener.connection_created(event)
+    listener.connection_check_out_started(SimpleNamespace(address=ADDRESS))
+    listener.connection_checked_out(event)
+    assert sample("db_connections_in_use") == in_use + 1
+    listener.connection_checked_in(event)
+
+    # pymongo >= 4.7 reports the wait itself
+    listener.connection_checked_out(SimpleNamespace(address=ADDRESS, connection_id=1, duration=0.25))
+    listener.connection_checked_in(event)
+    listener.connection_closed(event)
+
+    assert sample("db_connections_current") == current
+    assert sample("db_connections_in_use") == in_use
+    assert sample("mongodb_pool_checkout_wait_seconds_count") == waits + 2
@@ -0,0 +1,397 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs
+import pytest
+from types import SimpleNamespace
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from telegram import Bot
+from app.core.config.mongodb import db
+from app.telegram.notifications import (
+    FAILED,
+    PENDING,
+    SENDING,
+    SENT,
+    NotificationDispatcher,
+    TokenBucket,
+    coalesce,
+    listing_message
+)
+
+mongomock = pytest.importorskip("mongomock")
+
+
+class AsyncCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self.cursor = self.cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, count):
+        self.cursor = self.cursor.limit(count)
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.cursor)
+
+
+class AsyncCollection:
+    """The Motor calls the dispatcher makes, served by mongomock."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.calls = []
+
+    def find(self, *args, **kwargs):
+        self.calls.append("find")
+        return AsyncCursor(self.collection.find(*args, **kwargs))
+
+    async def insert_one(self, document):
+        return self.collection.insert_one(document)
+
+    async def update_one(self, *args, **kwargs):
+        return self.collection.update_one(*args, **kwargs)
+
+    async def update_many(self, *args, **kwargs):
+        self.calls.append("update_many")
+        return self.collection.update_many(*args, **kwargs)
+
+    async def bulk_write(self, operations, ordered=True):
+        upserted_ids = {}
+        for index, operation in enumerate(operations):
+            result = self.collection.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+            if result.upserted_id is not None:
+                upserted_ids[index] = result.upserted_id
+        return SimpleNamespace(upserted_ids=upserted_ids)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.notifications = AsyncCollection(mongomock.MongoClient().db.notifications)
+
+
+class FakeBotAPI:
+    """A local Bot API server: answers getMe and records sendMessage calls.
+
+    ``errors[chat_id]`` are replied, in order, to the next sendMessage
+    calls for that chat instead of a success.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.errors = {}
+        self.server = None
+        self.connections = set()
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}/bot"
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.server.close()
+        # The bot keeps its connections alive; wait_closed() waits for them
+        for writer in self.connections:
+            writer.close()
+        await self.server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        self.connections.add(writer)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                path = lines[0].split(" ")[1]
+                headers = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+                headers = {name.lower(): value for name, value in headers.items()}
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                payload = self._reply(path.rsplit("/", 1)[-1], headers, body)
+                data = json.dumps(payload).encode()
+                status = payload.get("error_code", 200)
+                writer.write(
+                    f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n".encode()
+                    + f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    def _reply(self, method, headers, body):
+        if "json" in headers.get("content-type", ""):
+            params = json.loads(body or b"{}")
+        else:
+            params = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        if method == "getMe":
+            return {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "bot", "username": "bot"}}
+        chat_id = int(params["chat_id"])
+        if self.errors.get(chat_id):
+            return self.errors[chat_id].pop(0)
+        self.messages.append((chat_id, params["text"], asyncio.get_running_loop().time()))
+        return {"ok": True, "result": {
+            "message_id": len(self.messages),
+            "date": 0,
+            "chat": {"id": int(params["chat_id"]), "type": "private"},
+            "text": params["text"]
+        }}
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    fake = FakeDatabase()
+    monkeypatch.setattr(db, "db", fake)
+    return fake.notifications.collection
+
+
+def dispatcher(**kwargs):
+    options = {"global_rate": 1000, "chat_interval": 0.05, "poll_interval": 0.05}
+    return NotificationDispatcher(**{**options, **kwargs})
+
+
+async def wait_for(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_token_bucket_paces_and_pauses():
+    now = [0.0]
+    bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0])
+    bucket.take()
+    bucket.take()
+    assert bucket.delay() == pytest.approx(0.5)
+    now[0] = 0.5
+    assert bucket.delay() == 0
+    bucket.pause(3)
+    assert bucket.delay() == pytest.approx(3.5)
+    now[0] = 4.0
+    assert bucket.delay() == 0
+    now[0] = 10.0
+    assert bucket.idle()
+
+
+def test_coalesced_message_lists_every_notification():
+    assert coalesce([{"text": "a"}]) == "a"
+    assert coalesce([{"text": "a"}, {"text": "b"}]) == "2 new listings match your search:\n\na\n\nb"
+
+
+@pytest.mark.asyncio
+async def test_fresh_listings_go_first(outbox):
+    sender = dispatcher(concurrency=1)
+    now = datetime.utcnow()
+    await sender.enqueue(1, "old", listed_at=now - timedelta(days=2))
+    await sender.enqueue(2, "fresh", listed_at=now)
+    await sender.enqueue(3, "oldest", listed_at=now - timedelta(days=5))
+    async with FakeBotAPI() as api:
+        await sender.start(Bot("123:abc", base_url=api.base_url))
+        try:
+            await wait_for(lambda: len(api.messages) == 3)
+        finally:
+            await sender.stop()
+    assert [text for _, text, _ in api.messages] == ["fresh", "old", "oldest"]
+    assert outbox.count_documents({"status": SENT}) == 3
+
+
+@pytest.mark.asyncio
+async def test_pending_notifications_of_a_chat_are_coalesced_and_paced(outbox):
+    sender = dispatcher(chat_interval=0.2, max_coalesced=2)
+    listed_at = datetime(2026, 5, 1)
+    for n in range(3):
+        await sender.enqueue(7, f"listing {n}", property_id=n, listed_at=listed_at + timedelta(hours=n))
+    # The same listing is announced once
+    assert not await sender.enqueue(7, "listing 0", property_id=0)
+    async with FakeBotAPI() as api:
+        await sender.start(Bot("123:abc", base_url=api.base_url))
+        try:
+            await wait_for(lambda: len(api.messages) == 2)
+        finally:
+            await sender.stop()
+    # The two freshest together, the last one once the chat's bucket refilled
+    [(_, first, sent_first), (_, second, sent_second)] = api.messages
+    assert first.startswith("2 new listings") and "listing 2" in first and "listing 1" in first
+    assert second == "listing 0"
+    assert sent_second - sent_first >= 0.15
+    assert outbox.count_documents({"status": SENT}) == 3
+
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_and_resends(outbox):
+    sender = dispatcher()
+    async with FakeBotAPI() as api:
+        api.errors[5] = [{
+            "ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+            "parameters": {"retry_after": 1}
+        }]
+        await sender.start(Bot("123:abc", base_url=api.base_url))
+        started = asyncio.get_running_loop().time()
+        try:
+            await sender.enqueue(5, "hello")
+            await wait_for(lambda: api.messages)
+        finally:
+            await sender.stop()
+    assert api.messages[0][2] - started >= 0.9
+    assert outbox.find_one()["status"] == SENT
+
+
+@pytest.mark.asyncio
+async def test_blocked_chats_are_not_retried(outbox):
+    sender = dispatcher()
+    async with FakeBotAPI() as api:
+        api.errors[5] = [{"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}]
+        await sender.start(Bot("123:abc", base_url=api.base_url))
+        try:
+            await sender.enqueue(5, "hello")
+            await sender.enqueue(6, "world")
+            await wait_for(lambda: not len(sender))
+        finally:
+            await sender.stop()
+    assert [chat for chat, _, _ in api.messages] == [6]
+    assert outbox.find_one({"chat_id": 5})["status"] == FAILED
+
+
+@pytest.mark.asyncio
+async def test_outbox_entries_from_other_processes_are_picked_up(outbox):
+    # Written while no dispatcher runs here, as the API process would
+    producer = dispatcher()
+    await producer.enqueue(8, "before restart")
+    assert outbox.find_one()["status"] == PENDING
+
+    sender = dispatcher()
+    async with FakeBotAPI() as api:
+        await sender.start(Bot("123:abc", base_url=api.base_url))
+        try:
+            await wait_for(lambda: len(api.messages) == 1)
+            await producer.enqueue(9, "while running")
+            await wait_for(lambda: len(api.messages) == 2)
+        finally:
+            await sender.stop()
+    assert [text for _, text, _ in api.messages] == ["before restart", "while running"]
+
+
+def test_listing_message():
+    prop = {"city": "Milan", "title": "Room", "price": 500.0, "source_url": "https://example.com/1"}
+    assert listing_message(prop) == "New listing in Milan: Room\n€500/month\nhttps://example.com/1"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicate_enqueue_is_already_queued(outbox, monkeypatch):
+    sender = dispatcher()
+
+    async def lost_race(*args, **kwargs):
+        raise DuplicateKeyError("E11000 duplicate key error")
+
+    monkeypatch.setattr(db.db.notifications, "update_one", lost_race)
+    assert not await sender.enqueue(7, "listing", property_id=1)
+
+
+@pytest.mark.asyncio
+async def test_a_listing_is_queued_for_many_chats_at_once(outbox):
+    producer = dispatcher()
+    assert await producer.enqueue_many([1, 2, 2], "listing", property_id=7) == 2
+    assert await producer.enqueue_many([2, 3], "listing", property_id=7) == 1
+    assert sorted(doc["chat_id"] for doc in outbox.find({"status": PENDING})) == [1, 2, 3]
+
+    sender = dispatcher()
+    async with FakeBotAPI() as api:
+        await sender.start(Bot("123:abc", base_url=api.base_url))
+        try:
+            await sender.enqueue_many([4, 5], "while running", property_id=7)
+            await wait_for(lambda: len(api.messages) == 5)
+        finally:
+            await sender.stop()
+    assert outbox.count_documents({"status": SENT}) == 5
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicate_enqueue_many_skips_those_chats(outbox, monkeypatch):
+    sender = dispatcher()
+
+    async def lost_race(operations, ordered=True):
+        raise BulkWriteError({
+            "upserted": [{"index": 0, "_id": "new"}],
+            "writeErrors": [{"index": 1, "code": 11000, "errmsg": "E11000 duplicate key error"}]
+        })
+
+    monkeypatch.setattr(db.db.notifications, "bulk_write", lost_race)
+    assert await sender.enqueue_many([1, 2], "listing", property_id=7) == 1
+
+
+@pytest.mark.asyncio
+async def test_dispatchers_sharing_the_outbox_send_each_entry_once(outbox):
+    producer = dispatcher()
+    for chat_id in range(20):
+        await producer.enqueue(chat_id, f"to {chat_id}")
+
+    senders = [dispatcher(owner="a"), dispatcher(owner="b")]
+    async with FakeBotAPI() as api:
+        bot = Bot("123:abc", base_url=api.base_url)
+        await asyncio.gather(*(sender.start(bot) for sender in senders))
+        try:
+            await producer.enqueue(20, "while running")
+            await wait_for(lambda: outbox.count_documents({"status": SENT}) == 21)
+            await asyncio.sleep(0.1)
+        finally:
+            for sender in senders:
+                await sender.stop()
+    assert sorted(chat for chat, _, _ in api.messages) == list(range(21))
+
+
+@pytest.mark.asyncio
+async def test_lapsed_claims_are_taken_over(outbox):
+    # Claimed by a dispatcher that died before sending
+    outbox.insert_many([
+        {"chat_id": 1, "text": "lapsed", "listed_at": datetime.utcnow(),
+         "status": SENDING, "owner": "gone", "claim_expires_at": datetime.utcnow() - timedelta(seconds=1),
+         "created_at": datetime.utcnow() - timedelta(hours=1)},
+        {"chat_id": 2, "text": "held", "listed_at": datetime.utcnow(),
+         "status": SENDING, "owner": "alive", "claim_expires_at": datetime.utcnow() + timedelta(minutes=1),
+         "created_at": datetime.utcnow() - timedelta(hours=1)},
+    ])
+    sender = dispatcher(owner="here")
+    async with FakeBotAPI() as api:
+        await sender.start(Bot("123:abc", base_url=api.base_url))
+        try:
+            await wait_for(lambda: api.messages)
+            await asyncio.sleep(0.1)
+        finally:
+            await sender.stop()
+    assert [text for _, text, _ in api.messages] == ["lapsed"]
+    assert outbox.find_one({"chat_id": 1})["owner"] == "here"
+    assert outbox.find_one({"chat_id": 2})["status"] == SENDING
+
+
+@pytest.mark.asyncio
+async def test_a_page_of_the_outbox_is_claimed_at_once(outbox):
+    now = datetime.utcnow()
+    outbox.insert_many([
+        {"chat_id": chat_id, "text": "hi", "listed_at": now, "status": PENDING, "created_at": now}
+        for chat_id in range(5)
+    ] + [
+        {"chat_id": 9, "text": "held", "listed_at": now, "status": SENDING, "owner": "alive",
+         "claim_expires_at": now + timedelta(minutes=1), "created_at": now},
+    ])
+    sender = dispatcher(owner="here")
+    sender._wakeup = asyncio.Event()  # queue without sending
+    db.db.notifications.calls.clear()
+    await sender.load()
+    # Read the page, claim it, read back what was claimed
+    assert db.db.notifications.calls == ["find", "update_many", "find"]
+    assert len(sender) == 5
+    assert outbox.count_documents({"status": SENDING, "owner": "here"}) == 5
+    assert outbox.find_one({"chat_id": 9})["owner"] == "alive"
+
+
+@pytest.mark.asyncio
+async def test_stopping_hands_unsent_entries_back(outbox):
+    sender = dispatcher(owner="here", global_rate=0.01)
+    async with FakeBotAPI() as api:
+        await sender.start(Bot("123:abc", base_url=api.base_url))
+        await sender.enqueue(1, "first")
+        await sender.enqueue(2, "second")
+        await wait_for(lambda: api.messages)
+        await sender.stop()
+    unsent = outbox.find_one({"status": SENDING})
+    assert unsent["owner"] == "here" and unsent["claim_expires_at"] <= datetime.utcnow()
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from app.services.pagination import (
+    cursor_for,
+    decode_cursor,
+    encode_cursor,
+    keyset_filter,
+    paginate_query
+)
+
+SORT = [("created_at", -1), ("_id", -1)]
+
+
+def test_cursor_round_trip():
+    values = [datetime(2025, 1, 1, 12, 30), ObjectId()]
+    assert decode_cursor(encode_cursor(values), SORT) == values
+
+
+@pytest.mark.parametrize("token", ["", "not-base64!", encode_cursor([1]), encode_cursor({"a": 1})])
+def test_decode_rejects_bad_cursors(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token, SORT)
+
+
+def test_keyset_filter_shape():
+    oid = ObjectId()
+    assert keyset_filter([("price", 1), ("_id", -1)], [500, oid]) == {
+        "price": {"$gte": 500},
+        "$or": [
+            {"price": {"$gt": 500}},
+            {"price": 500, "_id": {"$lt": oid}},
+        ]
+    }
+
+
+def test_paginate_query_without_cursor_is_unchanged():
+    query = {"status": "active"}
+    assert paginate_query(query, SORT, None) is query
+
+
+def test_cursor_walk_visits_every_document_once():
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient().db.properties
+    start = datetime(2025, 1, 1)
+    # Duplicate timestamps force the _id tie-breaker to do its job.
+    collection.insert_many([
+        {"status": "active", "created_at": start + timedelta(days=i // 3)}
+        for i in range(25)
+    ])
+    query = {"status": "active"}
+
+    seen, cursor = [], None
+    while True:
+        page = list(
+            collection.find(paginate_query(query, SORT, cursor)).sort(SORT).limit(4)
+        )
+        seen.extend(doc["_id"] for doc in page)
+        if len(page) < 4:
+            break
+        cursor = cursor_for(page[-1], SORT)
+
+    expected = [doc["_id"] for doc in collection.find(query).sort(SORT)]
+    assert seen == expected
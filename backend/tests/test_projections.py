@@ -0,0 +1,90 @@
+from datetime import datetime
+import orjson
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from app.api.responses import MongoJSONResponse
+from app.main import app
+from app.services.projections import (
+    CARD_FIELDS,
+    nested,
+    project_stage,
+    resolve_projection,
+    with_fields
+)
+
+client = TestClient(app)
+
+
+def test_full_view_loads_whole_documents():
+    assert resolve_projection() is None
+    assert resolve_projection("full") is None
+
+
+def test_card_view_keeps_the_first_image_only():
+    projection = resolve_projection("card")
+    assert set(projection) == set(CARD_FIELDS)
+    assert projection["images"] == {"$slice": 1}
+    assert "description" not in projection
+
+
+def test_detail_view_adds_the_long_fields():
+    projection = resolve_projection("detail")
+    assert projection["description"] == 1
+    assert projection["images"] == 1
+
+
+def test_fields_override_the_view():
+    assert resolve_projection("card", " title, price ,,") == {"title": 1, "price": 1}
+
+
+@pytest.mark.parametrize("view,fields", [
+    ("compact", None),
+    ("full", ""),
+    ("full", "title,$where"),
+    ("full", "owner.password"),
+    ("full", ",".join(f"f{n}" for n in range(31))),
+])
+def test_bad_selections_are_rejected(view, fields):
+    with pytest.raises(ValueError):
+        resolve_projection(view, fields)
+
+
+def test_sort_keys_are_added_back():
+    assert with_fields(None, ["created_at"]) is None
+    assert with_fields({"title": 1}, ["created_at", "_id"]) == {"title": 1, "created_at": 1, "_id": 1}
+
+
+def test_aggregation_stage_slices_the_array_expression():
+    assert project_stage(None) is None
+    assert project_stage({"title": 1, "images": {"$slice": 1}}) == {
+        "$project": {"title": 1, "images": {"$slice": ["$images", 1]}}
+    }
+    assert nested({"title": 1}, "property") == {"property.title": 1}
+
+
+def test_card_projection_in_a_pipeline():
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient().db.properties
+    collection.insert_one({
+        "_id": 1, "title": "Room", "price": 500, "description": "x" * 500,
+        "images": ["a.jpg", "b.jpg", "c.jpg"]
+    })
+    [doc] = collection.aggregate([project_stage(resolve_projection("card"))])
+    assert doc == {"_id": 1, "title": "Room", "price": 500, "images": ["a.jpg"]}
+
+
+def test_response_encodes_mongo_types():
+    _id = ObjectId()
+    response = MongoJSONResponse({
+        "results": [{"_id": _id, "created_at": datetime(2026, 1, 2, 3, 4, 5)}]
+    })
+    assert orjson.loads(response.body) == {
+        "results": [{"_id": str(_id), "created_at": "2026-01-02T03:04:05"}]
+    }
+
+
+def test_endpoints_validate_the_selection():
+    assert client.get("/api/v1/search/near", params={"university": "polimi", "view": "compact"}).status_code == 422
+    response = client.get("/api/v1/search/near", params={"university": "polimi", "fields": "owner.password"})
+    assert response.status_code == 400
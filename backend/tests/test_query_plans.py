@@ -0,0 +1,196 @@
+"""Query plan regression suite.
+
+Seeds a scratch database on the MongoDB at ``MONGODB_URL``, builds the
+registry indexes and runs ``explain`` on every query shape SearchService
+issues. Skipped when no server is reachable.
+"""
+import random
+from datetime import datetime, timedelta
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from app.core.config.indexes import INDEXES
+from app.core.config.settings import settings
+from app.models.entities.searcher import (
+    SearchPreferences,
+    PriceRange,
+    LocationPreference,
+    DatePreference,
+    Requirements
+)
+from app.services.pagination import cursor_for, paginate_query
+from app.services.ranking import ranking_projection
+from app.services.search import PROPERTIES_SORT, TEXT_SORT, SearchService
+
+SEED_SIZE = 5000
+CITIES = ["Milan", "Rome", "Turin", "Bologna", "Florence", "Padua", "Pisa", "Naples"]
+AREAS = ["Città Studi", "Navigli", "Centrale", "Lambrate", "Isola"]
+WORDS = ["stanza", "monolocale", "bilocale", "luminoso", "arredato", "centro", "studenti"]
+
+# A plan may examine at most this many documents per document it returns
+# (plus a small constant for short result sets) before it counts as a regression.
+MAX_EXAMINED_PER_RETURNED = 4
+EXAMINED_SLACK = 50
+
+PREFERENCES = SearchPreferences(
+    price_range=PriceRange(min=350, max=700),
+    location=LocationPreference(cities=["Milan", "Turin"]),
+    dates=DatePreference(move_in=datetime(2025, 9, 1), duration=12),
+    requirements=Requirements(furnished=True)
+)
+
+
+@pytest.fixture(scope="module")
+def properties():
+    client = MongoClient(settings.MONGODB_URL, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip("MongoDB is not reachable")
+
+    database = client[f"{settings.MONGODB_DB_NAME}_query_plans"]
+    collection = database["properties"]
+    collection.drop()
+    rng = random.Random(7)
+    start = datetime(2024, 1, 1)
+    collection.insert_many([
+        {
+            "status": "active" if rng.random() < 0.8 else "inactive",
+            "title": " ".join(rng.sample(WORDS, 3)),
+            "description": " ".join(rng.choices(WORDS, k=12)),
+            "city": rng.choice(CITIES),
+            "area": rng.choice(AREAS),
+            "price": rng.randrange(200, 1500),
+            "available_from": start + timedelta(days=rng.randrange(0, 600)),
+            "minimum_stay": rng.randrange(1, 12),
+            "furnished": rng.random() < 0.6,
+            "created_at": start + timedelta(minutes=i),
+            # Scattered around the Politecnico di Milano, up to ~10 km away
+            "location": {
+                "type": "Point",
+                "coordinates": [9.2273 + rng.uniform(-0.1, 0.1), 45.4781 + rng.uniform(-0.07, 0.07)]
+            },
+            "campus_distances": {"polimi": rng.randrange(0, 10_000)},
+        }
+        for i in range(SEED_SIZE)
+    ])
+    collection.create_indexes(INDEXES["properties"])
+    yield collection
+    client.drop_database(database.name)
+    client.close()
+
+
+def _stages(plan):
+    """Yield every stage name in an explain plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+
+def _execution_stats(explain):
+    """Locate executionStats in a find or aggregate explain document."""
+    if "executionStats" in explain:
+        return explain["executionStats"]
+    for stage in explain.get("stages", []):
+        if "$cursor" in stage:
+            return stage["$cursor"]["executionStats"]
+    raise AssertionError("explain output has no executionStats")
+
+
+def assert_efficient_plan(explain):
+    stages = set(_stages(explain))
+    assert "COLLSCAN" not in stages, f"plan regressed to a collection scan: {stages}"
+
+    stats = _execution_stats(explain)
+    returned, examined = stats["nReturned"], stats["totalDocsExamined"]
+    assert examined <= returned * MAX_EXAMINED_PER_RETURNED + EXAMINED_SLACK, (
+        f"plan examined {examined} documents to return {returned}"
+    )
+
+
+def explain_aggregate(collection, pipeline):
+    return collection.database.command(
+        "explain",
+        {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}},
+        verbosity="executionStats"
+    )
+
+
+def test_preferences_page(properties):
+    query = SearchService.build_preferences_query(PREFERENCES)
+    pipeline = [
+        {"$match": query},
+        {"$sort": dict(PROPERTIES_SORT)},
+        {"$skip": 20},
+        {"$limit": 11}
+    ]
+    assert_efficient_plan(explain_aggregate(properties, pipeline))
+
+
+def test_preferences_total(properties):
+    query = SearchService.build_preferences_query(PREFERENCES)
+    explain = explain_aggregate(properties, [{"$match": query}, {"$count": "count"}])
+    assert "COLLSCAN" not in set(_stages(explain))
+
+
+def test_preferences_cursor_page(properties):
+    query = SearchService.build_preferences_query(PREFERENCES)
+    anchor = properties.find(query).sort(PROPERTIES_SORT).skip(200).limit(1).next()
+    explain = properties.find(
+        paginate_query(query, PROPERTIES_SORT, cursor_for(anchor, PROPERTIES_SORT))
+    ).sort(PROPERTIES_SORT).limit(11).explain()
+    assert_efficient_plan(explain)
+
+
+def test_preferences_with_areas(properties):
+    preferences = PREFERENCES.model_copy(deep=True)
+    preferences.location.areas = ["Navigli"]
+    query = SearchService.build_preferences_query(preferences)
+    explain = properties.find(query).sort(PROPERTIES_SORT).limit(11).explain()
+    assert_efficient_plan(explain)
+
+
+def test_text_search(properties):
+    query = SearchService.build_text_query("monolocale", city="Milan", max_price=800)
+    pipeline = [
+        {"$match": query},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+        {"$sort": dict(TEXT_SORT)},
+        {"$limit": 11}
+    ]
+    assert "COLLSCAN" not in set(_stages(explain_aggregate(properties, pipeline)))
+
+
+def test_recommendations(properties):
+    query = SearchService.build_recommendations_query(PREFERENCES)
+    explain = properties.find(query).limit(5).explain()
+    assert_efficient_plan(explain)
+
+
+def test_near_university(properties):
+    query = SearchService.build_near_query(max_price=700)
+    pipeline = SearchService.build_near_pipeline(query, 1, university="polimi")
+    explain = explain_aggregate(properties, pipeline + [{"$limit": 11}])
+    assert_efficient_plan(explain)
+
+
+def test_near_point(properties):
+    query = SearchService.build_near_query(max_price=700)
+    pipeline = SearchService.build_near_pipeline(query, 1, latitude=45.4781, longitude=9.2273)
+    assert "COLLSCAN" not in set(_stages(explain_aggregate(properties, pipeline + [{"$limit": 11}])))
+
+
+def test_recommendation_candidates(properties):
+    query = SearchService.build_recommendations_query(PREFERENCES)
+    pipeline = [
+        {"$match": query},
+        {"$sort": dict(PROPERTIES_SORT)},
+        {"$limit": 2000},
+        {"$project": ranking_projection()}
+    ]
+    assert_efficient_plan(explain_aggregate(properties, pipeline))
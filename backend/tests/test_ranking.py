@@ -0,0 +1,136 @@
+import math
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app.models.entities.searcher import (
+    SearchPreferences,
+    PriceRange,
+    LocationPreference,
+    DatePreference,
+    Requirements
+)
+from app.services.matching import REQUIREMENT_BITS, requirements_mask
+from app.services.ranking import (
+    candidate_columns,
+    rank_candidates,
+    ranking_projection,
+    score_columns,
+    top_k
+)
+
+NOW = datetime(2025, 6, 1)
+EPOCH = datetime(1970, 1, 1)
+
+PREFERENCES = SearchPreferences(
+    price_range=PriceRange(min=400, max=800),
+    location=LocationPreference(cities=["Milan"], areas=["Città Studi"]),
+    dates=DatePreference(move_in=datetime(2025, 9, 1), duration=10),
+    requirements=Requirements(furnished=True, internet=True)
+)
+
+
+def prop(_id, **overrides):
+    doc = {
+        "_id": _id,
+        "price": 600.0,
+        "area": "Città Studi",
+        "furnished": True,
+        "internet": True,
+        "available_from": datetime(2025, 9, 1),
+        "created_at": NOW - timedelta(days=1),
+        "campus_distances": {"polimi": 500},
+    }
+    doc.update(overrides)
+    return doc
+
+
+def candidate_row(doc, university=None):
+    """What ``ranking_projection`` returns, for a document already in memory."""
+    distances = doc.get("campus_distances") or {}
+    if university is None:
+        distance = min(distances.values(), default=math.nan)
+    else:
+        distance = distances.get(university, math.nan)
+    dates = {
+        field: (doc[field] - EPOCH).total_seconds() * 1000 if doc.get(field) is not None else math.nan
+        for field in ("available_from", "created_at")
+    }
+    return {
+        "_id": doc.get("_id"),
+        "price": doc.get("price", math.nan),
+        "area": doc.get("area"),
+        "mask": requirements_mask({field: doc.get(field) is True for field in REQUIREMENT_BITS}),
+        "distance": distance,
+        **dates,
+    }
+
+
+def score(doc):
+    columns = candidate_columns([candidate_row(doc)])
+    return float(score_columns(columns, PREFERENCES, NOW)[0])
+
+
+@pytest.mark.parametrize("worse", [
+    {"price": 790.0},
+    {"price": 830.0},
+    {"area": "Navigli"},
+    {"internet": False},
+    {"available_from": datetime(2025, 6, 1)},
+    {"created_at": NOW - timedelta(days=60)},
+    {"campus_distances": {"polimi": 8000}},
+    {"campus_distances": {}},
+])
+def test_each_component_pulls_the_score_down(worse):
+    assert score(prop(1, **worse)) < score(prop(1))
+
+
+def test_prices_beyond_the_tolerance_score_nothing_for_price():
+    # Past the tolerance only the price component is lost
+    assert score(prop(1, price=900.0)) == pytest.approx(score(prop(1, price=800.0)) - 0.3 * 0.75)
+
+
+def test_top_k_matches_a_full_sort():
+    scores = np.random.default_rng(1).random(1000)
+    assert list(top_k(scores, 10)) == list(np.argsort(-scores)[:10])
+    assert list(top_k(scores[:3], 10)) == list(np.argsort(-scores[:3]))
+    assert len(top_k(scores, 0)) == 0
+
+
+def test_rank_candidates_returns_the_best_first():
+    rows = [
+        candidate_row(prop("far", campus_distances={"polimi": 9000})),
+        candidate_row(prop("best")),
+        candidate_row(prop("pricey", price=850.0)),
+        candidate_row(prop("old", created_at=NOW - timedelta(days=90))),
+    ]
+    ranked = rank_candidates(rows, PREFERENCES, limit=2, now=NOW)
+    assert [_id for _id, _ in ranked] == ["best", "far"]
+    assert ranked[0][1] > ranked[1][1]
+
+
+def test_projection_matches_in_memory_rows():
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient().db.properties
+    docs = [
+        prop(1),
+        prop(2, furnished=False, utilities_included=True, area=None),
+        prop(3, campus_distances=None, available_from=None),
+    ]
+    for doc in docs:
+        doc = dict(doc)
+        if doc["area"] is None:
+            del doc["area"]
+        collection.insert_one(doc)
+
+    projected = list(collection.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$project": ranking_projection("polimi")}
+    ]))
+    expected = [candidate_row(doc, "polimi") for doc in docs]
+    for row, want in zip(projected, expected):
+        assert row.keys() == want.keys()
+        for field, value in want.items():
+            if isinstance(value, float) and math.isnan(value):
+                assert math.isnan(row[field]), field
+            else:
+                assert row[field] == value, field
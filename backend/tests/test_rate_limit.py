@@ -0,0 +1,163 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.middleware import rate_limit
+from app.middleware.rate_limit import (
+    MemoryRateLimitBackend,
+    RateLimitMiddleware,
+    RedisRateLimitBackend
+)
+
+
+class FakeRedis:
+    """Local stand-in for the Redis commands the limiter pipelines."""
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def incr(self, key):
+        self.commands.append(("incr", key))
+
+    def expire(self, key, seconds):
+        self.commands.append(("expire", key))
+
+    def get(self, key):
+        self.commands.append(("get", key))
+
+    async def execute(self):
+        results = []
+        for command, key in self.commands:
+            if command == "incr":
+                self.redis.data[key] = self.redis.data.get(key, 0) + 1
+                results.append(self.redis.data[key])
+            elif command == "expire":
+                results.append(True)
+            else:
+                value = self.redis.data.get(key)
+                results.append(str(value).encode() if value is not None else None)
+        return results
+
+
+def make_client(**options):
+    app = FastAPI()
+
+    @app.get("/api/v1/search/text")
+    async def search():
+        return {"ok": True}
+
+    @app.get("/api/v1/telegram/webhook")
+    async def webhook():
+        return {"ok": True}
+
+    app.add_middleware(RateLimitMiddleware, **options)
+    return TestClient(app)
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_rolls_windows():
+    backend = MemoryRateLimitBackend()
+    assert await backend.increment("k", 10) == (1, 0)
+    assert await backend.increment("k", 10) == (2, 0)
+    assert await backend.increment("k", 11) == (1, 2)
+    assert await backend.increment("k", 13) == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_evicts_least_recently_used_keys():
+    backend = MemoryRateLimitBackend(max_keys=2)
+    await backend.increment("a", 1)
+    await backend.increment("b", 1)
+    await backend.increment("a", 1)
+    await backend.increment("c", 1)
+    assert len(backend) == 2
+    assert await backend.increment("a", 1) == (3, 0)
+    assert await backend.increment("b", 1) == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_matches_memory_backend():
+    backend = RedisRateLimitBackend(FakeRedis())
+    assert await backend.increment("k", 10) == (1, 0)
+    assert await backend.increment("k", 10) == (2, 0)
+    assert await backend.increment("k", 11) == (1, 2)
+
+
+def test_requests_over_the_limit_are_rejected():
+    client = make_client(requests_per_minute=3)
+    statuses = [client.get("/api/v1/search/text").status_code for _ in range(5)]
+    assert statuses[:3] == [200, 200, 200]
+    assert statuses[3:] == [429, 429]
+
+
+def test_telegram_routes_have_their_own_limit_and_key():
+    client = make_client(
+        requests_per_minute=1,
+        telegram_requests_per_minute=3,
+        key_parts=["ip", "route"]
+    )
+    assert client.get("/api/v1/search/text").status_code == 200
+    assert client.get("/api/v1/search/text").status_code == 429
+    assert [client.get("/api/v1/telegram/webhook").status_code for _ in range(3)] == [200] * 3
+
+
+def test_telegram_id_keys_limit_users_independently():
+    client = make_client(requests_per_minute=1, key_parts=["telegram_id"])
+    assert client.get("/api/v1/search/text", params={"telegram_id": "1"}).status_code == 200
+    assert client.get("/api/v1/search/text", params={"telegram_id": "2"}).status_code == 200
+    assert client.get("/api/v1/search/text", params={"telegram_id": "1"}).status_code == 429
+
+
+def test_unknown_key_parts_are_rejected():
+    with pytest.raises(ValueError):
+        RateLimitMiddleware(None, key_parts=["session"])
+
+
+def test_rotating_telegram_ids_hit_the_per_address_ceiling():
+    client = make_client(
+        requests_per_minute=1,
+        key_parts=["telegram_id"],
+        ip_requests_per_minute=3
+    )
+    statuses = [
+        client.get("/api/v1/search/text", params={"telegram_id": str(i)}).status_code
+        for i in range(5)
+    ]
+    assert statuses == [200, 200, 200, 429, 429]
+
+
+class BrokenRedis:
+    def pipeline(self, transaction=True):
+        raise ConnectionError("Connection refused")
+
+
+def test_shared_backend_failures_fall_back_to_process_limits(monkeypatch):
+    monkeypatch.setattr(rate_limit, "get_redis", lambda url: BrokenRedis())
+    client = make_client(requests_per_minute=2, backend_url="redis://unreachable")
+    statuses = [client.get("/api/v1/search/text").status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+
+def test_verified_webhook_deliveries_are_not_limited(monkeypatch):
+    monkeypatch.setattr(rate_limit.settings, "TELEGRAM_WEBHOOK_SECRET", "s3cret")
+    client = make_client(telegram_requests_per_minute=2)
+    valid = {"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+    assert [client.get("/api/v1/telegram/webhook", headers=valid).status_code for _ in range(5)] == [200] * 5
+
+    wrong = {"X-Telegram-Bot-Api-Secret-Token": "guess"}
+    statuses = [client.get("/api/v1/telegram/webhook", headers=wrong).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
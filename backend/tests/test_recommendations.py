@@ -0,0 +1,355 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from pymongo import DeleteMany, UpdateOne
+from pymongo.errors import OperationFailure
+from app.core.config.mongodb import db
+from app.models.entities.searcher import (
+    SearchPreferences,
+    PriceRange,
+    LocationPreference,
+    DatePreference,
+    Requirements
+)
+from app.services.matching import matching_engine
+from app.services import recommendations
+from app.services.recommendations import RECOMMENDED, RecommendationMaterializer
+
+mongomock = pytest.importorskip("mongomock")
+
+
+class AsyncCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self.cursor = self.cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, count):
+        self.cursor = self.cursor.limit(count)
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.cursor)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.cursor:
+            yield document
+
+
+class AsyncCollection:
+    """The Motor calls the materializer makes, served by mongomock."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+        self.reads = 0
+
+    def find(self, *args, **kwargs):
+        self.reads += 1
+        return AsyncCursor(self.collection.find(*args, **kwargs))
+
+    def aggregate(self, pipeline):
+        return AsyncCursor(self.collection.aggregate(pipeline))
+
+    async def find_one(self, *args, **kwargs):
+        return self.collection.find_one(*args, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        return self.collection.update_one(*args, **kwargs)
+
+    async def delete_many(self, query):
+        return self.collection.delete_many(query)
+
+    async def distinct(self, key, query):
+        return self.collection.distinct(key, query)
+
+    async def bulk_write(self, operations, ordered=True):
+        upserted_ids = {}
+        for index, operation in enumerate(operations):
+            if isinstance(operation, UpdateOne):
+                result = self.collection.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+                if result.upserted_id is not None:
+                    upserted_ids[index] = result.upserted_id
+            elif isinstance(operation, DeleteMany):
+                self.collection.delete_many(operation._filter)
+        return SimpleNamespace(upserted_ids=upserted_ids)
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets")
+
+
+class FakeDatabase:
+    def __init__(self):
+        database = mongomock.MongoClient().db
+        self.properties = AsyncCollection(database.properties)
+        self.searchers = AsyncCollection(database.searchers)
+        self.matches = AsyncCollection(database.matches)
+        self.notifications = AsyncCollection(database.notifications)
+
+
+def preferences(cities=("Milan",), max_price=800):
+    return SearchPreferences(
+        price_range=PriceRange(min=400, max=max_price),
+        location=LocationPreference(cities=list(cities)),
+        dates=DatePreference(move_in=datetime(2025, 9, 1), duration=10),
+        requirements=Requirements()
+    )
+
+
+@pytest.fixture
+def database(monkeypatch):
+    fake = FakeDatabase()
+    monkeypatch.setattr(db, "db", fake)
+    now = datetime.utcnow()
+    fake.properties.collection.insert_many([
+        {
+            "_id": f"milan-{i}",
+            "status": "active",
+            "city": "Milan",
+            "price": 450.0 + 40 * i,
+            "available_from": datetime(2025, 9, 1),
+            "minimum_stay": 1,
+            "created_at": now - timedelta(days=i),
+            "updated_at": now - timedelta(days=i),
+        }
+        for i in range(8)
+    ] + [{
+        "_id": "rome-0",
+        "status": "active",
+        "city": "Rome",
+        "price": 500.0,
+        "available_from": datetime(2025, 9, 1),
+        "minimum_stay": 1,
+        "created_at": now,
+        "updated_at": now,
+    }])
+    fake.searchers.collection.insert_one({
+        "telegram_user_id": "1",
+        "status": "active",
+        "search_preferences": preferences().model_dump(),
+    })
+    yield fake
+    matching_engine.clear()
+
+
+def stored(database, searcher_id="1"):
+    return [
+        (match["property_id"], match["rank"])
+        for match in database.matches.collection.find({"searcher_id": searcher_id}).sort("rank", 1)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_recompute_materializes_the_top_k(database):
+    materializer = RecommendationMaterializer(top_k=3)
+    recommendations = await materializer.recompute("1")
+
+    assert [prop["_id"] for prop in recommendations] == ["milan-0", "milan-1", "milan-2"]
+    assert stored(database) == [("milan-0", 0), ("milan-1", 1), ("milan-2", 2)]
+    assert database.searchers.collection.find_one()["matches_computed_at"] is not None
+
+    database.matches.reads = 0
+    served = await materializer.get("1", limit=3)
+    assert database.matches.reads == 1
+    assert [prop["_id"] for prop in served] == ["milan-0", "milan-1", "milan-2"]
+    assert served[0]["score"] >= served[1]["score"] >= served[2]["score"]
+    assert served[0]["city"] == "Milan"
+
+
+@pytest.mark.asyncio
+async def test_recompute_replaces_matches_that_dropped_out(database):
+    materializer = RecommendationMaterializer(top_k=3)
+    await materializer.recompute("1")
+    database.searchers.collection.update_one(
+        {"telegram_user_id": "1"},
+        {"$set": {"search_preferences": preferences(cities=("Rome",)).model_dump()}}
+    )
+    await materializer.recompute("1")
+    assert stored(database) == [("rome-0", 0)]
+
+
+@pytest.mark.asyncio
+async def test_inactive_searchers_lose_their_matches(database):
+    materializer = RecommendationMaterializer(top_k=3)
+    await materializer.recompute("1")
+    database.searchers.collection.update_one({"telegram_user_id": "1"}, {"$set": {"status": "inactive"}})
+    assert await materializer.recompute("1") == []
+    assert stored(database) == []
+
+
+@pytest.mark.asyncio
+async def test_requests_are_coalesced_and_drained(database):
+    materializer = RecommendationMaterializer(top_k=3, workers=2, sweep_interval=3600, poll_interval=3600)
+    materializer.request("1")  # before start: left to the sweep
+    assert len(materializer) == 0
+
+    materializer.start()
+    try:
+        for _ in range(5):
+            materializer.request("1", "preferences")
+        assert len(materializer) == 1
+        for _ in range(100):
+            if materializer.recomputed and not len(materializer):
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await materializer.stop()
+
+    # The startup sweep and the coalesced requests may each run once
+    assert 1 <= materializer.recomputed <= 2
+    assert materializer.stats()["failures"] == 0
+    assert len(stored(database)) == 3
+
+
+@pytest.mark.asyncio
+async def test_property_writes_queue_matching_and_holding_searchers(database):
+    materializer = RecommendationMaterializer(top_k=3)
+    materializer._wakeup = asyncio.Event()  # accept requests without running workers
+    await materializer.recompute("1")
+    matching_engine.upsert("2", preferences(cities=("Rome",)))
+
+    rome = database.properties.collection.find_one({"_id": "rome-0"})
+    await materializer.properties_changed([rome])
+    assert set(materializer._dirty) == {"2"}
+
+    held = database.properties.collection.find_one({"_id": "milan-1"})
+    held["status"] = "inactive"
+    await materializer.properties_changed([held])
+    assert set(materializer._dirty) == {"1", "2"}
+
+
+@pytest.mark.asyncio
+async def test_new_listings_alert_matching_searchers_once(database):
+    materializer = RecommendationMaterializer(top_k=3)
+    matching_engine.upsert("2", preferences(cities=("Rome",)))
+    matching_engine.upsert("3", preferences(cities=("Rome",)))
+    rome = database.properties.collection.find_one({"_id": "rome-0"})
+    await materializer.properties_changed([rome])
+    await materializer.properties_changed([rome])
+
+    old = database.properties.collection.find_one({"_id": "rome-0"})
+    old.update(_id="rome-old", created_at=datetime.utcnow() - timedelta(days=30))
+    await materializer.properties_changed([old])
+
+    alerts = list(database.notifications.collection.find())
+    assert sorted(alert["chat_id"] for alert in alerts) == [2, 3]
+    assert {alert["property_id"] for alert in alerts} == {"rome-0"}
+
+
+@pytest.mark.asyncio
+async def test_sweep_queues_stale_and_never_computed_searchers(database):
+    materializer = RecommendationMaterializer(top_k=3, max_age=60)
+    materializer._wakeup = asyncio.Event()
+    database.searchers.collection.insert_many([
+        {
+            "telegram_user_id": "fresh",
+            "status": "active",
+            "search_preferences": preferences().model_dump(),
+            "matches_computed_at": datetime.utcnow(),
+        },
+        {
+            "telegram_user_id": "stale",
+            "status": "active",
+            "search_preferences": preferences().model_dump(),
+            "matches_computed_at": datetime.utcnow() - timedelta(hours=2),
+        },
+        {"telegram_user_id": "gone", "status": "inactive", "search_preferences": None},
+    ])
+    assert await materializer.sweep() == 2
+    assert set(materializer._dirty) == {"1", "stale"}
+
+
+@pytest.mark.asyncio
+async def test_workers_survive_unexpected_errors(database, monkeypatch):
+    materializer = RecommendationMaterializer(top_k=3, workers=1, sweep_interval=3600, poll_interval=3600)
+    recompute = materializer.recompute
+
+    async def flaky(telegram_id):
+        if telegram_id == "legacy":
+            raise ValueError("search_preferences in an old shape")
+        return await recompute(telegram_id)
+
+    monkeypatch.setattr(materializer, "recompute", flaky)
+    materializer.start()
+    try:
+        materializer.request("legacy", "preferences")
+        for _ in range(100):
+            if materializer.failures:
+                break
+            await asyncio.sleep(0.01)
+        materializer.request("1", "preferences")
+        for _ in range(100):
+            if stored(database):
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await materializer.stop()
+
+    assert materializer.failures == 1
+    assert len(stored(database)) == 3
+
+
+@pytest.mark.asyncio
+async def test_polling_resumes_inside_a_batch_with_one_updated_at(database, monkeypatch):
+    monkeypatch.setattr(recommendations, "POLL_BATCH_SIZE", 2)
+    materializer = RecommendationMaterializer(poll_interval=0.01)
+    seen = []
+
+    async def changed(properties):
+        seen.extend(prop["_id"] for prop in properties)
+
+    monkeypatch.setattr(materializer, "properties_changed", changed)
+    poller = asyncio.create_task(materializer._poll_properties())
+    await asyncio.sleep(0.02)
+    # One bulk upsert stamps all three alike
+    stamp = datetime.utcnow() + timedelta(seconds=1)
+    database.properties.collection.update_many(
+        {"_id": {"$in": ["milan-1", "milan-2", "milan-3"]}}, {"$set": {"updated_at": stamp}}
+    )
+    for _ in range(100):
+        if len(seen) == 3:
+            break
+        await asyncio.sleep(0.01)
+    poller.cancel()
+    await asyncio.gather(poller, return_exceptions=True)
+    assert seen == ["milan-1", "milan-2", "milan-3"]
+
+
+async def eventually(predicate):
+    for _ in range(100):
+        if predicate():
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+@pytest.mark.asyncio
+async def test_searcher_writes_from_any_process_reach_the_engine(database):
+    materializer = RecommendationMaterializer(poll_interval=0.01)
+    rome = database.properties.collection.find_one({"_id": "rome-0"})
+    watcher = asyncio.create_task(materializer.watch_searchers())
+    try:
+        assert await eventually(lambda: "1" in matching_engine)
+        # Written by the bot, whose SearcherService syncs only its own engine
+        database.searchers.collection.insert_one({
+            "telegram_user_id": "2",
+            "status": "active",
+            "search_preferences": preferences(cities=("Rome",)).model_dump(),
+            "updated_at": datetime.utcnow() + timedelta(seconds=1),
+        })
+        assert await eventually(lambda: matching_engine.match(rome) == ["2"])
+
+        database.searchers.collection.update_one(
+            {"telegram_user_id": "2"},
+            {"$set": {"status": "inactive", "updated_at": datetime.utcnow() + timedelta(seconds=2)}}
+        )
+        assert await eventually(lambda: "2" not in matching_engine)
+    finally:
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
@@ -0,0 +1,68 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.core.config.indexes import INDEXES
+from app.core.config.universities import UNIVERSITIES
+from app.main import app
+from app.models.entities.searcher import Requirements
+from app.services.search import SearchService
+
+client = TestClient(app)
+
+
+def test_point_search_is_a_geo_near_over_the_filters():
+    query = SearchService.build_near_query(max_price=700, requirements=Requirements(furnished=True))
+    [stage] = SearchService.build_near_pipeline(query, 1.5, latitude=45.47, longitude=9.22)
+    assert stage["$geoNear"] == {
+        "near": {"type": "Point", "coordinates": [9.22, 45.47]},
+        "key": "location",
+        "distanceField": "distance",
+        "maxDistance": 1500,
+        "query": {"status": "active", "price": {"$lte": 700}, "furnished": True},
+        "spherical": True
+    }
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"latitude": 45.47},
+    {"university": "nowhere"},
+    {"university": "polimi", "latitude": 45.47, "longitude": 9.22},
+])
+def test_near_pipeline_rejects_bad_centres(kwargs):
+    with pytest.raises(ValueError):
+        SearchService.build_near_pipeline({"status": "active"}, 2, **kwargs)
+
+
+def test_university_search_sorts_on_precomputed_distances():
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient().db.properties
+    collection.insert_many([
+        {"_id": 1, "status": "active", "price": 600, "campus_distances": {"polimi": 1800}},
+        {"_id": 2, "status": "active", "price": 500, "campus_distances": {"polimi": 400, "unimi": 2500}},
+        {"_id": 3, "status": "active", "price": 900, "campus_distances": {"polimi": 300}},
+        {"_id": 4, "status": "active", "price": 450, "campus_distances": {"polimi": 2600}},
+        {"_id": 5, "status": "inactive", "price": 450, "campus_distances": {"polimi": 100}},
+        {"_id": 6, "status": "active", "price": 450, "campus_distances": {"sapienza": 100}},
+    ])
+    query = SearchService.build_near_query(max_price=800)
+    pipeline = SearchService.build_near_pipeline(query, 2, university="polimi")
+
+    results = list(collection.aggregate(pipeline))
+    assert [(doc["_id"], doc["distance"]) for doc in results] == [(2, 400), (1, 1800)]
+
+
+def test_every_university_has_a_campus_index():
+    names = {index.document["name"] for index in INDEXES["properties"]}
+    assert {f"active_campus_{university_id}" for university_id in UNIVERSITIES} <= names
+
+
+def test_near_endpoint_reports_bad_requests():
+    response = client.get("/api/v1/search/near", params={"university": "nowhere"})
+    assert response.status_code == 400
+    assert client.get("/api/v1/search/near", params={"radius_km": 500}).status_code == 422
+
+
+def test_universities_endpoint_lists_the_table():
+    universities = client.get("/api/v1/search/universities").json()["universities"]
+    assert {entry["id"] for entry in universities} == set(UNIVERSITIES)
+    assert all(len(entry["coordinates"]) == 2 for entry in universities)
@@ -0,0 +1,117 @@
+import pytest
+from app.core.config.mongodb import db
+from app.models.entities.searcher import Searcher, SearcherStatus, SearcherType
+from app.services.auth.telegram import TelegramAuth
+from app.services.searcher import SearcherService
+from app.services.searcher_cache import MISSING, searcher_cache
+
+
+class FakeSearchers:
+    def __init__(self, documents):
+        self.documents = {doc["telegram_user_id"]: doc for doc in documents}
+        self.calls = []
+
+    async def find_one(self, query):
+        self.calls.append(("find_one", query))
+        return self.documents.get(query["telegram_user_id"])
+
+    async def update_one(self, query, update):
+        self.calls.append(("update_one", query))
+        document = self.documents.get(query["telegram_user_id"])
+        if document is not None:
+            document.update(update["$set"])
+
+        class Result:
+            modified_count = int(document is not None)
+        return Result()
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        self.calls.append(("find_one_and_update", query))
+        document = self.documents.get(query["telegram_user_id"])
+        if document is None:
+            if not upsert:
+                return None
+            document = {**query, **update.get("$setOnInsert", {})}
+            self.documents[query["telegram_user_id"]] = document
+        document.update(update["$set"])
+        return dict(document)
+
+
+class FakeDatabase:
+    def __init__(self, searchers):
+        self.searchers = searchers
+
+
+@pytest.fixture
+def searchers(monkeypatch):
+    searcher_cache.clear()
+    collection = FakeSearchers([
+        Searcher(telegram_user_id="1", searcher_type=SearcherType.STUDENT).model_dump()
+    ])
+    monkeypatch.setattr(db, "db", FakeDatabase(collection))
+    yield collection
+    searcher_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_verify_is_served_from_cache(searchers):
+    assert await TelegramAuth.verify_telegram_user("1")
+    assert await TelegramAuth.verify_telegram_user("1")
+    assert len(searchers.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_unknown_users_are_negatively_cached(searchers):
+    assert not await TelegramAuth.verify_telegram_user("404")
+    assert not await TelegramAuth.verify_telegram_user("404")
+    assert len(searchers.calls) == 1
+    assert searcher_cache.get("404") is MISSING
+
+
+@pytest.mark.asyncio
+async def test_status_change_invalidates_cache(searchers):
+    assert await TelegramAuth.verify_telegram_user("1")
+    await SearcherService.update_status("1", SearcherStatus.INACTIVE)
+    assert not await TelegramAuth.verify_telegram_user("1")
+
+
+@pytest.mark.asyncio
+async def test_get_or_create_skips_round_trips_for_recent_searchers(searchers):
+    await TelegramAuth.get_or_create_searcher("1")
+    calls = len(searchers.calls)
+    await TelegramAuth.get_or_create_searcher("1")
+    await TelegramAuth.get_or_create_searcher("1")
+    assert len(searchers.calls) == calls
+
+
+@pytest.mark.asyncio
+async def test_updates_are_one_round_trip(searchers):
+    searcher = await SearcherService.update_status("1", SearcherStatus.ACTIVE)
+    # Unchanged fields still return the searcher
+    assert searcher.status == SearcherStatus.ACTIVE
+    searcher = await TelegramAuth.update_searcher_type("1", SearcherType.WORKER)
+    assert searcher.searcher_type == SearcherType.WORKER
+    assert [name for name, _ in searchers.calls] == ["find_one_and_update"] * 2
+    # The cache holds the updated searcher
+    assert await TelegramAuth.verify_telegram_user("1")
+    assert len(searchers.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_updating_unknown_searchers_returns_none(searchers):
+    assert await SearcherService.update_status("404", SearcherStatus.INACTIVE) is None
+    assert searcher_cache.get("404") is MISSING
+
+
+@pytest.mark.asyncio
+async def test_get_or_create_is_one_upsert(searchers):
+    created = await TelegramAuth.get_or_create_searcher("2", SearcherType.WORKER)
+    assert created.telegram_user_id == "2"
+    assert created.searcher_type == SearcherType.WORKER
+    assert searchers.calls == [("find_one_and_update", {"telegram_user_id": "2"})]
+
+    searcher_cache.clear()
+    existing = await TelegramAuth.get_or_create_searcher("1", SearcherType.WORKER)
+    # An existing searcher keeps its type
+    assert existing.searcher_type == SearcherType.STUDENT
+    assert len(searchers.calls) == 2
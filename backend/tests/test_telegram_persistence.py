@@ -0,0 +1,162 @@
+import asyncio
+import pytest
+from pymongo import DeleteOne, ReplaceOne
+from pymongo.errors import AutoReconnect
+from telegram.ext import ConversationHandler
+from app.core.config.mongodb import db
+from app.telegram.handlers.searcher_handlers import get_searcher_conversation_handler
+from app.telegram.persistence import CONVERSATIONS, USER_DATA, MongoPersistence
+
+mongomock = pytest.importorskip("mongomock")
+
+
+class AsyncCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.cursor:
+            yield document
+
+
+class AsyncCollection:
+    """The Motor calls the persistence makes, served by mongomock."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.reads = 0
+        self.bulk_writes = 0
+        self.fail_next = False
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self.collection.find(*args, **kwargs))
+
+    async def find_one(self, *args, **kwargs):
+        self.reads += 1
+        await asyncio.sleep(0)
+        return self.collection.find_one(*args, **kwargs)
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.fail_next:
+            self.fail_next = False
+            raise AutoReconnect("connection reset")
+        self.bulk_writes += 1
+        for operation in operations:
+            if isinstance(operation, ReplaceOne):
+                self.collection.replace_one(operation._filter, operation._doc, upsert=operation._upsert)
+            elif isinstance(operation, DeleteOne):
+                self.collection.delete_one(operation._filter)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.database = mongomock.MongoClient().db
+        self.collections = {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = AsyncCollection(self.database[name])
+        return self.collections[name]
+
+
+@pytest.fixture
+def database(monkeypatch):
+    fake = FakeDatabase()
+    monkeypatch.setattr(db, "db", fake)
+    return fake
+
+
+async def persistence_run(persistence, *coroutines):
+    """What Application.update_persistence does: one gather of every change."""
+    await asyncio.gather(*coroutines)
+    # Let the write it schedules run
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_a_persistence_run_is_one_bulk_write_per_collection(database):
+    persistence = MongoPersistence()
+    await persistence_run(
+        persistence,
+        *(persistence.update_user_data(user_id, {"price_min": 400.0}) for user_id in range(50)),
+        persistence.update_conversation("searcher_setup", (1, 1), 2)
+    )
+    assert database[USER_DATA].bulk_writes == 1
+    assert database[CONVERSATIONS].bulk_writes == 1
+    assert database[USER_DATA].collection.count_documents({}) == 50
+
+
+@pytest.mark.asyncio
+async def test_user_data_is_loaded_once_per_user(database):
+    database[USER_DATA].collection.insert_one({"_id": 7, "data": {"selected_cities": ["Milan"]}})
+    persistence = MongoPersistence()
+    assert await persistence.get_user_data() == {}
+
+    first, second = {}, {}
+    # Two updates of the same user arriving together share one read
+    await asyncio.gather(
+        persistence.refresh_user_data(7, first),
+        persistence.refresh_user_data(7, second)
+    )
+    assert first == second == {"selected_cities": ["Milan"]}
+    await persistence.refresh_user_data(7, {})
+    assert database[USER_DATA].reads == 1
+
+
+@pytest.mark.asyncio
+async def test_dropped_data_is_not_read_back(database):
+    database[USER_DATA].collection.insert_one({"_id": 7, "data": {"price_min": 400.0}})
+    persistence = MongoPersistence()
+    await persistence_run(persistence, persistence.drop_user_data(7))
+    restored = {}
+    await persistence.refresh_user_data(7, restored)
+    assert restored == {}
+    assert database[USER_DATA].collection.count_documents({}) == 0
+
+
+@pytest.mark.asyncio
+async def test_only_unfinished_conversations_are_kept(database):
+    persistence = MongoPersistence()
+    await persistence_run(
+        persistence,
+        persistence.update_conversation("searcher_setup", (1, 1), 3),
+        persistence.update_conversation("searcher_setup", (2, 2), 5),
+        persistence.update_conversation("other", (1, 1), 0)
+    )
+    # ConversationHandler.END is handed over as None
+    await persistence_run(persistence, persistence.update_conversation("searcher_setup", (2, 2), None))
+    assert await MongoPersistence().get_conversations("searcher_setup") == {(1, 1): 3}
+
+
+@pytest.mark.asyncio
+async def test_failed_writes_are_retried_without_overwriting_newer_data(database):
+    persistence = MongoPersistence()
+    database[USER_DATA].fail_next = True
+    await persistence_run(
+        persistence,
+        persistence.update_user_data(1, {"step": "old"}),
+        persistence.update_user_data(2, {"step": "kept"})
+    )
+    assert database[USER_DATA].collection.count_documents({}) == 0
+
+    await persistence_run(persistence, persistence.update_user_data(1, {"step": "new"}))
+    stored = {doc["_id"]: doc["data"] for doc in database[USER_DATA].collection.find()}
+    assert stored == {1: {"step": "new"}, 2: {"step": "kept"}}
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_what_is_staged(database):
+    persistence = MongoPersistence()
+    await persistence.update_bot_data({"alerts_sent": 3})
+    await persistence.flush()
+    assert await MongoPersistence().get_bot_data() == {"alerts_sent": 3}
+
+
+def test_searcher_setup_conversation_is_persistent():
+    handler = get_searcher_conversation_handler()
+    assert isinstance(handler, ConversationHandler)
+    assert handler.persistent and handler.name == "searcher_setup"
@@ -0,0 +1,202 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from telegram import Bot
+from app.core.config.mongodb import db
+from app.core.config.settings import settings
+from app.main import app
+from app.telegram.webhook import RELAYED_UPDATES, TelegramWebhook, telegram_webhook
+
+client = TestClient(app)
+WEBHOOK = "/api/v1/telegram/webhook"
+
+
+def message(update_id, chat_id, text="hi"):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "A"},
+            "text": text
+        }
+    }
+
+
+class FakeApplication:
+    """Stands in for the bot Application; records what it processes."""
+
+    def __init__(self, delay=0.0):
+        self.bot = Bot("123:abc")
+        self.delay = delay
+        self.release = asyncio.Event()
+        self.release.set()
+        self.processed = []
+        self.stopped = False
+
+    async def initialize(self):
+        pass
+
+    async def start(self):
+        pass
+
+    async def process_update(self, update):
+        await self.release.wait()
+        await asyncio.sleep(self.delay)
+        self.processed.append((update.effective_chat.id, update.update_id))
+
+    async def stop(self):
+        self.stopped = True
+
+    async def shutdown(self):
+        pass
+
+
+@pytest.fixture
+def webhook_settings(monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setattr(settings, "NOTIFICATIONS_ENABLED", False)
+
+
+@pytest.mark.asyncio
+async def test_updates_of_a_chat_stay_in_order(webhook_settings):
+    webhook = TelegramWebhook(workers=4, queue_size=100)
+    application = FakeApplication(delay=0.01)
+    await webhook.start(application, register=False)
+    for update_id in range(12):
+        assert webhook.submit(message(update_id, chat_id=update_id % 3))
+    await webhook.stop()
+
+    assert application.stopped
+    assert len(application.processed) == 12
+    for chat_id in range(3):
+        ids = [update_id for chat, update_id in application.processed if chat == chat_id]
+        assert ids == sorted(ids)
+    # Chats are handled side by side, not one after another
+    assert [chat for chat, _ in application.processed[:3]] != [0, 0, 0]
+
+
+@pytest.mark.asyncio
+async def test_a_full_queue_refuses_updates(webhook_settings):
+    webhook = TelegramWebhook(workers=1, queue_size=2)
+    application = FakeApplication()
+    application.release.clear()
+    await webhook.start(application, register=False)
+    # One is taken by the worker, two wait, the next is refused
+    results = []
+    for update_id in range(4):
+        results.append(webhook.submit(message(update_id, chat_id=1)))
+        await asyncio.sleep(0)
+    assert results == [True, True, True, False]
+    assert webhook.stats()["rejected"] == 1
+    application.release.set()
+    await webhook.stop()
+    assert len(application.processed) == 3
+
+
+@pytest.mark.asyncio
+async def test_malformed_updates_are_rejected(webhook_settings):
+    webhook = TelegramWebhook(workers=1)
+    await webhook.start(FakeApplication(), register=False)
+    with pytest.raises(ValueError):
+        webhook.submit({"message": {"text": "no update id"}})
+    with pytest.raises(ValueError):
+        webhook.submit([1, 2])
+    await webhook.stop()
+
+
+@pytest.mark.asyncio
+async def test_webhook_mode_needs_a_secret(monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_WEBHOOK_SECRET", None)
+    with pytest.raises(ValueError):
+        await TelegramWebhook().start(FakeApplication(), register=False)
+
+
+def test_endpoint_checks_the_secret_token(webhook_settings, monkeypatch):
+    assert client.post(WEBHOOK, json=message(1, 1)).status_code == 404
+
+    received = []
+    monkeypatch.setattr(telegram_webhook, "_accepting", True)
+    monkeypatch.setattr(telegram_webhook, "submit", lambda data: received.append(data) or True)
+    assert client.post(WEBHOOK, json=message(1, 1)).status_code == 403
+    wrong = {"X-Telegram-Bot-Api-Secret-Token": "guess"}
+    assert client.post(WEBHOOK, json=message(1, 1), headers=wrong).status_code == 403
+
+    valid = {"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+    assert client.post(WEBHOOK, json=message(1, 1), headers=valid).status_code == 200
+    assert received == [message(1, 1)]
+
+    monkeypatch.setattr(telegram_webhook, "submit", lambda data: False)
+    response = client.post(WEBHOOK, json=message(2, 1), headers=valid)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+class FakeRelay:
+    """The Motor calls relaying makes, served by mongomock."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def insert_one(self, document):
+        return self.collection.insert_one(document)
+
+    def find(self, *args, **kwargs):
+        collection = self.collection
+
+        class Cursor:
+            def __init__(self):
+                self.cursor = collection.find(*args, **kwargs)
+
+            def sort(self, *args):
+                self.cursor = self.cursor.sort(*args)
+                return self
+
+            def limit(self, count):
+                self.cursor = self.cursor.limit(count)
+                return self
+
+            async def to_list(self, length=None):
+                return list(self.cursor)
+
+        return Cursor()
+
+    async def delete_many(self, query):
+        return self.collection.delete_many(query)
+
+
+@pytest.fixture
+def relayed(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient().db[RELAYED_UPDATES]
+    monkeypatch.setattr(db, "db", {RELAYED_UPDATES: FakeRelay(collection)})
+    return collection
+
+
+def test_processes_without_the_bot_relay_updates(webhook_settings, relayed, monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_WEBHOOK_ENABLED", True)
+    valid = {"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+    assert client.post(WEBHOOK, json=message(1, 1), headers=valid).status_code == 200
+    # Redelivered by Telegram
+    assert client.post(WEBHOOK, json=message(1, 1), headers=valid).status_code == 200
+    assert client.post(WEBHOOK, json={"message": {}}, headers=valid).status_code == 400
+    assert [document["update"] for document in relayed.find()] == [message(1, 1)]
+
+
+@pytest.mark.asyncio
+async def test_the_bot_takes_relayed_updates(webhook_settings, relayed):
+    relayed.insert_many([
+        {"_id": update_id, "update": message(update_id, chat_id=1), "created_at": None}
+        for update_id in (3, 1, 2)
+    ])
+    webhook = TelegramWebhook(workers=1, queue_size=10, relay_interval=0.01)
+    application = FakeApplication()
+    await webhook.start(application, register=False)
+    for _ in range(100):
+        if len(application.processed) == 3:
+            break
+        await asyncio.sleep(0.01)
+    await webhook.stop()
+    assert application.processed == [(1, 1), (1, 2), (1, 3)]
+    assert relayed.count_documents({}) == 0
@@ -0,0 +1,112 @@
+import json
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from app.api.routing import ParsedBodyRoute
+from app.middleware.validation import ValidationMiddleware
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    router = APIRouter(route_class=ParsedBodyRoute)
+
+    @router.post("/echo")
+    async def echo(body: dict):
+        return body
+
+    @router.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    app.include_router(router)
+    app.add_middleware(ValidationMiddleware, max_body_size=1000, max_depth=3, max_array_items=200)
+    return TestClient(app)
+
+
+def test_valid_body_reaches_endpoint(client):
+    response = client.post("/echo", json={"a": {"b": [1, 2]}})
+    assert response.status_code == 200
+    assert response.json() == {"a": {"b": [1, 2]}}
+
+
+def test_body_is_decoded_once(client, monkeypatch):
+    calls = []
+    real_loads = json.loads
+
+    def counting_loads(*args, **kwargs):
+        calls.append(args)
+        return real_loads(*args, **kwargs)
+
+    monkeypatch.setattr("app.middleware.validation.json.loads", counting_loads)
+    response = client.post("/echo", json={"a": 1})
+    assert response.status_code == 200
+    # The middleware decodes it; the route reuses the decoded value.
+    assert len(calls) == 1
+
+
+def test_rejects_declared_oversize_body(client):
+    response = client.post(
+        "/echo",
+        content=b"{}",
+        headers={"content-type": "application/json", "content-length": "5000"}
+    )
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Request body too large"}
+
+
+def test_rejects_streamed_oversize_body(client):
+    def chunks():
+        yield b'{"a": "'
+        for _ in range(20):
+            yield b"x" * 100
+        yield b'"}'
+
+    response = client.post("/echo", content=chunks(), headers={"content-type": "application/json"})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Request body too large"}
+
+
+@pytest.mark.parametrize("body, detail", [
+    ('{"a": ', "Invalid JSON format in request body"),
+    ('{"a": {"b": {"c": {"d": 1}}}}', "Request body nested too deeply"),
+    (json.dumps({"k" * 101: 1}), "Field name too long: " + "k" * 101),
+    (json.dumps({"items": [0] * 201}), "Too many items in array: items"),
+])
+def test_rejects_malformed_bodies(client, body, detail):
+    response = client.post("/echo", content=body, headers={"content-type": "application/json"})
+    assert response.status_code == 400
+    assert response.json() == {"detail": detail}
+
+
+def test_get_requests_pass_through(client):
+    assert client.get("/ping").json() == {"ok": True}
+
+
+def test_route_parses_body_without_middleware():
+    app = FastAPI()
+    router = APIRouter(route_class=ParsedBodyRoute)
+
+    @router.post("/echo")
+    async def echo(body: dict):
+        return body
+
+    app.include_router(router)
+    assert TestClient(app).post("/echo", json={"a": 1}).json() == {"a": 1}
+
+
+def test_app_routes_reuse_the_decoded_body(monkeypatch):
+    from app.main import app
+
+    calls = []
+    real_loads = json.loads
+
+    def counting_loads(*args, **kwargs):
+        calls.append(args)
+        return real_loads(*args, **kwargs)
+
+    monkeypatch.setattr("app.middleware.validation.json.loads", counting_loads)
+    # Refused without credentials, but only after the body was read
+    response = TestClient(app).put("/api/v1/searchers/me/preferences", json={"price_range": {}})
+    assert response.status_code in (401, 403, 422)
+    assert len(calls) == 1
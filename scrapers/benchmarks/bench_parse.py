@@ -0,0 +1,117 @@
+"""Listing extraction throughput on recorded Idealista pages.
+
+Replays the HTML fixtures in scrapers/tests/fixtures through
+``IdealistaSpider.parse`` and reports listings/sec, peak traced bytes
+per listing and traced allocations (memory blocks) per listing, for the
+single-pass extractor used by the spider and for the per-field CSS
+reference. From the repository root:
+
+    python -m scrapers.benchmarks.bench_parse --rounds 50 --min-rate 2000
+
+``--min-rate`` makes the run exit non-zero when the spider's path falls
+below that many listings/sec, so a CI job can catch regressions.
+"""
+import argparse
+import logging
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import List, Tuple
+import scrapy
+from scrapy.http import HtmlResponse
+from scrapers.websites.idealista_scraper import IdealistaSpider
+
+FIXTURES = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "idealista"
+
+
+def load_pages() -> List[Tuple[str, bytes]]:
+    return [
+        (f"https://www.idealista.it/{path.relative_to(FIXTURES).as_posix()}", path.read_bytes())
+        for path in sorted(FIXTURES.rglob("*.html"))
+    ]
+
+
+def make_response(url: str, body: bytes) -> HtmlResponse:
+    return HtmlResponse(url=url, body=body, encoding="utf-8", request=scrapy.Request(url))
+
+
+def replay(spider: IdealistaSpider, pages: List[Tuple[str, bytes]]) -> int:
+    """Parse every page from raw bytes, as the spider would; return listings."""
+    listings = 0
+    for url, body in pages:
+        response = make_response(url, body)
+        listings += sum(1 for output in spider.parse(response, city="bench") if isinstance(output, dict))
+    return listings
+
+
+def allocations(spider: IdealistaSpider, pages) -> float:
+    """Traced memory blocks allocated per listing while parsing a page.
+
+    Counts the blocks the page's parse leaves allocated against a snapshot
+    taken just before it; temporaries freed meanwhile show up in the peak
+    bytes instead.
+    """
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    per_page = []
+    tracemalloc.start()
+    for url, body in pages:
+        response = make_response(url, body)
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        outputs = list(spider.parse(response, city="bench"))
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+        blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+        listings = sum(1 for output in outputs if isinstance(output, dict))
+        per_page.append(blocks / max(listings, 1))
+        del outputs
+    tracemalloc.stop()
+    return sum(per_page) / len(per_page)
+
+
+def measure(spider: IdealistaSpider, pages, rounds: int) -> Tuple[float, float, float]:
+    replay(spider, pages)  # warm-up
+    started = time.perf_counter()
+    listings = 0
+    for _ in range(rounds):
+        listings += replay(spider, pages)
+    rate = listings / (time.perf_counter() - started)
+
+    per_page_peaks = []
+    tracemalloc.start()
+    for page in pages:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        count = replay(spider, [page])
+        per_page_peaks.append((tracemalloc.get_traced_memory()[1] - baseline) / max(count, 1))
+    tracemalloc.stop()
+    return rate, sum(per_page_peaks) / len(per_page_peaks), allocations(spider, pages)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--min-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    # One broken card in the fixtures is expected to fail
+    logging.disable(logging.ERROR)
+
+    pages = load_pages()
+    single_pass = IdealistaSpider()
+    per_field = IdealistaSpider()
+    per_field.parse_listing = per_field.parse_listing_css
+
+    print(f"{len(pages)} pages, {replay(single_pass, pages)} listings per round")
+    print(f"{'extractor':<14} {'listings/s':>12} {'peak B/listing':>15} {'blocks/listing':>15}")
+    results = {}
+    for label, spider in (("single-pass", single_pass), ("per-field css", per_field)):
+        rate, peak, blocks = measure(spider, pages, args.rounds)
+        results[label] = rate
+        print(f"{label:<14} {rate:>12.0f} {peak:>15.0f} {blocks:>15.1f}")
+
+    if results["single-pass"] < args.min_rate:
+        print(f"single-pass below --min-rate {args.min_rate:.0f} listings/s", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
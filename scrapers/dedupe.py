@@ -0,0 +1,230 @@
+import hashlib
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Set, Tuple
+import numpy as np
+from bson import Binary
+from pymongo import UpdateMany, UpdateOne
+
+# 64 MinHash values split into 16 bands of 4: listings with a Jaccard
+# similarity of 0.7 share at least one band ~99% of the time, pairs at 0.3
+# only ~12% of the time.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Universal hashing (a * x + b) mod p over 32-bit shingle hashes. a stays
+# below 2**31 so the products fit in uint64.
+_PRIME = np.uint64(4294967311)
+_rng = np.random.default_rng(20250101)
+_A = _rng.integers(1, 2**31, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 2**32, NUM_PERM, dtype=np.uint64)
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# What a canonical listing shows of each near-duplicate collapsed under it.
+ALTERNATE_FIELDS = ("source", "source_url", "title", "price", "updated_at")
+
+
+def alternate(listing: Mapping[str, Any]) -> Dict[str, Any]:
+    return {field: listing.get(field) for field in ALTERNATE_FIELDS}
+
+
+def _words(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode()
+    return _WORD.findall(text.lower())
+
+
+def shingles(listing: Mapping[str, Any]) -> Set[str]:
+    """Word 3-grams of title and description plus city, area and price band."""
+    result: Set[str] = set()
+    for field in ("title", "description"):
+        words = _words(listing.get(field))
+        if len(words) < 3:
+            result.update(f"{field}:{word}" for word in words)
+        else:
+            result.update(" ".join(words[i:i + 3]) for i in range(len(words) - 2))
+    result.add(f"city:{' '.join(_words(listing.get('city')))}")
+    result.add(f"area:{' '.join(_words(listing.get('area')))}")
+    price = listing.get("price")
+    if isinstance(price, (int, float)):
+        result.add(f"price:{int(price // 50)}")
+    return result
+
+
+def minhash(features: Iterable[str]) -> np.ndarray:
+    values = np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=4).digest(), "little")
+            for feature in features
+        ),
+        dtype=np.uint64
+    )
+    if not values.size:
+        return np.full(NUM_PERM, _PRIME, dtype=np.uint64)
+    return ((_A[:, None] * values[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def band_hashes(signature: np.ndarray) -> List[int]:
+    """One signed 64-bit key per band, distinct across band positions."""
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS].astype("<u8").tobytes()
+        digest = hashlib.blake2b(bytes([band]) + rows, digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))
+    return keys
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the listings behind two signatures."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+@dataclass
+class _Entry:
+    source_url: str
+    signature: np.ndarray
+    canonical_id: str
+    city: Any
+    price: Any
+
+
+class NearDuplicateIndex:
+    """Clusters near-duplicate listings through LSH over MinHash signatures.
+
+    Signatures live in their own collection, one document per listing with
+    its band keys in a multikey-indexed array, so finding the candidates of
+    a whole batch is one indexed ``$in`` query. A listing joins the cluster
+    of its most similar candidate in the same city with a price within
+    ``price_tolerance``; the cluster's ``canonical_id`` is the
+    ``source_url`` of its first listing.
+
+    ``assign`` only stages the signatures; ``save`` writes those of the
+    listings that were stored, so a failed write leaves no signature behind
+    to mark later scrapes as duplicates.
+    """
+
+    def __init__(self, collection, threshold: float = 0.7, price_tolerance: float = 0.05):
+        self.collection = collection
+        self.threshold = threshold
+        self.price_tolerance = price_tolerance
+        # source_url -> signature upsert of the last assigned batch
+        self._staged: Dict[str, UpdateOne] = {}
+
+    def _compatible(self, a: _Entry, b: _Entry) -> bool:
+        if a.city != b.city:
+            return False
+        if not isinstance(a.price, (int, float)) or not isinstance(b.price, (int, float)):
+            return False
+        return abs(a.price - b.price) <= self.price_tolerance * max(a.price, b.price)
+
+    def assign(self, listings: List[Mapping[str, Any]]) -> Dict[str, str]:
+        """Return ``source_url`` -> ``canonical_id`` and stage the signatures."""
+        self._staged = {}
+        if not listings:
+            return {}
+        entries: List[Tuple[_Entry, List[int]]] = []
+        for listing in listings:
+            signature = minhash(shingles(listing))
+            entry = _Entry(
+                listing["source_url"], signature, listing["source_url"],
+                listing.get("city"), listing.get("price")
+            )
+            entries.append((entry, band_hashes(signature)))
+
+        by_band: Dict[int, List[_Entry]] = {}
+        all_bands = [band for _, bands in entries for band in bands]
+        for doc in self.collection.find(
+            {"bands": {"$in": all_bands}},
+            {"minhash": 1, "bands": 1, "canonical_id": 1, "city": 1, "price": 1}
+        ):
+            known = _Entry(
+                doc["_id"], np.frombuffer(doc["minhash"], dtype="<u8"),
+                doc["canonical_id"], doc.get("city"), doc.get("price")
+            )
+            for band in doc["bands"]:
+                by_band.setdefault(band, []).append(known)
+
+        assigned: Dict[str, str] = {}
+        for entry, bands in entries:
+            best, best_score = None, self.threshold
+            seen = set()
+            for band in bands:
+                for candidate in by_band.get(band, ()):
+                    if candidate.source_url == entry.source_url or candidate.source_url in seen:
+                        continue
+                    seen.add(candidate.source_url)
+                    if not self._compatible(entry, candidate):
+                        continue
+                    score = similarity(entry.signature, candidate.signature)
+                    if score >= best_score:
+                        best, best_score = candidate, score
+            if best is not None:
+                entry.canonical_id = best.canonical_id
+            assigned[entry.source_url] = entry.canonical_id
+            # Later listings in the same batch can match this one
+            for band in bands:
+                by_band.setdefault(band, []).append(entry)
+            self._staged[entry.source_url] = UpdateOne(
+                {"_id": entry.source_url},
+                {"$set": {
+                    "minhash": Binary(entry.signature.astype("<u8").tobytes()),
+                    "bands": bands,
+                    "canonical_id": entry.canonical_id,
+                    "city": entry.city,
+                    "price": entry.price,
+                }},
+                upsert=True
+            )
+        return assigned
+
+    def save(self, source_urls: Iterable[str]) -> None:
+        """Write the staged signatures of listings that have been stored."""
+        staged, self._staged = self._staged, {}
+        operations = [staged[url] for url in source_urls if url in staged]
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+    def retire(self, source_urls: List[str], properties) -> None:
+        """Forget listings that are gone and promote a successor for their clusters."""
+        if not source_urls:
+            return
+        self.collection.delete_many({"_id": {"$in": source_urls}})
+        properties.update_many(
+            {"alternates.source_url": {"$in": source_urls}},
+            {"$pull": {"alternates": {"source_url": {"$in": source_urls}}}}
+        )
+        successors: Dict[str, str] = {}
+        for doc in properties.find(
+            {"canonical_id": {"$in": source_urls}, "status": "duplicate"},
+            {"source_url": 1, "canonical_id": 1}
+        ).sort("created_at", 1):
+            successors.setdefault(doc["canonical_id"], doc["source_url"])
+        if not successors:
+            return
+
+        property_updates, signature_updates = [], []
+        for old, new in successors.items():
+            property_updates.append(UpdateOne({"source_url": old}, {"$unset": {"alternates": ""}}))
+            property_updates.append(UpdateOne({"source_url": new}, {"$set": {"status": "active"}}))
+            property_updates.append(UpdateMany(
+                {"canonical_id": old}, {"$set": {"canonical_id": new}}
+            ))
+            signature_updates.append(UpdateMany(
+                {"canonical_id": old}, {"$set": {"canonical_id": new}}
+            ))
+        properties.bulk_write(property_updates, ordered=True)
+        self.collection.bulk_write(signature_updates, ordered=False)
+
+        # The promoted listings now carry the rest of their clusters
+        alternates: Dict[str, List[Dict[str, Any]]] = {new: [] for new in successors.values()}
+        for doc in properties.find(
+            {"canonical_id": {"$in": list(alternates)}, "status": "duplicate"},
+            dict.fromkeys(ALTERNATE_FIELDS + ("canonical_id",), 1)
+        ).sort("created_at", 1):
+            alternates[doc["canonical_id"]].append(alternate(doc))
+        properties.bulk_write([
+            UpdateOne({"source_url": new}, {"$set": {"alternates": listings}})
+            for new, listings in alternates.items()
+        ], ordered=False)
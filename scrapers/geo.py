@@ -0,0 +1,60 @@
+import json
+import logging
+import math
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# The backend's campus table; near searches sort on the distances stored here.
+UNIVERSITIES_PATH = Path(__file__).resolve().parents[1] / "backend" / "app" / "data" / "universities.json"
+
+# Must match MAX_CAMPUS_DISTANCE_KM in the backend: farther campuses are not stored.
+MAX_CAMPUS_DISTANCE_M = 30_000
+
+EARTH_RADIUS_M = 6_371_008.8
+
+
+def load_universities(path: Path = UNIVERSITIES_PATH) -> List[dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except OSError as e:
+        logger.warning("No campus table, listings get no campus distances: %s", e)
+        return []
+
+
+def haversine_m(a: List[float], b: List[float]) -> float:
+    """Great-circle distance in metres between two [longitude, latitude] points."""
+    lng1, lat1, lng2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(h))
+
+
+def point(latitude: Optional[float], longitude: Optional[float]) -> Optional[dict]:
+    """GeoJSON point for the properties ``location`` index, if both are usable."""
+    if not isinstance(latitude, (int, float)) or not isinstance(longitude, (int, float)):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return {"type": "Point", "coordinates": [float(longitude), float(latitude)]}
+
+
+def campus_distances(
+    coordinates: List[float],
+    universities: List[dict],
+    max_distance_m: float = MAX_CAMPUS_DISTANCE_M
+) -> Dict[str, int]:
+    """Whole metres from ``coordinates`` to every campus within range, by id."""
+    distances = {}
+    for university in universities:
+        distance = haversine_m(coordinates, university["coordinates"])
+        if distance <= max_distance_m:
+            distances[university["id"]] = round(distance)
+    return distances
+
+
+UNIVERSITIES = load_universities()
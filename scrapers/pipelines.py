@@ -0,0 +1,316 @@
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from scrapy.exceptions import DropItem
+from twisted.internet import task
+from scrapers.dedupe import NearDuplicateIndex, alternate
+from scrapers.geo import UNIVERSITIES, campus_distances, point
+from scrapers.seen_index import SeenIndex
+
+logger = logging.getLogger(__name__)
+
+# Scraped sites use Italian city names; searchers pick the English ones
+# offered by the bot, and SearchService matches them exactly.
+CITY_NAMES = {
+    "milano": "Milan",
+    "roma": "Rome",
+    "torino": "Turin",
+    "firenze": "Florence",
+    "napoli": "Naples",
+    "genova": "Genoa",
+    "venezia": "Venice",
+    "padova": "Padua",
+}
+
+# Months; sites rarely state a minimum stay, and searchers filter on it.
+DEFAULT_MINIMUM_STAY = 1
+
+
+def normalize_city(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    name = " ".join(name.split())
+    return CITY_NAMES.get(name.lower(), name.title())
+
+
+def listing_fields(
+    item: Dict[str, Any],
+    now: datetime,
+    universities: List[dict] = UNIVERSITIES
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Split a scraped listing into fields to set and defaults for inserts.
+
+    Scraped fields overwrite what is stored; fields the site does not
+    provide get defaults only when the listing is first inserted, so they
+    never clobber values set elsewhere. Listings with coordinates get a
+    GeoJSON ``location`` and their distance to each nearby campus.
+    """
+    if not item:
+        raise DropItem("Listing failed to parse")
+    source_url = item.get("source_url")
+    price = item.get("price")
+    location = item.get("location") or {}
+    city = normalize_city(item.get("city") or location.get("city"))
+    if not source_url:
+        raise DropItem("Listing has no source_url")
+    if not isinstance(price, (int, float)) or price <= 0:
+        raise DropItem(f"Listing has no usable price: {source_url}")
+    if city is None:
+        raise DropItem(f"Listing has no city: {source_url}")
+
+    fields = {
+        "source": item.get("source"),
+        "source_url": source_url,
+        "title": item.get("title"),
+        "description": item.get("description"),
+        "images": item.get("images") or [],
+        "price": float(price),
+        "city": city,
+        "area": item.get("area") or location.get("neighborhood"),
+        "status": "active",
+        "updated_at": now,
+    }
+    location_point = point(
+        item.get("latitude", location.get("latitude")),
+        item.get("longitude", location.get("longitude"))
+    )
+    if location_point is not None:
+        fields["location"] = location_point
+        fields["campus_distances"] = campus_distances(location_point["coordinates"], universities)
+    for optional in ("available_from", "minimum_stay", "furnished", "internet", "utilities_included"):
+        if item.get(optional) is not None:
+            fields[optional] = item[optional]
+
+    defaults = {
+        "created_at": now,
+        "available_from": now,
+        "minimum_stay": DEFAULT_MINIMUM_STAY,
+    }
+    on_insert = {key: value for key, value in defaults.items() if key not in fields}
+    return fields, on_insert
+
+
+def listing_upsert(fields: Dict[str, Any], on_insert: Dict[str, Any]) -> UpdateOne:
+    return UpdateOne(
+        {"source_url": fields["source_url"]},
+        {"$set": fields, "$setOnInsert": on_insert},
+        upsert=True
+    )
+
+
+def normalize_listing(item: Dict[str, Any], now: datetime) -> UpdateOne:
+    """Turn a scraped listing into an upsert on ``source_url``."""
+    return listing_upsert(*listing_fields(item, now))
+
+
+class MongoBulkPipeline:
+    """Buffer scraped listings and write them to ``properties`` in batches.
+
+    A batch is flushed as one unordered ``bulk_write`` once it holds
+    ``INGEST_BATCH_SIZE`` listings, every ``INGEST_FLUSH_SECONDS`` while
+    the crawl runs, and when the spider closes. With ``INGEST_DEDUPE`` on,
+    each batch first goes through ``NearDuplicateIndex``: near-duplicates
+    of a listing already stored are saved with ``status: "duplicate"`` and
+    the cluster's ``canonical_id``, and collapsed under the canonical
+    listing's ``alternates``, so searches show the cluster once with every
+    source it was found on.
+
+    Listings are committed to the spider's seen index (or ``seen``) only
+    once their write succeeded; until then the next crawl treats them as
+    new.
+    """
+
+    def __init__(
+        self,
+        mongo_url: str,
+        db_name: str,
+        batch_size: int = 500,
+        flush_interval: float = 5.0,
+        collection_name: str = "properties",
+        dedupe: bool = True,
+        seen: Optional[SeenIndex] = None
+    ):
+        self.mongo_url = mongo_url
+        self.db_name = db_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.collection_name = collection_name
+        self.dedupe = dedupe
+        self.seen = seen
+        # A seen index handed in is ours to close; the spider closes its own
+        self._owns_seen = seen is not None
+        self.client: Optional[MongoClient] = None
+        self.collection = None
+        self.duplicates: Optional[NearDuplicateIndex] = None
+        self.stats = None
+        # source_url -> pending (fields, insert defaults); a listing seen
+        # twice is written once
+        self._buffer: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+        # Rejected listings; nothing to store, so the seen index can keep them
+        self._rejected: List[str] = []
+        self._last_flush = time.monotonic()
+        self._flush_loop: Optional[task.LoopingCall] = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        pipeline = cls(
+            mongo_url=settings.get("MONGODB_URL") or os.environ["MONGODB_URL"],
+            db_name=settings.get("MONGODB_DB_NAME") or os.environ["MONGODB_DB_NAME"],
+            batch_size=settings.getint("INGEST_BATCH_SIZE", 500),
+            flush_interval=settings.getfloat("INGEST_FLUSH_SECONDS", 5.0),
+            dedupe=settings.getbool("INGEST_DEDUPE", True)
+        )
+        pipeline.stats = crawler.stats
+        return pipeline
+
+    def connect(self) -> None:
+        self.client = MongoClient(self.mongo_url)
+        database = self.client[self.db_name]
+        self.collection = database[self.collection_name]
+        if self.dedupe:
+            self.duplicates = NearDuplicateIndex(database["property_signatures"])
+
+    def close(self) -> None:
+        """Write what is still buffered and disconnect."""
+        self.flush()
+        if self.client:
+            self.client.close()
+        if self._owns_seen:
+            self.seen.close()
+
+    def open_spider(self, spider):
+        if self.seen is None:
+            self.seen = getattr(spider, "seen", None)
+        self.connect()
+        self._flush_loop = task.LoopingCall(self.flush_if_due)
+        self._flush_loop.start(self.flush_interval, now=False)
+
+    def close_spider(self, spider):
+        if self._flush_loop and self._flush_loop.running:
+            self._flush_loop.stop()
+        self.flush()
+        stale_listings = getattr(spider, "stale_listings", None)
+        if stale_listings is not None:
+            self.deactivate(stale_listings())
+        self.close()
+
+    def process_item(self, item, spider):
+        try:
+            fields = listing_fields(item, datetime.now(timezone.utc))
+        except DropItem:
+            if self.seen is not None and item and item.get("source_url"):
+                self._rejected.append(item["source_url"])
+            raise
+        self._buffer[item["source_url"]] = fields
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+        return item
+
+    def flush_if_due(self) -> None:
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered listings in one round trip."""
+        self._last_flush = time.monotonic()
+        rejected, self._rejected = self._rejected, []
+        if not self._buffer:
+            self._commit_seen(rejected)
+            return
+        pending, self._buffer = list(self._buffer.values()), {}
+        self._assign_clusters([fields for fields, _ in pending])
+        batch = [listing_upsert(fields, on_insert) for fields, on_insert in pending]
+        failed = set()
+        try:
+            result = self.collection.bulk_write(batch, ordered=False)
+            upserted, modified = result.upserted_count, result.modified_count
+        except BulkWriteError as e:
+            # Unordered: everything but the failed operations was applied
+            details = e.details
+            upserted, modified = details.get("nUpserted", 0), details.get("nModified", 0)
+            failed = {error["index"] for error in details.get("writeErrors", [])}
+            logger.error(
+                "%d of %d listings failed to save: %s",
+                len(details.get("writeErrors", [])), len(batch), details.get("writeErrors", [])[:3]
+            )
+        except PyMongoError as e:
+            logger.error("Saving %d listings failed: %s", len(batch), e)
+            self._inc_stat("ingest/failed", len(batch))
+            self._commit_seen(rejected)
+            return
+
+        stored = [fields for index, (fields, _) in enumerate(pending) if index not in failed]
+        self._collapse(stored)
+        self._commit_seen(rejected + [fields["source_url"] for fields in stored])
+        logger.info("Saved %d listings (%d new, %d updated)", len(batch), upserted, modified)
+        self._inc_stat("ingest/batches")
+        self._inc_stat("ingest/upserted", upserted)
+        self._inc_stat("ingest/modified", modified)
+
+    def _commit_seen(self, source_urls: List[str]) -> None:
+        if self.seen is not None and source_urls:
+            self.seen.commit(source_urls)
+
+    def _assign_clusters(self, listings: List[Dict[str, Any]]) -> None:
+        if self.duplicates is None:
+            return
+        try:
+            canonical_ids = self.duplicates.assign(listings)
+        except PyMongoError as e:
+            # Saving the listings matters more than collapsing them
+            logger.error("Near-duplicate lookup failed, saving batch as is: %s", e)
+            return
+        for fields in listings:
+            canonical_id = canonical_ids[fields["source_url"]]
+            fields["canonical_id"] = canonical_id
+            if canonical_id != fields["source_url"]:
+                fields["status"] = "duplicate"
+                self._inc_stat("ingest/duplicates")
+
+    def _collapse(self, listings: List[Dict[str, Any]]) -> None:
+        """Save the signatures of stored listings and list duplicates under their canonical one."""
+        if self.duplicates is None:
+            return
+        operations = []
+        for fields in listings:
+            canonical_id = fields.get("canonical_id")
+            if canonical_id is None or canonical_id == fields["source_url"]:
+                continue
+            # Ordered: replace this listing's previous entry, if any
+            canonical = {"source_url": canonical_id}
+            operations.append(UpdateOne(
+                canonical, {"$pull": {"alternates": {"source_url": fields["source_url"]}}}
+            ))
+            operations.append(UpdateOne(canonical, {"$push": {"alternates": alternate(fields)}}))
+        try:
+            self.duplicates.save(fields["source_url"] for fields in listings)
+            if operations:
+                self.collection.bulk_write(operations, ordered=True)
+        except PyMongoError as e:
+            logger.error("Saving near-duplicate clusters of %d listings failed: %s", len(listings), e)
+
+    def deactivate(self, source_urls: List[str]) -> None:
+        """Mark listings that are gone from their site as inactive."""
+        if not source_urls:
+            return
+        try:
+            result = self.collection.update_many(
+                {"source_url": {"$in": source_urls}, "status": {"$in": ["active", "duplicate"]}},
+                {"$set": {"status": "inactive", "updated_at": datetime.now(timezone.utc)}}
+            )
+            if self.duplicates is not None:
+                self.duplicates.retire(source_urls, self.collection)
+        except PyMongoError as e:
+            logger.error("Deactivating %d listings failed: %s", len(source_urls), e)
+            return
+        logger.info("Deactivated %d listings no longer listed", result.modified_count)
+        self._inc_stat("ingest/deactivated", result.modified_count)
+
+    def _inc_stat(self, key: str, count: int = 1) -> None:
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
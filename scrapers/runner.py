@@ -0,0 +1,311 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+from dataclasses import dataclass
+from queue import Empty
+from typing import Any, Dict, List, Optional
+from scrapy.crawler import CrawlerProcess
+from scrapy.exceptions import DropItem
+from twisted.internet import task
+from scrapers.pipelines import MongoBulkPipeline
+from scrapers.seen_index import SeenIndex
+from scrapers.websites.idealista_scraper import (
+    BASE_URL,
+    CRAWL_SETTINGS,
+    FULL_CRAWL_SECONDS,
+    IdealistaSpider
+)
+
+logger = logging.getLogger(__name__)
+
+# Every shard crawls the same site; keep the default small whatever the host.
+DEFAULT_SHARDS = 2
+# Politeness budget of one shard, the same as a single-process crawl.
+DOMAIN_CONCURRENCY = CRAWL_SETTINGS['CONCURRENT_REQUESTS']
+TARGET_CONCURRENCY = 1.0
+# Requests in flight to the site across all shards; None for no cap.
+SITE_CONCURRENCY = 8
+
+
+def shard_settings(shards: int, site_concurrency: Optional[int] = SITE_CONCURRENCY) -> Dict[str, Any]:
+    """AutoThrottle settings for one of ``shards`` shards crawling one site.
+
+    Each shard gets the politeness budget of a single-process crawl and
+    adapts its delay to the latency it observes, so shards add crawl speed.
+    When the shards together would exceed ``site_concurrency`` requests in
+    flight, each gets its share of it, and once that share is down to one
+    request its delay grows instead.
+    """
+    concurrency = DOMAIN_CONCURRENCY
+    delay = CRAWL_SETTINGS['DOWNLOAD_DELAY']
+    if site_concurrency is not None and shards * concurrency > site_concurrency:
+        concurrency = max(1, site_concurrency // shards)
+        delay *= max(1.0, shards * concurrency / site_concurrency)
+    return {
+        'AUTOTHROTTLE_ENABLED': True,
+        'AUTOTHROTTLE_START_DELAY': delay,
+        'AUTOTHROTTLE_MAX_DELAY': max(30.0, delay),
+        'AUTOTHROTTLE_TARGET_CONCURRENCY': min(TARGET_CONCURRENCY, concurrency),
+        'DOWNLOAD_DELAY': delay,
+        'CONCURRENT_REQUESTS': concurrency,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': concurrency,
+    }
+
+# Results queue of the shard running in this process; a multiprocessing
+# queue cannot go through Scrapy settings, which are deep-copied.
+_shard_queue = None
+
+
+class DedupeStore:
+    """Listing URLs already claimed by some shard, shared through SQLite."""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS claimed (source_url TEXT PRIMARY KEY)")
+
+    def claim(self, source_url: str) -> bool:
+        """True for the first shard to claim ``source_url``."""
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO claimed (source_url) VALUES (?)", (source_url,)
+            )
+        return cursor.rowcount == 1
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+@dataclass
+class ShardReport:
+    shard: int
+    cities: List[str]
+    pages: int = 0
+    listings: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+    elapsed: float = 0.0
+    finished: bool = False
+
+    @property
+    def listings_per_second(self) -> float:
+        return self.listings / self.elapsed if self.elapsed else 0.0
+
+
+class ShardPipeline:
+    """Runs inside a shard: dedupes listings and forwards them to the parent."""
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.stats = crawler.stats
+        self.shard = settings.getint('SHARD_ID')
+        self.dedupe = DedupeStore(settings.get('SHARD_DEDUPE_PATH'))
+        self.report_interval = settings.getfloat('SHARD_REPORT_SECONDS', 30.0)
+        self.listings = 0
+        self.duplicates = 0
+        self._started = time.monotonic()
+        self._report_loop: Optional[task.LoopingCall] = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def open_spider(self, spider):
+        self._started = time.monotonic()
+        self._report_loop = task.LoopingCall(self.report)
+        self._report_loop.start(self.report_interval, now=False)
+
+    def close_spider(self, spider):
+        if self._report_loop and self._report_loop.running:
+            self._report_loop.stop()
+        _shard_queue.put(('stale', self.shard, spider.stale_listings()))
+        self.report()
+        self.dedupe.close()
+
+    def process_item(self, item, spider):
+        if not self.dedupe.claim(item['source_url']):
+            self.duplicates += 1
+            raise DropItem(f"Listing already scraped by another shard: {item['source_url']}")
+        _shard_queue.put(('item', self.shard, dict(item)))
+        self.listings += 1
+        return item
+
+    def report(self):
+        _shard_queue.put(('progress', self.shard, {
+            'pages': self.stats.get_value('response_received_count', 0),
+            'listings': self.listings,
+            'duplicates': self.duplicates,
+            'elapsed': time.monotonic() - self._started,
+        }))
+
+
+def _run_shard(
+    shard: int,
+    cities: List[str],
+    queue,
+    dedupe_path: str,
+    spider_options: Dict[str, Any],
+    settings: Dict[str, Any]
+) -> None:
+    global _shard_queue
+    _shard_queue = queue
+    process = CrawlerProcess(settings={
+        **CRAWL_SETTINGS,
+        **settings,
+        'ITEM_PIPELINES': {'scrapers.runner.ShardPipeline': 300},
+        'SHARD_ID': shard,
+        'SHARD_DEDUPE_PATH': dedupe_path,
+    })
+    process.crawl(IdealistaSpider, cities=cities, **spider_options)
+    process.start()
+    queue.put(('done', shard, None))
+
+
+def default_sink(seen_index_path: Optional[str] = None) -> MongoBulkPipeline:
+    # Shards record what they scraped; the sink commits what it stored
+    seen = SeenIndex(seen_index_path, start_run=False) if seen_index_path else None
+    sink = MongoBulkPipeline(os.environ['MONGODB_URL'], os.environ['MONGODB_DB_NAME'], seen=seen)
+    sink.connect()
+    return sink
+
+
+def run_sharded(
+    cities: List[str],
+    shards: int = DEFAULT_SHARDS,
+    sink: Any = None,
+    base_url: str = BASE_URL,
+    incremental: bool = True,
+    seen_index_path: Optional[str] = None,
+    full_crawl_seconds: Optional[float] = FULL_CRAWL_SECONDS,
+    site_concurrency: Optional[int] = SITE_CONCURRENCY,
+    settings: Optional[Dict[str, Any]] = None,
+    report_seconds: float = 30.0
+) -> List[ShardReport]:
+    """Crawl ``cities`` split across ``shards`` processes into one sink.
+
+    Shards only scrape; every listing flows back over a queue into
+    ``sink`` (by default a ``MongoBulkPipeline``), so the database sees a
+    single stream of batched writes however many shards run.
+    """
+    shards = max(1, min(shards, len(cities)))
+    groups = [cities[i::shards] for i in range(shards)]
+    sink = sink or default_sink(seen_index_path)
+    spider_options = {
+        'base_url': base_url,
+        'incremental': incremental,
+        'seen_index_path': seen_index_path,
+        'full_crawl_seconds': full_crawl_seconds,
+    }
+    shard_options = {
+        **shard_settings(shards, site_concurrency),
+        **(settings or {}),
+        'SHARD_REPORT_SECONDS': report_seconds
+    }
+
+    context = multiprocessing.get_context('spawn')
+    # Bounded, so slow writes hold the shards back instead of filling memory
+    queue = context.Queue(maxsize=10_000)
+    reports = [ShardReport(shard, group) for shard, group in enumerate(groups)]
+    stale: List[str] = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dedupe_path = os.path.join(tmp, 'claimed.sqlite3')
+        DedupeStore(dedupe_path).close()
+        processes = [
+            context.Process(
+                target=_run_shard,
+                args=(shard, group, queue, dedupe_path, spider_options, shard_options),
+                name=f'scraper-shard-{shard}'
+            )
+            for shard, group in enumerate(groups)
+        ]
+        for process in processes:
+            process.start()
+
+        pending = set(range(shards))
+        while pending:
+            try:
+                kind, shard, payload = queue.get(timeout=1.0)
+            except Empty:
+                for shard in list(pending):
+                    # A clean exit always queues "done" first; keep draining
+                    exitcode = processes[shard].exitcode
+                    if exitcode not in (None, 0):
+                        logger.error('Shard %d exited with code %d', shard, exitcode)
+                        pending.discard(shard)
+                sink.flush_if_due()
+                continue
+
+            report = reports[shard]
+            if kind == 'item':
+                try:
+                    sink.process_item(payload, None)
+                except DropItem as e:
+                    report.rejected += 1
+                    logger.debug('Dropped listing from shard %d: %s', shard, e)
+            elif kind == 'stale':
+                stale.extend(payload)
+            elif kind == 'progress':
+                for key, value in payload.items():
+                    setattr(report, key, value)
+                logger.info(
+                    'Shard %d (%s): %d pages, %d listings, %d duplicates, %.1f listings/s',
+                    shard, ', '.join(report.cities), report.pages, report.listings,
+                    report.duplicates, report.listings_per_second
+                )
+            elif kind == 'done':
+                report.finished = True
+                pending.discard(shard)
+            sink.flush_if_due()
+
+        for process in processes:
+            process.join()
+
+    sink.deactivate(stale)
+    sink.close()
+    return reports
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Crawl cities in parallel shards.')
+    parser.add_argument('cities', nargs='+')
+    parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS)
+    parser.add_argument(
+        '--site-concurrency', type=int, default=SITE_CONCURRENCY,
+        help='requests in flight to the site across all shards'
+    )
+    parser.add_argument('--base-url', default=BASE_URL)
+    parser.add_argument('--full', action='store_true', help='crawl every page, detecting removed listings')
+    parser.add_argument(
+        '--full-crawl-seconds', type=float,
+        default=float(os.environ.get('SCRAPER_FULL_CRAWL_SECONDS', FULL_CRAWL_SECONDS)),
+        help='crawl a city in full when its last full crawl is older than this'
+    )
+    parser.add_argument('--seen-index', default=os.environ.get('SCRAPER_SEEN_INDEX', 'idealista_seen.sqlite3'))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    reports = run_sharded(
+        args.cities,
+        shards=args.shards,
+        site_concurrency=args.site_concurrency,
+        base_url=args.base_url,
+        incremental=not args.full,
+        seen_index_path=args.seen_index,
+        full_crawl_seconds=args.full_crawl_seconds
+    )
+    for report in reports:
+        print(
+            f"shard {report.shard} [{', '.join(report.cities)}]: {report.pages} pages, "
+            f"{report.listings} listings ({report.listings_per_second:.1f}/s), "
+            f"{report.duplicates} duplicates, {report.rejected} rejected"
+            f"{'' if report.finished else ', FAILED'}"
+        )
+
+
+if __name__ == '__main__':
+    main()
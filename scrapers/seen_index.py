@@ -0,0 +1,184 @@
+import hashlib
+import json
+import sqlite3
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+NEW = "new"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+
+# Fields whose change means a listing has to be written again.
+HASHED_FIELDS = ("title", "price", "location", "description", "images")
+
+
+def listing_hash(item: Mapping[str, Any]) -> str:
+    content = {field: item.get(field) for field in HASHED_FIELDS}
+    encoded = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+
+class SeenIndex:
+    """Persistent record of listings seen by earlier crawls.
+
+    Stores ``source_url`` -> content hash, the crawl city and the last run
+    that saw the listing. Runs are numbered; a listing that a run over its
+    whole city did not see accumulates a miss. The time each city was last
+    crawled to its end is kept, so runs can tell which cities are due for
+    another full crawl.
+
+    Hashes of new or changed listings stay pending until ``commit`` is
+    called once they are stored, so a listing lost by a failed write or a
+    crash is scraped again by the next run. ``start_run=False`` opens the
+    index only to commit, as the process writing the listings does.
+    """
+
+    def __init__(self, path: str, start_run: bool = True):
+        # Shards of a sharded crawl share the file; WAL lets them interleave
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS seen (
+                source_url TEXT PRIMARY KEY,
+                city TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                last_run INTEGER NOT NULL,
+                missed_runs INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS seen_city_run ON seen (city, last_run);
+            CREATE TABLE IF NOT EXISTS pending (
+                source_url TEXT PRIMARY KEY,
+                city TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                run INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS cities (
+                city TEXT PRIMARY KEY,
+                completed_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        self.run_id = None
+        if start_run:
+            with self.conn:
+                self.run_id = self.conn.execute("INSERT INTO runs DEFAULT VALUES").lastrowid
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def record_page(self, city: str, listings: Iterable[Tuple[str, str]]) -> Dict[str, str]:
+        """Mark a page of ``(source_url, content_hash)`` as seen by this run.
+
+        Returns each URL's status: ``new``, ``changed`` or ``unchanged``.
+        Hashes of new and changed listings are pending until ``commit``.
+        """
+        listings = list(listings)
+        if not listings:
+            return {}
+        placeholders = ",".join("?" * len(listings))
+        known = dict(self.conn.execute(
+            f"SELECT source_url, content_hash FROM seen WHERE source_url IN ({placeholders})",
+            [url for url, _ in listings]
+        ))
+        statuses = {}
+        for url, content_hash in listings:
+            if url not in known:
+                statuses[url] = NEW
+            elif known[url] != content_hash:
+                statuses[url] = CHANGED
+            else:
+                statuses[url] = UNCHANGED
+        with self.conn:
+            # A stored listing was seen, whatever its content now
+            self.conn.executemany(
+                "UPDATE seen SET city = ?, last_run = ?, missed_runs = 0 WHERE source_url = ?",
+                [(city, self.run_id, url) for url in known]
+            )
+            self.conn.executemany(
+                """
+                INSERT INTO pending (source_url, city, content_hash, run) VALUES (?, ?, ?, ?)
+                ON CONFLICT (source_url) DO UPDATE SET
+                    city = excluded.city,
+                    content_hash = excluded.content_hash,
+                    run = excluded.run
+                """,
+                [
+                    (url, city, content_hash, self.run_id)
+                    for url, content_hash in listings if statuses[url] != UNCHANGED
+                ]
+            )
+        return statuses
+
+    def commit(self, source_urls: Iterable[str]) -> None:
+        """Record the pending hashes of listings that have been stored."""
+        urls = [(url,) for url in source_urls]
+        if not urls:
+            return
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO seen (source_url, city, content_hash, last_run, missed_runs)
+                SELECT source_url, city, content_hash, run, 0 FROM pending WHERE source_url = ?
+                ON CONFLICT (source_url) DO UPDATE SET
+                    city = excluded.city,
+                    content_hash = excluded.content_hash,
+                    last_run = max(seen.last_run, excluded.last_run),
+                    missed_runs = 0
+                """,
+                urls
+            )
+            self.conn.executemany("DELETE FROM pending WHERE source_url = ?", urls)
+
+    def due_for_full_crawl(self, cities: Iterable[str], max_age_seconds: Optional[float]) -> Set[str]:
+        """Cities not crawled to their last page within ``max_age_seconds``.
+
+        Incremental runs stop early and rarely complete a city, so without
+        a full crawl now and then removed listings are never noticed.
+        ``None`` never asks for one.
+        """
+        cities = set(cities)
+        if max_age_seconds is None or not cities:
+            return set()
+        placeholders = ",".join("?" * len(cities))
+        recent = {row[0] for row in self.conn.execute(
+            f"""
+            SELECT city FROM cities
+            WHERE city IN ({placeholders}) AND completed_at > datetime('now', ?)
+            """,
+            [*cities, f"-{max_age_seconds} seconds"]
+        )}
+        return cities - recent
+
+    def finish_run(self, completed_cities: Iterable[str], max_missed_runs: int) -> List[str]:
+        """Count misses in fully crawled cities and return listings to retire.
+
+        Only a crawl that reached a city's last page can tell that a listing
+        is gone. Retired listings are forgotten, so one that reappears is
+        treated as new.
+        """
+        cities = list(completed_cities)
+        if not cities:
+            return []
+        placeholders = ",".join("?" * len(cities))
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO cities (city, completed_at) VALUES (?, CURRENT_TIMESTAMP)
+                ON CONFLICT (city) DO UPDATE SET completed_at = excluded.completed_at
+                """,
+                [(city,) for city in cities]
+            )
+            self.conn.execute(
+                f"""
+                UPDATE seen SET missed_runs = missed_runs + 1
+                WHERE city IN ({placeholders}) AND last_run < ?
+                """,
+                [*cities, self.run_id]
+            )
+            stale = [row[0] for row in self.conn.execute(
+                "SELECT source_url FROM seen WHERE missed_runs >= ?", (max_missed_runs,)
+            )]
+            self.conn.execute("DELETE FROM seen WHERE missed_runs >= ?", (max_missed_runs,))
+        return stale
@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+import mongomock
+import pytest
+from pymongo import UpdateMany
+
+
+class BulkCollection:
+    """mongomock collection that applies bulk writes and counts round trips.
+
+    mongomock's own ``bulk_write`` does not accept the operations built by
+    current pymongo releases.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.bulk_writes = 0
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def bulk_write(self, operations, ordered=True):
+        self.bulk_writes += 1
+        upserted = modified = 0
+        for op in operations:
+            update = self.collection.update_many if isinstance(op, UpdateMany) else self.collection.update_one
+            result = update(op._filter, op._doc, upsert=op._upsert)
+            upserted += result.upserted_id is not None
+            modified += result.modified_count
+        return SimpleNamespace(upserted_count=upserted, modified_count=modified)
+
+
+@pytest.fixture
+def bulk_collection():
+    database = mongomock.MongoClient().db
+    return lambda name: BulkCollection(database[name])
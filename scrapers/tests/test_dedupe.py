@@ -0,0 +1,164 @@
+import pytest
+from pymongo.errors import AutoReconnect
+from scrapers.dedupe import BANDS, NearDuplicateIndex, band_hashes, minhash, shingles, similarity
+from scrapers.pipelines import MongoBulkPipeline
+
+DESCRIPTION = (
+    "Luminoso bilocale completamente arredato al terzo piano con ascensore, "
+    "cucina abitabile, camera matrimoniale, bagno con doccia e balcone sul cortile, "
+    "a cinque minuti a piedi dalla metropolitana e dal Politecnico"
+)
+
+
+def listing(url, **overrides):
+    item = {
+        "source_url": url,
+        "title": "Bilocale arredato in via Pascoli, Città Studi",
+        "description": DESCRIPTION,
+        "price": 900.0,
+        "city": "Milan",
+        "area": "Città Studi",
+    }
+    item.update(overrides)
+    return item
+
+
+def test_minhash_estimates_jaccard():
+    a = {f"feature-{i}" for i in range(100)}
+    b = {f"feature-{i}" for i in range(20, 120)}  # Jaccard 80/120
+    estimate = similarity(minhash(a), minhash(b))
+    assert abs(estimate - 80 / 120) < 0.15
+    assert similarity(minhash(a), minhash(a)) == 1.0
+
+
+def test_identical_listings_share_every_band():
+    first = band_hashes(minhash(shingles(listing("a"))))
+    second = band_hashes(minhash(shingles(listing("b"))))
+    assert len(first) == BANDS and first == second
+
+
+def test_shingles_ignore_case_and_accents():
+    assert shingles(listing("a", title="BILOCALE arredato in via Pascoli, Citta Studi")) == shingles(listing("b"))
+
+
+class StoringIndex(NearDuplicateIndex):
+    """Saves each batch's signatures, as the pipeline does once the batch is stored."""
+
+    def assign(self, listings):
+        assigned = super().assign(listings)
+        self.save(assigned)
+        return assigned
+
+
+@pytest.fixture
+def index(bulk_collection):
+    return StoringIndex(bulk_collection("property_signatures"))
+
+
+def test_repost_joins_the_original_cluster(index):
+    assert index.assign([listing("https://a/1")]) == {"https://a/1": "https://a/1"}
+
+    repost = listing(
+        "https://b/7",
+        description=DESCRIPTION.replace("cinque", "5"),
+        price=920.0
+    )
+    assert index.assign([repost]) == {"https://b/7": "https://a/1"}
+
+
+@pytest.mark.parametrize("overrides", [
+    {"city": "Turin"},
+    {"price": 1200.0},
+    {"title": "Stanza singola in Bovisa", "description": "Camera in appartamento condiviso con tre studenti"},
+])
+def test_different_listings_stay_separate(index, overrides):
+    index.assign([listing("https://a/1")])
+    assert index.assign([listing("https://a/2", **overrides)]) == {"https://a/2": "https://a/2"}
+
+
+def test_duplicates_within_one_batch(index):
+    assigned = index.assign([listing("https://a/1"), listing("https://b/1"), listing("https://c/1")])
+    assert set(assigned.values()) == {"https://a/1"}
+
+
+def test_rescraping_the_canonical_listing_keeps_it_canonical(index):
+    index.assign([listing("https://a/1")])
+    index.assign([listing("https://b/1")])
+    assert index.assign([listing("https://a/1")]) == {"https://a/1": "https://a/1"}
+
+
+def test_pipeline_collapses_and_promotes_on_removal(bulk_collection):
+    pipeline = MongoBulkPipeline("mongodb://unused", "test", batch_size=10)
+    pipeline.collection = bulk_collection("properties")
+    pipeline.duplicates = NearDuplicateIndex(bulk_collection("property_signatures"))
+
+    def scraped(url, price):
+        return {
+            "source_url": url,
+            "source": "idealista",
+            "title": "Bilocale arredato in via Pascoli, Città Studi",
+            "description": DESCRIPTION,
+            "price": price,
+            "location": {"neighborhood": "Città Studi", "city": "Milano"},
+        }
+
+    pipeline.process_item(scraped("https://a/1", 900.0), spider=None)
+    pipeline.flush()
+    pipeline.process_item(scraped("https://b/1", 910.0), spider=None)
+    pipeline.process_item(scraped("https://c/1", 905.0), spider=None)
+    pipeline.flush()
+
+    def alternates(url):
+        doc = pipeline.collection.find_one({"source_url": url})
+        return [(entry["source_url"], entry["price"]) for entry in doc.get("alternates", [])]
+
+    def state():
+        return {
+            doc["source_url"]: (doc["status"], doc["canonical_id"])
+            for doc in pipeline.collection.find()
+        }
+
+    assert state() == {
+        "https://a/1": ("active", "https://a/1"),
+        "https://b/1": ("duplicate", "https://a/1"),
+        "https://c/1": ("duplicate", "https://a/1"),
+    }
+    assert alternates("https://a/1") == [("https://b/1", 910.0), ("https://c/1", 905.0)]
+    # A re-scraped duplicate replaces its entry
+    pipeline.process_item(scraped("https://b/1", 915.0), spider=None)
+    pipeline.flush()
+    assert alternates("https://a/1") == [("https://c/1", 905.0), ("https://b/1", 915.0)]
+
+    pipeline.deactivate(["https://a/1"])
+    assert state() == {
+        "https://a/1": ("inactive", "https://b/1"),
+        "https://b/1": ("active", "https://b/1"),
+        "https://c/1": ("duplicate", "https://b/1"),
+    }
+    assert alternates("https://a/1") == []
+    assert alternates("https://b/1") == [("https://c/1", 905.0)]
+    # A later repost now joins the promoted listing's cluster
+    pipeline.process_item(scraped("https://d/1", 900.0), spider=None)
+    pipeline.flush()
+    assert state()["https://d/1"] == ("duplicate", "https://b/1")
+
+
+def test_failed_flush_leaves_no_signatures(bulk_collection):
+    pipeline = MongoBulkPipeline("mongodb://unused", "test", batch_size=10)
+    signatures = bulk_collection("property_signatures")
+    pipeline.duplicates = NearDuplicateIndex(signatures)
+
+    class Unreachable:
+        def bulk_write(self, operations, ordered=True):
+            raise AutoReconnect("connection reset")
+
+    pipeline.collection = Unreachable()
+    pipeline.process_item({
+        "source_url": "https://a/1",
+        "title": "Bilocale arredato in via Pascoli, Città Studi",
+        "description": DESCRIPTION,
+        "price": 900.0,
+        "location": {"city": "Milano"},
+    }, spider=None)
+    pipeline.flush()
+    assert signatures.count_documents({}) == 0
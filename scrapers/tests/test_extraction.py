@@ -0,0 +1,39 @@
+from pathlib import Path
+import pytest
+from parsel import Selector
+from scrapers.websites.idealista_scraper import IdealistaSpider
+
+FIXTURES = Path(__file__).parent / "fixtures" / "idealista"
+PAGES = sorted(FIXTURES.rglob("*.html"))
+
+
+@pytest.mark.parametrize("path", PAGES, ids=lambda path: path.relative_to(FIXTURES).as_posix())
+def test_single_pass_matches_css_extraction(path):
+    spider = IdealistaSpider()
+    cards = Selector(text=path.read_text(encoding="utf-8")).css(".item-container")
+    assert cards
+    for card in cards:
+        assert spider.parse_listing(card) == spider.parse_listing_css(card)
+
+
+def test_first_text_node_follows_a_leading_child():
+    card = Selector(text="""
+        <div class="item-container">
+          <a class="item-link" href="/immobile/1/"><span class="item-title"><b>Nuovo</b> Bilocale</span></a>
+          <span class="price-value">1.200 €</span>
+          <span class="item-location">Isola, Milano</span>
+          <p class="item-description">Arredato</p>
+        </div>
+    """).css(".item-container")[0]
+    spider = IdealistaSpider()
+    listing = spider.parse_listing(card)
+    assert listing == spider.parse_listing_css(card)
+    assert listing["title"] == "Bilocale"
+    assert listing["price"] == 1200.0
+    assert listing["location"] == {"neighborhood": "Isola", "city": "Milano"}
+
+
+def test_card_without_title_fails_like_before():
+    card = Selector(text='<div class="item-container"><span class="price-value">500 €</span></div>')
+    spider = IdealistaSpider()
+    assert spider.parse_listing(card.css(".item-container")[0]) is None
@@ -0,0 +1,160 @@
+import scrapy
+from scrapy.http import HtmlResponse
+from scrapers.seen_index import CHANGED, NEW, UNCHANGED, SeenIndex
+from scrapers.websites.idealista_scraper import IdealistaSpider
+
+CARD = """
+<article class="item-container">
+  <a class="item-link" href="/immobile/{id}/"><span class="item-title">Stanza {id}</span></a>
+  <span class="price-value">{price}</span>
+  <span class="item-location">Navigli, Milano</span>
+  <p class="item-description">Camera luminosa</p>
+</article>
+"""
+
+
+def page(listings, next_page=None):
+    cards = "".join(CARD.format(id=i, price=price) for i, price in listings)
+    link = f'<a class="next-page-link" href="{next_page}">next</a>' if next_page else ""
+    body = f"<html><body>{cards}{link}</body></html>"
+    url = "https://www.idealista.it/affitto-case/milano/"
+    return HtmlResponse(url=url, body=body.encode(), encoding="utf-8", request=scrapy.Request(url))
+
+
+def crawl(spider, response, stored=True):
+    """Parse a page; with ``stored``, commit its listings as the pipeline would."""
+    output = list(spider.parse(response, city="milano"))
+    items = [o for o in output if isinstance(o, dict)]
+    requests = [o for o in output if isinstance(o, scrapy.Request)]
+    if stored:
+        spider.seen.commit(item["source_url"] for item in items)
+    return items, requests
+
+
+def test_record_page_statuses(tmp_path):
+    path = str(tmp_path / "seen.sqlite3")
+    index = SeenIndex(path)
+    assert index.record_page("milano", [("u1", "h1"), ("u2", "h2")]) == {"u1": NEW, "u2": NEW}
+    index.commit(["u1", "u2"])
+    index.close()
+
+    index = SeenIndex(path)
+    assert index.record_page("milano", [("u1", "h1"), ("u2", "h2-new")]) == {
+        "u1": UNCHANGED,
+        "u2": CHANGED
+    }
+    index.close()
+
+
+def test_listings_stay_new_until_committed(tmp_path):
+    path = str(tmp_path / "seen.sqlite3")
+    index = SeenIndex(path)
+    index.record_page("milano", [("stored", "h1"), ("lost", "h1")])
+    index.commit(["stored"])
+    index.close()
+
+    # A crash or a failed write lost the second listing: scrape it again
+    index = SeenIndex(path)
+    assert index.record_page("milano", [("stored", "h1"), ("lost", "h1")]) == {
+        "stored": UNCHANGED,
+        "lost": NEW
+    }
+    # A changed listing keeps its stored hash until the change is stored
+    assert index.record_page("milano", [("stored", "h2")]) == {"stored": CHANGED}
+    index.close()
+
+    index = SeenIndex(path)
+    assert index.record_page("milano", [("stored", "h2")]) == {"stored": CHANGED}
+    index.close()
+
+
+def test_listings_retire_after_missing_full_runs(tmp_path):
+    path = str(tmp_path / "seen.sqlite3")
+    index = SeenIndex(path)
+    index.record_page("milano", [("kept", "h"), ("gone", "h")])
+    index.record_page("roma", [("rome", "h")])
+    index.commit(["kept", "gone", "rome"])
+    assert index.finish_run(["milano", "roma"], max_missed_runs=2) == []
+    index.close()
+
+    for run, expected in ((1, []), (2, ["gone"])):
+        index = SeenIndex(path)
+        index.record_page("milano", [("kept", "h")])
+        # Roma was not crawled to its last page, so its listings are not missed
+        assert index.finish_run(["milano"], max_missed_runs=2) == expected
+        index.close()
+
+    index = SeenIndex(path)
+    assert index.record_page("milano", [("gone", "h"), ("rome", "h")]) == {
+        "gone": NEW,
+        "rome": UNCHANGED
+    }
+
+
+def test_incremental_crawl_stops_at_a_known_page(tmp_path):
+    path = str(tmp_path / "seen.sqlite3")
+    first = IdealistaSpider(cities=["Milano"], seen_index_path=path)
+    items, requests = crawl(first, page([(1, "700"), (2, "650")]))
+    assert len(items) == 2 and requests == []
+    first.stale_listings()
+    first.closed("finished")
+
+    second = IdealistaSpider(cities=["Milano"], seen_index_path=path)
+    items, requests = crawl(second, page([(1, "700"), (2, "650")], next_page="/p2"))
+    assert items == [] and requests == []
+    assert second.completed_cities == set()
+
+    # A price change is yielded again and keeps the crawl going
+    items, requests = crawl(second, page([(1, "700"), (2, "600")], next_page="/p2"))
+    assert [item["price"] for item in items] == [600.0]
+    assert len(requests) == 1
+    second.closed("finished")
+
+
+def test_full_crawl_visits_every_page(tmp_path):
+    path = str(tmp_path / "seen.sqlite3")
+    for expected_items in (1, 0):
+        spider = IdealistaSpider(cities=["Milano"], seen_index_path=path, incremental=False)
+        items, requests = crawl(spider, page([(1, "700")], next_page="/p2"))
+        assert len(items) == expected_items and len(requests) == 1
+        spider.closed("finished")
+
+
+def test_cities_are_crawled_in_full_when_their_last_full_crawl_is_old(tmp_path):
+    path = str(tmp_path / "seen.sqlite3")
+    # Never crawled to the end: the first incremental run goes all the way
+    spider = IdealistaSpider(cities=["Milano"], seen_index_path=path)
+    assert spider.full_cities == {"milano"}
+    crawl(spider, page([(1, "700")], next_page="/p2"))
+    _, requests = crawl(spider, page([(1, "700")], next_page="/p3"))
+    assert len(requests) == 1
+    crawl(spider, page([(2, "650")]))
+    spider.stale_listings()
+    spider.closed("finished")
+
+    spider = IdealistaSpider(cities=["Milano"], seen_index_path=path)
+    assert spider.full_cities == set()
+    _, requests = crawl(spider, page([(1, "700")], next_page="/p2"))
+    assert requests == []
+    spider.closed("finished")
+
+    spider = IdealistaSpider(cities=["Milano"], seen_index_path=path, full_crawl_seconds=0)
+    assert spider.full_cities == {"milano"}
+    spider.closed("finished")
+
+    spider = IdealistaSpider(cities=["Milano"], seen_index_path=path, full_crawl_seconds=None)
+    assert spider.full_cities == set()
+    spider.closed("finished")
+
+
+def test_missing_listings_are_reported_after_full_crawls(tmp_path):
+    path = str(tmp_path / "seen.sqlite3")
+    spider = IdealistaSpider(cities=["Milano"], seen_index_path=path, max_missed_runs=1)
+    crawl(spider, page([(1, "700"), (2, "650")]))
+    assert spider.stale_listings() == []
+    spider.closed("finished")
+
+    spider = IdealistaSpider(cities=["Milano"], seen_index_path=path, max_missed_runs=1)
+    crawl(spider, page([(1, "700")]))
+    assert spider.stale_listings() == ["https://www.idealista.it/immobile/2/"]
+    spider.closed("finished")
@@ -0,0 +1,155 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import pytest
+from pymongo.errors import AutoReconnect
+from scrapy.exceptions import DropItem
+from scrapers.pipelines import MongoBulkPipeline, normalize_listing
+from scrapers.seen_index import NEW, UNCHANGED, SeenIndex, listing_hash
+
+NOW = datetime(2025, 1, 15, tzinfo=timezone.utc)
+
+
+def listing(url="https://www.idealista.it/immobile/1/", **overrides):
+    item = {
+        "title": "Bilocale Navigli",
+        "price": 850.0,
+        "location": {"neighborhood": "Navigli", "city": "Milano"},
+        "description": "Luminoso",
+        "images": ["https://img/1.jpg"],
+        "source_url": url,
+        "source": "idealista",
+    }
+    item.update(overrides)
+    return item
+
+
+@pytest.fixture
+def pipeline(bulk_collection):
+    pipeline = MongoBulkPipeline("mongodb://unused", "test", batch_size=3)
+    pipeline.collection = bulk_collection("properties")
+    return pipeline
+
+
+def test_normalize_maps_to_search_schema():
+    update = normalize_listing(listing(), NOW)._doc
+    assert update["$set"]["city"] == "Milan"
+    assert update["$set"]["area"] == "Navigli"
+    assert update["$set"]["status"] == "active"
+    assert update["$setOnInsert"] == {
+        "created_at": NOW,
+        "available_from": NOW,
+        "minimum_stay": 1
+    }
+
+
+def test_scraped_fields_are_not_also_defaulted():
+    update = normalize_listing(listing(minimum_stay=6), NOW)._doc
+    assert update["$set"]["minimum_stay"] == 6
+    assert "minimum_stay" not in update["$setOnInsert"]
+
+
+def test_coordinates_get_a_point_and_nearby_campus_distances():
+    # Piazza Leonardo da Vinci, in front of the Politecnico
+    fields = normalize_listing(listing(latitude=45.4785, longitude=9.2275), NOW)._doc["$set"]
+    assert fields["location"] == {"type": "Point", "coordinates": [9.2275, 45.4785]}
+    distances = fields["campus_distances"]
+    assert distances["polimi"] < 100
+    assert 2500 < distances["bocconi"] < 4500
+    assert "sapienza" not in distances
+
+
+def test_listings_without_coordinates_have_no_location():
+    fields = normalize_listing(listing(latitude=None), NOW)._doc["$set"]
+    assert "location" not in fields and "campus_distances" not in fields
+
+
+@pytest.mark.parametrize("item", [
+    None,
+    listing(source_url=None),
+    listing(price=None),
+    listing(location={"neighborhood": "Centro", "city": None}),
+])
+def test_unusable_listings_are_dropped(pipeline, item):
+    with pytest.raises(DropItem):
+        pipeline.process_item(item, spider=None)
+    assert pipeline._buffer == {}
+
+
+def test_flushes_in_batches(pipeline):
+    pipeline.process_item(listing("https://a/1"), spider=None)
+    pipeline.process_item(listing("https://a/2"), spider=None)
+    assert pipeline.collection.count_documents({}) == 0
+
+    pipeline.process_item(listing("https://a/3"), spider=None)
+    assert pipeline.collection.count_documents({}) == 3
+    assert pipeline.collection.bulk_writes == 1
+    assert pipeline._buffer == {}
+
+
+def test_rescraped_listing_updates_in_place(pipeline):
+    pipeline.process_item(listing(price=800.0), spider=None)
+    pipeline.flush()
+    created_at = pipeline.collection.find_one()["created_at"]
+
+    pipeline.process_item(listing(price=750.0), spider=None)
+    pipeline.flush()
+
+    docs = list(pipeline.collection.find())
+    assert len(docs) == 1
+    assert docs[0]["price"] == 750.0
+    assert docs[0]["created_at"] == created_at
+
+
+def test_duplicates_within_a_batch_are_written_once(pipeline):
+    pipeline.process_item(listing(price=800.0), spider=None)
+    pipeline.process_item(listing(price=790.0), spider=None)
+    assert len(pipeline._buffer) == 1
+    pipeline.flush()
+    assert pipeline.collection.find_one()["price"] == 790.0
+
+
+def test_close_deactivates_stale_listings(pipeline):
+    pipeline.process_item(listing("https://a/1"), spider=None)
+    pipeline.process_item(listing("https://a/2"), spider=None)
+    spider = SimpleNamespace(stale_listings=lambda: ["https://a/2"])
+
+    pipeline.close_spider(spider)
+
+    statuses = {doc["source_url"]: doc["status"] for doc in pipeline.collection.find()}
+    assert statuses == {"https://a/1": "active", "https://a/2": "inactive"}
+
+
+class FailingCollection:
+    def bulk_write(self, operations, ordered=True):
+        raise AutoReconnect("connection reset")
+
+
+def test_seen_index_is_committed_only_after_a_successful_flush(pipeline, tmp_path):
+    path = str(tmp_path / "seen.sqlite3")
+    pipeline.seen = SeenIndex(path)
+    stored = pipeline.collection
+    items = [listing("https://a/1"), listing("https://a/2")]
+    pipeline.seen.record_page("milano", [(item["source_url"], listing_hash(item)) for item in items])
+
+    pipeline.collection = FailingCollection()
+    for item in items:
+        pipeline.process_item(item, spider=None)
+    pipeline.flush()
+    with pytest.raises(DropItem):
+        pipeline.process_item(listing("https://a/3", price=None), spider=None)
+    pipeline.seen.record_page("milano", [("https://a/3", "h")])
+
+    pipeline.collection = stored
+    pipeline.flush()
+    pipeline.seen.close()
+
+    index = SeenIndex(path)
+    # The failed batch is scraped again; the rejected listing is settled
+    assert index.record_page("milano", [
+        (item["source_url"], listing_hash(item)) for item in items
+    ] + [("https://a/3", "h")]) == {
+        "https://a/1": NEW,
+        "https://a/2": NEW,
+        "https://a/3": UNCHANGED
+    }
+    index.close()
@@ -1,33 +1,151 @@
 import scrapy
 from scrapy.crawler import CrawlerProcess
-from typing import Dict, List
+from typing import Any, Dict, List, Optional
 import logging
-from urllib.parse import urljoin
+import os
+from urllib.parse import urljoin, urlparse
+from lxml import etree
+from scrapers.seen_index import UNCHANGED, SeenIndex, listing_hash
+
+BASE_URL = 'https://www.idealista.it'
+
+CRAWL_SETTINGS = {
+    'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'ROBOTSTXT_OBEY': True,
+    'DOWNLOAD_DELAY': 1.5,  # Respect website's crawling policy
+    'CONCURRENT_REQUESTS': 2,
+}
+
+# Cities not crawled to their last page for this long get a full crawl.
+FULL_CRAWL_SECONDS = 24 * 3600
+
+# Card elements read as text by parse_listing
+CARD_TEXT_CLASSES = ('item-title', 'price-value', 'item-location', 'item-description')
 
 class IdealistaSpider(scrapy.Spider):
     name = 'idealista_spider'
     allowed_domains = ['idealista.it']
     
-    def __init__(self, cities: List[str] = None, *args, **kwargs):
+    def __init__(
+        self,
+        cities: List[str] = None,
+        seen_index_path: Optional[str] = None,
+        incremental: bool = True,
+        max_missed_runs: int = 3,
+        full_crawl_seconds: Optional[float] = FULL_CRAWL_SECONDS,
+        base_url: str = BASE_URL,
+        *args,
+        **kwargs
+    ):
         super(IdealistaSpider, self).__init__(*args, **kwargs)
         self.cities = cities or ['Milano', 'Roma', 'Torino']
-        self.start_urls = [
-            f'https://www.idealista.it/affitto-case/{city.lower()}/' for city in self.cities
-        ]
+        self.base_url = base_url.rstrip('/')
+        self.allowed_domains = [urlparse(self.base_url).hostname]
+        # Without a seen index every run is a full crawl that yields everything
+        self.seen = SeenIndex(seen_index_path) if seen_index_path else None
+        self.incremental = incremental and self.seen is not None
+        self.max_missed_runs = int(max_missed_runs)
+        self.completed_cities = set()
+        # Crawled in full even in an incremental run, to notice removed listings
+        self.full_cities = self.seen.due_for_full_crawl(
+            [city.lower() for city in self.cities],
+            None if full_crawl_seconds is None else float(full_crawl_seconds)
+        ) if self.incremental else set()
+        if self.full_cities:
+            logging.info(f"Crawling {', '.join(sorted(self.full_cities))} in full")
+
+    def incremental_for(self, city: str) -> bool:
+        return self.incremental and city not in self.full_cities
+
+    async def start(self):
+        # Scrapy >= 2.13 entry point; start_requests serves older versions
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        for city in self.cities:
+            url = f'{self.base_url}/affitto-case/{city.lower()}/'
+            if self.incremental_for(city.lower()):
+                # Newest first, so known listings mean there is nothing further on
+                url += '?ordine=pubblicazione-desc'
+            yield scrapy.Request(url, self.parse, cb_kwargs={'city': city.lower()})
 
-    def parse(self, response):
+    def parse(self, response, city: str):
         # Extract listing cards
-        listings = response.css('.item-container')
-        
-        for listing in listings:
-            yield self.parse_listing(listing)
-        
-        # Follow pagination
+        items = [
+            item for item in map(self.parse_listing, response.css('.item-container'))
+            if item is not None
+        ]
+
+        if self.seen is None:
+            changed = items
+        else:
+            statuses = self.seen.record_page(
+                city, [(item['source_url'], listing_hash(item)) for item in items]
+            )
+            changed = [item for item in items if statuses[item['source_url']] != UNCHANGED]
+        yield from changed
+
+        # Follow pagination until a page brings nothing new
         next_page = response.css('.next-page-link::attr(href)').get()
-        if next_page:
-            yield response.follow(next_page, self.parse)
+        if not next_page:
+            self.completed_cities.add(city)
+        elif not self.incremental_for(city) or changed or not items:
+            yield response.follow(next_page, self.parse, cb_kwargs={'city': city})
+
+    def stale_listings(self) -> List[str]:
+        """Source URLs missing from the last ``max_missed_runs`` full crawls of their city."""
+        if self.seen is None:
+            return []
+        return self.seen.finish_run(self.completed_cities, self.max_missed_runs)
+
+    def closed(self, reason):
+        if self.seen is not None:
+            self.seen.close()
 
     def parse_listing(self, listing):
+        """Extract a listing from its card in one walk over the card's elements."""
+        try:
+            fields = self.extract_card(listing)
+            return {
+                'title': fields['item-title'].strip(),
+                'price': self.parse_price(fields['price-value']),
+                'location': self.parse_location(fields['item-location']),
+                'description': fields['item-description'].strip(),
+                'images': fields['gallery-image'],
+                'source_url': urljoin(self.base_url, fields['item-link']),
+                'source': 'idealista'
+            }
+        except Exception as e:
+            logging.error(f"Error parsing listing: {e}")
+            return None
+
+    def extract_card(self, listing) -> Dict[str, Any]:
+        """Field values of a card keyed by CSS class, like ``parse_listing_css`` selects them."""
+        fields = dict.fromkeys(CARD_TEXT_CLASSES)
+        fields['item-link'] = None
+        fields['gallery-image'] = images = []
+        for element in listing.root.iter(etree.Element):
+            classes = element.get('class')
+            if not classes:
+                continue
+            for name in classes.split():
+                if name == 'gallery-image':
+                    src = element.get('src')
+                    if src is not None:
+                        images.append(src)
+                elif name == 'item-link':
+                    if fields['item-link'] is None:
+                        fields['item-link'] = element.get('href')
+                elif name in CARD_TEXT_CLASSES and fields[name] is None:
+                    # First text node, as ``::text`` would return it
+                    fields[name] = element.text or next(
+                        (child.tail for child in element if child.tail), None
+                    )
+        return fields
+
+    def parse_listing_css(self, listing):
+        """Reference extraction with one CSS query per field."""
         try:
             return {
                 'title': listing.css('.item-title::text').get().strip(),
@@ -35,7 +153,7 @@ class IdealistaSpider(scrapy.Spider):
                 'location': self.extract_location(listing),
                 'description': listing.css('.item-description::text').get().strip(),
                 'images': self.extract_images(listing),
-                'source_url': urljoin('https://www.idealista.it', 
+                'source_url': urljoin(self.base_url, 
                     listing.css('.item-link::attr(href)').get()),
                 'source': 'idealista'
             }
@@ -44,29 +162,50 @@ class IdealistaSpider(scrapy.Spider):
             return None
 
     def extract_price(self, listing):
-        price_text = listing.css('.price-value::text').get()
-        return float(price_text.replace('€', '').replace('.', '').strip()) if price_text else None
+        return self.parse_price(listing.css('.price-value::text').get())
 
     def extract_location(self, listing):
-        location_text = listing.css('.item-location::text').get()
+        return self.parse_location(listing.css('.item-location::text').get())
+
+    def extract_images(self, listing):
+        return listing.css('.gallery-image::attr(src)').getall()
+
+    @staticmethod
+    def parse_price(price_text):
+        return float(price_text.replace('€', '').replace('.', '').strip()) if price_text else None
+
+    @staticmethod
+    def parse_location(location_text):
         parts = location_text.split(',') if location_text else []
         return {
             'neighborhood': parts[0].strip() if parts else None,
             'city': parts[1].strip() if len(parts) > 1 else None
         }
 
-    def extract_images(self, listing):
-        return listing.css('.gallery-image::attr(src)').getall()
-
-def run_idealista_scraper(cities: List[str] = None):
+def run_idealista_scraper(
+    cities: List[str] = None,
+    incremental: bool = True,
+    seen_index_path: Optional[str] = os.environ.get('SCRAPER_SEEN_INDEX', 'idealista_seen.sqlite3'),
+    full_crawl_seconds: Optional[float] = float(
+        os.environ.get('SCRAPER_FULL_CRAWL_SECONDS', FULL_CRAWL_SECONDS)
+    )
+):
     process = CrawlerProcess(settings={
-        'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'ROBOTSTXT_OBEY': True,
-        'DOWNLOAD_DELAY': 1.5,  # Respect website's crawling policy
-        'CONCURRENT_REQUESTS': 2
+        **CRAWL_SETTINGS,
+        'ITEM_PIPELINES': {'scrapers.pipelines.MongoBulkPipeline': 300},
+        'MONGODB_URL': os.environ.get('MONGODB_URL'),
+        'MONGODB_DB_NAME': os.environ.get('MONGODB_DB_NAME'),
+        'INGEST_BATCH_SIZE': 500,
+        'INGEST_FLUSH_SECONDS': 5.0
     })
     
-    process.crawl(IdealistaSpider, cities=cities)
+    process.crawl(
+        IdealistaSpider,
+        cities=cities,
+        seen_index_path=seen_index_path,
+        incremental=incremental,
+        full_crawl_seconds=full_crawl_seconds
+    )
     process.start()
 
 if __name__ == "__main__":